@@ -0,0 +1,47 @@
+# Gunicorn settings (picked up automatically from the working directory; the Procfile names it too).
+# Every value can be overridden from the environment, e.g. WEB_CONCURRENCY=4 GUNICORN_THREADS=8.
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+
+# Load Django once in the master and fork workers from it: workers share those pages
+# copy-on-write and start serving straight away instead of each importing the project.
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+# Threads suit this app: requests spend most of their time waiting on the database.
+# For long-lived /events/ streams run the ASGI app instead, e.g.
+# GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker gunicorn stationery_saas.asgi
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+# Recycle workers now and then so slow leaks cannot build up; the jitter keeps them
+# from all restarting at the same moment.
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 100))
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def when_ready(server):
+    # Runs in the master before the first worker is forked. With preload, resolve the URLconf
+    # (all views) and the POS checkout path (numpy) here once, so no worker pays for them on
+    # its first request. The views themselves import these lazily.
+    if server.cfg.preload_app:
+        from django.urls import get_resolver
+
+        get_resolver().url_patterns
+        import inventory.checkout  # noqa: F401
+
+
+def post_fork(server, worker):
+    # Connections opened in the master (e.g. by the warm-up above) must not be shared with children
+    from django.db import connections
+
+    connections.close_all()
@@ -0,0 +1,209 @@
+from itertools import chain
+
+import numpy as np
+
+from .models import Item, Category, SaleRecord
+
+# ABC / Pareto thresholds on cumulative revenue share
+ABC_A_SHARE = 0.80
+ABC_B_SHARE = 0.95
+
+# Column order of the single values_list() query used to load sales
+SALE_COLUMNS = (
+    'product_id',
+    'quantity',
+    'total_price',
+    'discount',
+    'unit_cost_at_sale',
+    'product__average_cost',
+)
+
+ITEM_COLUMNS = ('id', 'category_id', 'quantity', 'average_cost', 'selling_price')
+
+
+def _to_matrix(rows, width):
+    # np.fromiter over a flattened iterator avoids building an intermediate array of Python tuples
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=len(rows) * width).reshape(-1, width)
+
+
+def load_sales(user, start, end):
+    """
+    Loads a tenant's sales in [start, end) as columnar int64 arrays using one query.
+    Cost falls back to the product's current average cost for rows saved before
+    unit_cost_at_sale existed (same rule as the monthly export).
+    """
+    rows = list(
+        SaleRecord.objects.filter(user=user, date_sold__gte=start, date_sold__lt=end)
+        .values_list(*SALE_COLUMNS)
+    )
+    m = _to_matrix(rows, len(SALE_COLUMNS))
+    quantity = m[:, 1]
+    unit_cost = np.where(m[:, 4] == 0, m[:, 5], m[:, 4])
+    return {
+        'product': m[:, 0],
+        'quantity': quantity,
+        'gross': m[:, 2],
+        'discount': m[:, 3],
+        'revenue': m[:, 2] - m[:, 3],
+        'cost': unit_cost * quantity,
+    }
+
+
+def load_items(user):
+    # Deleted items too, so their past sales still count
+    rows = list(Item.all_objects.filter(user=user).order_by('id').values_list(*ITEM_COLUMNS))
+    m = _to_matrix(rows, len(ITEM_COLUMNS))
+    return {
+        'id': m[:, 0],
+        'category': m[:, 1],
+        'on_hand': m[:, 2],
+        'average_cost': m[:, 3],
+        'selling_price': m[:, 4],
+    }
+
+
+def abc_classes(revenue, a_share=ABC_A_SHARE, b_share=ABC_B_SHARE):
+    """
+    Pareto classification. An item is 'A' while the cumulative revenue share of the items
+    ranked above it is below `a_share`, 'B' below `b_share`, and 'C' otherwise.
+    Items with no revenue are always 'C'.
+    """
+    classes = np.full(len(revenue), 'C', dtype='<U1')
+    total = revenue.sum()
+    if total <= 0:
+        return classes
+    order = np.argsort(-revenue, kind='stable')
+    share_before = (np.cumsum(revenue[order]) - revenue[order]) / total
+    ranked = np.where(share_before < a_share, 'A', np.where(share_before < b_share, 'B', 'C'))
+    ranked[revenue[order] <= 0] = 'C'
+    classes[order] = ranked
+    return classes
+
+
+def _margin_pct(revenue, profit):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(revenue > 0, profit * 100.0 / revenue, 0.0)
+
+
+def compute(sales, items, days):
+    """Vectorized per-product and per-category metrics. `days` is the length of the analysed range."""
+    n_items = len(items['id'])
+
+    # Map each sale onto its row in the item table; sales of items no longer in the catalog are dropped.
+    idx = np.searchsorted(items['id'], sales['product'])
+    idx_clipped = np.minimum(idx, max(n_items - 1, 0))
+    known = (idx < n_items) & (items['id'][idx_clipped] == sales['product']) if n_items else np.zeros(len(idx), bool)
+    idx = idx[known]
+
+    def per_item(values):
+        return np.bincount(idx, weights=values[known], minlength=n_items)
+
+    sold = per_item(sales['quantity'])
+    revenue = per_item(sales['revenue'])
+    discount = per_item(sales['discount'])
+    cost = per_item(sales['cost'])
+    profit = revenue - cost
+
+    on_hand = np.maximum(items['on_hand'], 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sell_through = np.where(sold + on_hand > 0, sold * 100.0 / (sold + on_hand), 0.0)
+        daily_rate = sold / max(days, 1)
+        days_of_cover = np.where(daily_rate > 0, on_hand / daily_rate, np.inf)
+
+    # Categories: factorize ids once, then aggregate the per-item results
+    cat_ids, cat_idx = np.unique(items['category'], return_inverse=True)
+    n_cats = len(cat_ids)
+    cat_revenue = np.bincount(cat_idx, weights=revenue, minlength=n_cats)
+    cat_cost = np.bincount(cat_idx, weights=cost, minlength=n_cats)
+    cat_sold = np.bincount(cat_idx, weights=sold, minlength=n_cats)
+
+    return {
+        'item': {
+            'id': items['id'],
+            'category': items['category'],
+            'on_hand': items['on_hand'],
+            'sold': sold,
+            'revenue': revenue,
+            'discount': discount,
+            'cost': cost,
+            'profit': profit,
+            'margin_pct': _margin_pct(revenue, profit),
+            'sell_through_pct': sell_through,
+            'days_of_cover': days_of_cover,
+            'abc': abc_classes(revenue),
+        },
+        'category': {
+            'id': cat_ids,
+            'sold': cat_sold,
+            'revenue': cat_revenue,
+            'cost': cat_cost,
+            'profit': cat_revenue - cat_cost,
+            'margin_pct': _margin_pct(cat_revenue, cat_revenue - cat_cost),
+        },
+    }
+
+
+def _cover(value):
+    return None if not np.isfinite(value) else round(float(value), 1)
+
+
+def analyze(user, start, end):
+    """Full report for one tenant as plain Python data (JSON serialisable)."""
+    days = max((end - start).days, 1)
+    metrics = compute(load_sales(user, start, end), load_items(user), days)
+    item, cat = metrics['item'], metrics['category']
+
+    names = dict(Item.all_objects.filter(user=user).values_list('id', 'name'))
+    cat_names = dict(Category.objects.filter(user=user).values_list('id', 'name'))
+
+    order = np.argsort(-item['revenue'], kind='stable')
+    products = [{
+        'id': int(item['id'][i]),
+        'name': names.get(int(item['id'][i]), ''),
+        'category': cat_names.get(int(item['category'][i]), ''),
+        'abc': str(item['abc'][i]),
+        'sold': int(item['sold'][i]),
+        'on_hand': int(item['on_hand'][i]),
+        'revenue': int(item['revenue'][i]),
+        'discount': int(item['discount'][i]),
+        'cost': int(item['cost'][i]),
+        'profit': int(item['profit'][i]),
+        'margin_pct': round(float(item['margin_pct'][i]), 1),
+        'sell_through_pct': round(float(item['sell_through_pct'][i]), 1),
+        'days_of_cover': _cover(item['days_of_cover'][i]),
+    } for i in order]
+
+    cat_order = np.argsort(-cat['revenue'], kind='stable')
+    categories = [{
+        'id': int(cat['id'][i]),
+        'name': cat_names.get(int(cat['id'][i]), ''),
+        'sold': int(cat['sold'][i]),
+        'revenue': int(cat['revenue'][i]),
+        'cost': int(cat['cost'][i]),
+        'profit': int(cat['profit'][i]),
+        'margin_pct': round(float(cat['margin_pct'][i]), 1),
+    } for i in cat_order]
+
+    abc_summary = {}
+    for cls in ('A', 'B', 'C'):
+        mask = item['abc'] == cls
+        abc_summary[cls] = {'items': int(mask.sum()), 'revenue': int(item['revenue'][mask].sum())}
+
+    revenue = int(item['revenue'].sum())
+    profit = int(item['profit'].sum())
+    return {
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'days': days,
+        'totals': {
+            'revenue': revenue,
+            'cost': int(item['cost'].sum()),
+            'profit': profit,
+            'discount': int(item['discount'].sum()),
+            'sold': int(item['sold'].sum()),
+            'margin_pct': round(profit * 100.0 / revenue, 1) if revenue else 0.0,
+        },
+        'abc': abc_summary,
+        'products': products,
+        'categories': categories,
+    }
@@ -0,0 +1,14 @@
+from django.contrib.auth.backends import ModelBackend
+
+from . import caching
+
+
+class CachedModelBackend(ModelBackend):
+    """
+    ModelBackend whose get_user() (called by AuthenticationMiddleware on every request)
+    is served from the cache. Authentication itself still goes to the database.
+    """
+
+    def get_user(self, user_id):
+        user = caching.get_user(user_id)
+        return user if user is not None and self.user_can_authenticate(user) else None
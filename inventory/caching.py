@@ -0,0 +1,150 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+
+# Cache scopes. Each tenant has one version counter per scope; bumping it orphans every
+# cached fragment keyed on the old value, so nothing has to be deleted explicitly.
+CATALOG = 'catalog'   # items and categories (names, prices, stock)
+SALES = 'sales'       # sale records
+
+SCOPES = (CATALOG, SALES)
+
+# Not part of bump_all(): sales change stock but not codes or prices, so the POS scan
+# cache (inventory/scanning.py) survives them. Bumped only when an item itself is saved.
+SCAN = 'scan'
+
+
+def _version_key(scope, user_id):
+    return f"ims:version:{scope}:{user_id}"
+
+
+def get_version(scope, user_id):
+    key = _version_key(scope, user_id)
+    version = cache.get(key)
+    if version is None:
+        # Seed with a timestamp rather than 1 so that a counter evicted from the cache can
+        # never come back with a value that old fragments were stored under.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key, 0)
+    return version
+
+
+def get_versions(scopes, user_id):
+    """get_version() for many scopes in one cache round trip: {scope: version}."""
+    keys = {_version_key(scope, user_id): scope for scope in scopes}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+    for scope in scopes:
+        if scope not in versions:
+            versions[scope] = get_version(scope, user_id)
+    return versions
+
+
+def bump_version(scope, user_id):
+    key = _version_key(scope, user_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = time.time_ns()
+        cache.set(key, version, None)
+        return version
+
+
+def bump_all(user_id):
+    for scope in SCOPES:
+        bump_version(scope, user_id)
+
+
+def fragment_timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 3600)
+
+
+# --- Profile & Category Lookups ---
+# Both are read on nearly every page but change rarely, so they are kept in the process
+# cache and dropped by the post_save/post_delete receivers in models.py.
+LOOKUP_TIMEOUT = 3600
+
+
+def _profile_key(user_id):
+    return f"ims:profile:{user_id}"
+
+
+def _categories_key(user_id):
+    return f"ims:categories:{user_id}"
+
+
+def get_profile(user):
+    """
+    The user's Profile, creating it if missing. The result is attached to `user` so that
+    `user.profile` costs nothing for the rest of the request.
+    """
+    from .models import Profile
+
+    try:
+        if User.profile.is_cached(user):
+            return user.profile
+    except Profile.DoesNotExist:
+        pass
+
+    profile = cache.get(_profile_key(user.pk))
+    if profile is None:
+        profile, _ = Profile.objects.get_or_create(user=user)
+        cache.set(_profile_key(user.pk), profile, LOOKUP_TIMEOUT)
+    user.profile = profile
+    return profile
+
+
+def forget_profile(user_id):
+    cache.delete(_profile_key(user_id))
+
+
+def get_categories(user):
+    """The tenant's categories as a list of {'id', 'name'} dicts, in creation order."""
+    from .models import Category
+
+    categories = cache.get(_categories_key(user.pk))
+    if categories is None:
+        categories = list(Category.objects.filter(user=user).order_by('id').values('id', 'name'))
+        cache.set(_categories_key(user.pk), categories, LOOKUP_TIMEOUT)
+    return categories
+
+
+def forget_categories(user_id):
+    cache.delete(_categories_key(user_id))
+
+
+# --- Authenticated User ---
+# Used by backends.CachedModelBackend so that AuthenticationMiddleware does not SELECT the
+# user on every request. Dropped on every User save, which covers password changes: the
+# session auth hash is then checked against the fresh password.
+def _user_key(user_id):
+    return f"ims:user:{user_id}"
+
+
+def get_user(user_id):
+    key = _user_key(user_id)
+    user = cache.get(key)
+    if user is None:
+        user = User._default_manager.filter(pk=user_id).first()
+        if user is not None:
+            cache.set(key, user, LOOKUP_TIMEOUT)
+    return user
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+# --- Replica Stickiness ---
+# Set after a tenant writes; while present its reads stay on the primary (see ReplicaRoutingMiddleware).
+def _primary_pin_key(user_id):
+    return f"ims:primary:{user_id}"
+
+
+def pin_to_primary(user_id, seconds):
+    cache.set(_primary_pin_key(user_id), True, seconds)
+
+
+def pinned_to_primary(user_id):
+    return cache.get(_primary_pin_key(user_id), False)
@@ -0,0 +1,94 @@
+import uuid
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import caching, events, pricing, receipts, reservations, routers, valuation
+from .models import ChangeEvent, Item, Promotion, SaleRecord
+
+
+def merge_lines(cart_items):
+    """{product_id: qty} from [{'id', 'qty'}, ...], merging repeated lines for the same product."""
+    quantities = {}
+    for item_data in cart_items:
+        qty = int(item_data.get('qty'))
+        if qty <= 0:
+            raise ValueError("Quantity must be positive.")
+        product_id = int(item_data.get('id'))
+        quantities[product_id] = quantities.get(product_id, 0) + qty
+    return quantities
+
+
+def place_order(user, cart_items, flat_discount=0, cart_id=None, percent_off=0):
+    """
+    Sells a POS cart in one transaction and returns the new order id.
+    Raises Item.DoesNotExist for unknown products and ValueError (including
+    reservations.StockUnavailable) when the sale is not allowed.
+    """
+    quantities = merge_lines(cart_items)
+    if not quantities:
+        raise ValueError("Cart is empty")
+    order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
+
+    with routers.tenant_atomic(user.pk):
+        products = Item.objects.filter(user=user).in_bulk(list(quantities))
+        if len(products) != len(quantities):
+            raise Item.DoesNotExist
+
+        product_ids = list(quantities)
+        line_of = {product_id: line for line, product_id in enumerate(product_ids)}
+        promotions = (
+            Promotion.active().filter(user=user, item_id__in=product_ids)
+            .values_list('item_id', 'percent_off', 'bundle_qty', 'bundle_price')
+        )
+        priced = pricing.price_cart(
+            [products[pk].selling_price for pk in product_ids],
+            [products[pk].average_cost for pk in product_ids],
+            [quantities[pk] for pk in product_ids],
+            flat_discount=flat_discount,
+            percent_off=percent_off,
+            promotions=[(line_of[item_id], *offer) for item_id, *offer in promotions],
+            min_margin_pct=getattr(settings, 'MIN_MARGIN_PCT', 0),
+        )
+
+        # Stock moves with guarded UPDATEs rather than a lock held across the whole cart
+        stock = reservations.take_stock(user, cart_id, quantities, {pk: p.name for pk, p in products.items()})
+        SaleRecord.objects.bulk_create([
+            SaleRecord(
+                order_id=order_id,
+                product=products[pk],
+                quantity=quantities[pk],
+                total_price=int(priced['total_price'][line]),
+                discount=int(priced['discount'][line]),
+                unit_cost_at_sale=stock[pk]['average_cost'],
+                user=user,
+            )
+            for line, pk in enumerate(product_ids)
+        ])
+        value_delta = -sum(stock[pk]['average_cost'] * qty for pk, qty in quantities.items())
+        valuation.adjust(user.pk, value_delta)
+
+        held = reservations.held_quantities(user, product_ids)
+        sold_at = timezone.now()
+        events.record(user.pk, ChangeEvent.SALE, {
+            'order_id': order_id,
+            'value_delta': value_delta,
+            'lines': [{
+                'item': pk,
+                'name': products[pk].name,
+                'qty': quantities[pk],
+                'stock': stock[pk]['quantity'],
+                'available': max(stock[pk]['quantity'] - held.get(pk, 0), 0),
+                'revenue': int(priced['net'][line]),
+                'cost': stock[pk]['average_cost'] * quantities[pk],
+                'sold_at': sold_at,
+            } for line, pk in enumerate(product_ids)],
+        })
+
+        # update() and bulk_create() send no signals
+        user_id = user.pk
+        routers.on_commit(lambda: caching.bump_all(user_id))
+        # Printed right away at the till, reprinted later from the cache
+        routers.on_commit(lambda: receipts.prerender(user, order_id), robust=True)
+
+    return order_id
@@ -0,0 +1,21 @@
+from . import caching
+
+
+def cache_versions(request):
+    """Per-tenant version counters used as {% cache %} keys in the heavy templates."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {
+        'catalog_version': caching.get_version(caching.CATALOG, user.pk),
+        'sales_version': caching.get_version(caching.SALES, user.pk),
+        'fragment_cache_timeout': caching.fragment_timeout(),
+    }
+
+
+def business_profile(request):
+    """Shop name for the sidebar, served from the profile cache."""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'business_name': caching.get_profile(user).business_name}
@@ -0,0 +1,166 @@
+import heapq
+import math
+from fractions import Fraction
+from itertools import groupby
+
+from django.db.models import Sum
+
+from . import caching, routers, valuation
+from .models import Item, PriceChange, PriceChangeBatch, Purchase, SaleRecord
+
+# Replays each item's history to find what its average cost should be. Purchase.save() keeps
+# the weighted average in whole PKR, rounded half up after every purchase, so the rounding
+# compounds; here the same rule runs on exact fractions. Costs saved before it rounded half up
+# were floored, and show up here too. The tenant's purchases, sales and bulk cost changes
+# are read as three streams sorted by (item, time) and merged, so memory stays flat however
+# long the history is.
+#
+# Not in the history: buying prices typed into the product form, and refunded sales (their
+# lines are deleted). Their units come back at the cost of the day, so refunds leave the
+# average alone, but the stock level in between is not known.
+#
+# Events at the same instant apply in this order
+PURCHASE, COST_SET, COST_UNDO, SALE = range(4)
+CHUNK_SIZE = 2000
+
+
+def half_up(value):
+    """Whole PKR, halves rounded up: what average_cost would hold without drift."""
+    return math.floor(value + Fraction(1, 2))
+
+
+def _purchases(user_id):
+    rows = (
+        Purchase.objects.filter(user_id=user_id).order_by('item_id', 'timestamp', 'id')
+        .values_list('item_id', 'timestamp', 'id', 'quantity', 'unit_price')
+    )
+    for item_id, at, pk, quantity, price in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield item_id, at, PURCHASE, pk, quantity, price
+
+
+def _sales(user_id):
+    rows = (
+        SaleRecord.objects.filter(user_id=user_id).order_by('product_id', 'date_sold', 'id')
+        .values_list('product_id', 'date_sold', 'id', 'quantity', 'unit_cost_at_sale')
+    )
+    for item_id, at, pk, quantity, cost in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield item_id, at, SALE, pk, quantity, cost
+
+
+def _cost_changes(user_id):
+    # Bulk repricing of the buying price; an undo puts the old cost back where it was still in place
+    rows = (
+        PriceChange.objects.filter(batch__user_id=user_id, batch__field=PriceChangeBatch.AVERAGE_COST)
+        .order_by('item_id', 'batch__created_at', 'id')
+        .values_list('item_id', 'batch__created_at', 'batch__undone_at', 'id', 'old_value', 'new_value')
+    )
+    for item_id, at, undone_at, pk, old, new in rows.iterator(chunk_size=CHUNK_SIZE):
+        yield item_id, at, COST_SET, pk, old, new
+        if undone_at:
+            yield item_id, undone_at, COST_UNDO, pk, new, old
+
+
+def history(user_id):
+    """Every cost-relevant event of the tenant, sorted by (item, time, kind, id)."""
+    # An undo is not in created_at order within its item, so that stream is sorted in memory (it is small)
+    return heapq.merge(_purchases(user_id), sorted(_cost_changes(user_id)), _sales(user_id))
+
+
+def replay(quantity, average_cost, events):
+    """
+    Runs one item's events from its opening stock. Returns (exact average cost or None when the
+    opening cost cannot be known, [(sale id, exact cost) for sales recorded without a cost]).
+
+    The opening cost is what the first sale (with a recorded cost) or bulk cost change before
+    the first purchase saw. Without either it only matters when there was opening stock; if
+    nothing was ever bought, the stored cost is the opening cost.
+    """
+    cost = None
+    unpriced = []
+    pending = []  # unpriced sales before the opening cost is known
+    for _, _, kind, pk, a, b in events:
+        if kind == PURCHASE:
+            if cost is None:
+                if quantity > 0:
+                    return None, unpriced
+                cost = Fraction(0)
+                # Sold with no stock and no cost; there is nothing to fill them with
+                pending = []
+            # Same rule as Purchase.save(), without the rounding
+            if quantity + a > 0:
+                cost = (quantity * cost + a * b) / (quantity + a)
+            quantity += a
+        elif kind == SALE:
+            if cost is None and b:
+                cost = Fraction(b)
+                unpriced.extend((sale, cost) for sale in pending)
+                pending = []
+            if not b:
+                if cost is None:
+                    pending.append(pk)
+                else:
+                    unpriced.append((pk, cost))
+            quantity -= a
+        elif kind == COST_SET:
+            cost = Fraction(b)
+        elif kind == COST_UNDO and cost is not None and half_up(cost) == a:
+            cost = Fraction(b)
+    if cost is None:
+        cost = Fraction(average_cost)
+        unpriced.extend((sale, cost) for sale in pending)
+    return cost, unpriced
+
+
+@routers.per_tenant
+def audit_tenant(user_id, fix=False):
+    """
+    Replays the tenant's items and, with fix=True, writes the corrected costs back: average_cost
+    on items, and unit_cost_at_sale on sales recorded without one. Returns a picklable summary.
+    """
+    items = {
+        pk: (quantity, cost)
+        for pk, quantity, cost in Item.all_objects.filter(user_id=user_id).values_list('id', 'quantity', 'average_cost')
+    }
+    bought = dict(Purchase.objects.filter(user_id=user_id).values('item_id').annotate(n=Sum('quantity')).values_list('item_id', 'n'))
+    sold = dict(SaleRecord.objects.filter(user_id=user_id).values('product_id').annotate(n=Sum('quantity')).values_list('product_id', 'n'))
+
+    drifted, unknown, unpriced = [], 0, []
+    for item_id, events in groupby(history(user_id), key=lambda event: event[0]):
+        if item_id not in items:
+            continue
+        quantity, stored = items[item_id]
+        opening = quantity - bought.get(item_id, 0) + sold.get(item_id, 0)
+        exact, sales = replay(opening, stored, events)
+        unpriced.extend((pk, half_up(cost)) for pk, cost in sales if cost)
+        if exact is None:
+            unknown += 1
+        elif half_up(exact) != stored:
+            drifted.append((item_id, stored, half_up(exact), float(exact)))
+
+    fixed = 0
+    if fix and (drifted or unpriced):
+        fixed = _fix(user_id, drifted, unpriced)
+    return {
+        'user_id': user_id, 'items': len(items), 'drifted': drifted, 'unknown': unknown,
+        'unpriced': len(unpriced), 'fixed': fixed,
+    }
+
+
+def _fix(user_id, drifted, unpriced, batch_size=1000):
+    with routers.tenant_atomic(user_id):
+        expected = {item_id: (stored, cost) for item_id, stored, cost, _ in drifted}
+        # Items bought or repriced since the replay read them keep their cost
+        items = [
+            item for item in Item.all_objects.select_for_update().filter(pk__in=expected).only('pk', 'average_cost')
+            if item.average_cost == expected[item.pk][0]
+        ]
+        for item in items:
+            item.average_cost = expected[item.pk][1]
+        Item.all_objects.bulk_update(items, ['average_cost'], batch_size=batch_size)
+        sales = [SaleRecord(pk=pk, unit_cost_at_sale=cost) for pk, cost in unpriced]
+        SaleRecord.objects.bulk_update(sales, ['unit_cost_at_sale'], batch_size=batch_size)
+        # bulk_update() sends no signals: the running stock value, and cached pages and scans, hold costs
+        valuation.rebuild(user_id)
+        routers.on_commit(lambda: caching.bump_all(user_id))
+        routers.on_commit(lambda: caching.bump_version(caching.SCAN, user_id))
+    return len(items)
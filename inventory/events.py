@@ -0,0 +1,100 @@
+import asyncio
+import json
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from . import models, routers
+
+# Per-tenant change feed.
+# Sales, purchases and refunds append a ChangeEvent in the same transaction as the change,
+# carrying the deltas a page needs (units, revenue, cost, new stock, value change), so open
+# dashboards and tills update themselves instead of reloading.
+#
+# stream() renders the feed as server-sent events. Under ASGI it is one long-lived response
+# that polls the table; under WSGI, where a held connection would tie up a worker thread, it
+# sends whatever is pending and ends, and the browser reconnects after `retry` milliseconds.
+# Either way the browser resumes from the Last-Event-ID it was given.
+
+BATCH_SIZE = 100
+HEARTBEAT_SECONDS = 15
+
+
+def record(user_id, kind, payload):
+    return models.ChangeEvent.objects.create(user_id=user_id, kind=kind, payload=payload)
+
+
+@routers.per_tenant
+def latest_id(user_id):
+    return models.ChangeEvent.objects.filter(user_id=user_id).order_by('-id').values_list('id', flat=True).first() or 0
+
+
+@routers.per_tenant
+def pending(user_id, after_id, limit=BATCH_SIZE):
+    return list(
+        models.ChangeEvent.objects.filter(user_id=user_id, id__gt=after_id)
+        .order_by('id').values_list('id', 'kind', 'payload')[:limit]
+    )
+
+
+def prune(older_than_days, batch_size=5000):
+    """Deletes events older than the cutoff in batches; returns how many were removed."""
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    removed = 0
+    for alias in routers.shard_aliases():
+        events = models.ChangeEvent.objects.using(alias)
+        while True:
+            pks = list(events.filter(created_at__lt=cutoff).values_list('pk', flat=True)[:batch_size])
+            if not pks:
+                break
+            batch = events.filter(pk__in=pks)
+            removed += batch._raw_delete(batch.db)
+    return removed
+
+
+def _message(event_id, kind, payload):
+    return f"id: {event_id}\nevent: {kind}\ndata: {json.dumps(payload, cls=DjangoJSONEncoder)}\n\n"
+
+
+def _opening(after_id):
+    # An id-only message moves the browser's Last-Event-ID even when no event follows
+    return f"retry: {getattr(settings, 'SSE_RETRY_MS', 3000)}\nid: {after_id}\n\n"
+
+
+def _backlog(user_id, after_id):
+    yield _opening(after_id)
+    for event in pending(user_id, after_id):
+        yield _message(*event)
+
+
+async def _live(user_id, after_id):
+    poll = getattr(settings, 'SSE_POLL_SECONDS', 1)
+    deadline = time.monotonic() + getattr(settings, 'SSE_MAX_SECONDS', 300)
+    quiet_since = time.monotonic()
+    yield _opening(after_id)
+    while time.monotonic() < deadline:
+        batch = await sync_to_async(pending)(user_id, after_id)
+        for event in batch:
+            yield _message(*event)
+            after_id = event[0]
+        if batch:
+            quiet_since = time.monotonic()
+            continue
+        if time.monotonic() - quiet_since >= HEARTBEAT_SECONDS:
+            # Comment line: keeps proxies from closing an idle connection
+            yield ": keep-alive\n\n"
+            quiet_since = time.monotonic()
+        await asyncio.sleep(poll)
+
+
+def stream(user_id, after_id, asynchronous):
+    """The SSE body for events after `after_id`; None means start from now."""
+    latest = latest_id(user_id)
+    if after_id is None or after_id > latest:
+        # An id beyond the newest one was issued by the shard the tenant was moved from
+        after_id = latest
+    return _live(user_id, after_id) if asynchronous else _backlog(user_id, after_id)
@@ -0,0 +1,182 @@
+import csv
+import tempfile
+from datetime import date, datetime, timedelta
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+
+from . import periods, routers
+from .models import SaleRecord
+
+# Row-by-row exports for large querysets. Rows come from values_list().iterator(), so only
+# one chunk of rows is in memory at a time, whatever the queryset size.
+
+CHUNK_SIZE = 2000
+XLSX_MAX_ROWS = 1_000_000  # Excel stops at 1,048,576 rows per sheet
+
+
+def sanitize_for_excel(value):
+    if value and isinstance(value, str) and value.startswith(('=', '+', '-', '@')):
+        return f"'{value}"
+    return value
+
+
+def _cell(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return sanitize_for_excel(value)
+
+
+def headers(model, fields):
+    """Column titles for field paths such as 'product__name' -> 'Product Name'."""
+    titles = []
+    for path in fields:
+        opts, parts = model._meta, path.split('__')
+        words = []
+        for part in parts:
+            field = opts.get_field(part)
+            words.append(str(field.verbose_name))
+            if field.is_relation:
+                opts = field.related_model._meta
+        titles.append(' '.join(words).title())
+    return titles
+
+
+def rows(queryset, fields):
+    # Full dumps are read from the replica when there is one
+    if routers.replica_configured():
+        queryset = queryset.using(routers.replica_alias())
+    for row in queryset.order_by('pk').values_list(*fields).iterator(chunk_size=CHUNK_SIZE):
+        yield [_cell(value) for value in row]
+
+
+class Echo:
+    """File-like object whose write() hands the line back, for csv.writer over a generator."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(queryset, fields, filename):
+    writer = csv.writer(Echo())
+
+    def lines():
+        yield writer.writerow(headers(queryset.model, fields))
+        for row in rows(queryset, fields):
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(lines(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+def xlsx_file(queryset, fields, filename, title='Export'):
+    """
+    XLSX built with openpyxl's write-only mode, which spools rows to disk instead of
+    holding cell objects in memory. Rolls over to a new sheet every XLSX_MAX_ROWS rows.
+    """
+    import openpyxl
+
+    wb = openpyxl.Workbook(write_only=True)
+    header = headers(queryset.model, fields)
+    ws, written, sheet_no = None, XLSX_MAX_ROWS, 0
+    for row in rows(queryset, fields):
+        if written >= XLSX_MAX_ROWS:
+            sheet_no += 1
+            ws = wb.create_sheet(title if sheet_no == 1 else f"{title} {sheet_no}")
+            ws.append(header)
+            written = 0
+        ws.append(row)
+        written += 1
+    if ws is None:
+        wb.create_sheet(title).append(header)
+
+    out = tempfile.TemporaryFile()
+    wb.save(out)
+    out.seek(0)
+    return FileResponse(
+        out, as_attachment=True, filename=filename,
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
+
+
+# --- Sales Reports (the export links in the app) ---
+def daily_sales_csv(user, tz):
+    response = HttpResponse(content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="daily_sales.csv"'
+    writer = csv.writer(response)
+    writer.writerow(['Order ID', 'Date', 'Product Name', 'Qty Sold', 'Unit Price', 'Total Subtotal', 'Discount', 'Net Total'])
+    day_start, day_end = periods.day_range(periods.local_today(tz), tz)
+    sales = SaleRecord.objects.filter(user=user, date_sold__gte=day_start, date_sold__lt=day_end).select_related('product')
+    for sale in sales:
+        writer.writerow([
+            sanitize_for_excel(sale.order_id),
+            timezone.localtime(sale.date_sold),
+            sanitize_for_excel(sale.product.name),
+            sale.quantity,
+            sale.product.selling_price,
+            sale.total_price,
+            sale.discount,
+            (sale.total_price - sale.discount)
+        ])
+    return response
+
+
+def _report_sheet(workbook, title, sales):
+    from openpyxl.styles import Font
+
+    if workbook.active.title == "Sheet":
+        ws = workbook.active
+        ws.title = title
+    else:
+        ws = workbook.create_sheet(title=title)
+
+    ws.append(['Order ID', 'Product / Item', 'Category', 'Date of Sale', 'Month', 'Year', 'Qty Sold',
+               'Gross Subtotal', 'Discount', 'Net Sales', 'Total Cost', 'Net Profit'])
+    for cell in ws[1]:
+        cell.font = Font(bold=True)
+
+    for sale in sales:
+        revenue = sale.total_price - sale.discount
+        cost_price = sale.unit_cost_at_sale or sale.product.average_cost
+        total_cost = cost_price * sale.quantity
+        date_sold = timezone.localtime(sale.date_sold)
+        ws.append([
+            sanitize_for_excel(sale.order_id if sale.order_id else "N/A"),
+            sanitize_for_excel(sale.product.name),
+            sanitize_for_excel(sale.product.category.name),
+            date_sold.strftime('%Y-%m-%d'),
+            date_sold.strftime('%B'),
+            date_sold.year,
+            sale.quantity,
+            sale.total_price,
+            sale.discount,
+            revenue,
+            total_cost,
+            revenue - total_cost,
+        ])
+
+
+def monthly_sales_xlsx(user, tz):
+    """This month's and last month's sales, one sheet each."""
+    import openpyxl
+
+    today = periods.local_today(tz)
+    month_start, month_end = periods.month_range(today, tz)
+    prev_month_start, prev_month_end = periods.previous_month_range(today, tz)
+    last_day_prev_month = month_start.date() - timedelta(days=1)
+
+    def sales_between(start, end):
+        return (
+            SaleRecord.objects.filter(user=user, date_sold__gte=start, date_sold__lt=end)
+            .select_related('product', 'product__category').order_by('-date_sold')
+        )
+
+    wb = openpyxl.Workbook()
+    _report_sheet(wb, f"Current ({today.strftime('%B')})", sales_between(month_start, month_end))
+    _report_sheet(wb, f"Previous ({last_day_prev_month.strftime('%B')})", sales_between(prev_month_start, prev_month_end))
+
+    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    response['Content-Disposition'] = 'attachment; filename="Monthly_Sales_Report.xlsx"'
+    wb.save(response)
+    return response
@@ -0,0 +1,124 @@
+import math
+from datetime import datetime, timedelta
+
+import numpy as np
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from . import periods
+from .routers import per_tenant
+from .models import Item, ItemForecast, SaleRecord
+
+# Full days of sales history behind each forecast (today, still in progress, is left out)
+HISTORY_DAYS = 56
+# Recent days behind the moving average and the day-to-day spread
+WINDOW_DAYS = 14
+# Exponential smoothing weight of the newest day
+ALPHA = 0.2
+# Days between placing an order and the stock arriving, and days an order should cover after that
+LEAD_DAYS = 7
+COVER_DAYS = 14
+# Safety stock in standard deviations of lead-time demand (1.65 ~ 95% of lead times without a stock-out)
+SERVICE_Z = 1.65
+
+
+def daily_sales(user_id, first_day, days, tz):
+    """(item_id, local day, units) for the tenant's sales over `days` days from first_day; one grouped query."""
+    start, end = periods.days_range(first_day, first_day + timedelta(days=days - 1), tz)
+    rows = (
+        SaleRecord.objects.filter(user_id=user_id, date_sold__gte=start, date_sold__lt=end)
+        .annotate(day=TruncDate('date_sold', tzinfo=tz))
+        .values('product_id', 'day')
+        .annotate(units=Sum('quantity'))
+        .order_by()
+        .values_list('product_id', 'day', 'units')
+    )
+    return [
+        (item_id, timezone.localtime(day, tz).date() if isinstance(day, datetime) else day, units)
+        for item_id, day, units in rows
+    ]
+
+
+def demand_matrix(rows, item_ids, first_day, days):
+    """
+    Dense items x days array of units sold, rows in `item_ids` order (sorted ascending).
+    Sales of items not in item_ids (deleted ones) are dropped.
+    """
+    matrix = np.zeros((len(item_ids), days))
+    if not rows or not len(item_ids):
+        return matrix
+    item, day, units = zip(*rows)
+    item = np.asarray(item, dtype=np.int64)
+    offset = np.array([(d - first_day).days for d in day], dtype=np.int64)
+    row = np.minimum(np.searchsorted(item_ids, item), len(item_ids) - 1)
+    keep = (item_ids[row] == item) & (offset >= 0) & (offset < days)
+    # add.at accumulates repeated (row, day) pairs instead of keeping only the last one
+    np.add.at(matrix, (row[keep], offset[keep]), np.asarray(units, dtype=np.float64)[keep])
+    return matrix
+
+
+def moving_average(matrix, window=WINDOW_DAYS):
+    return matrix[:, -window:].mean(axis=1)
+
+
+def exponential_smoothing(matrix, alpha=ALPHA):
+    """
+    Final level of simple exponential smoothing for every row, seeded with the first day.
+    s_t = a*x_t + (1-a)*s_{t-1} unrolls into a fixed weight per day, so the whole matrix
+    reduces to one matrix-vector product.
+    """
+    days = matrix.shape[1]
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1, dtype=np.float64)
+    weights[0] = (1 - alpha) ** (days - 1)
+    return matrix @ weights
+
+
+def reorder_plan(demand, spread, on_hand, lead_days=LEAD_DAYS, cover_days=COVER_DAYS, z=SERVICE_Z):
+    """
+    Days of stock left (NaN when nothing sells), reorder point and suggested order per item.
+    At or below the reorder point the suggestion tops stock up to lead + cover days of demand
+    plus safety stock; above it nothing needs ordering yet.
+    """
+    safety = z * spread * math.sqrt(lead_days)
+    reorder_point = np.ceil(demand * lead_days + safety)
+    target = np.ceil(demand * (lead_days + cover_days) + safety)
+    selling = demand > 0
+    days_left = np.where(selling, on_hand / np.where(selling, demand, 1), np.nan)
+    reorder_qty = np.where(on_hand <= reorder_point, np.maximum(target - on_hand, 0), 0)
+    return days_left, reorder_point.astype(np.int64), reorder_qty.astype(np.int64)
+
+
+@per_tenant
+def forecast_tenant(user_id, tz_name=None, today=None, history_days=HISTORY_DAYS,
+                    lead_days=LEAD_DAYS, cover_days=COVER_DAYS):
+    """Recomputes ItemForecast rows for all of a tenant's active items; returns how many were written."""
+    tz = periods.zone(tz_name)
+    today = today or periods.local_today(tz)
+    first_day = today - timedelta(days=history_days)
+
+    items = list(Item.objects.filter(user_id=user_id).order_by('id').values_list('id', 'quantity'))
+    item_ids = np.array([pk for pk, _ in items], dtype=np.int64)
+    on_hand = np.array([qty for _, qty in items], dtype=np.float64)
+
+    matrix = demand_matrix(daily_sales(user_id, first_day, history_days, tz), item_ids, first_day, history_days)
+    average = moving_average(matrix)
+    smoothed = exponential_smoothing(matrix)
+    spread = matrix[:, -WINDOW_DAYS:].std(axis=1)
+    days_left, reorder_point, reorder_qty = reorder_plan(smoothed, spread, on_hand, lead_days, cover_days)
+
+    rows = [
+        ItemForecast(
+            item_id=int(item_ids[i]), user_id=user_id,
+            moving_average=round(float(average[i]), 3), smoothed=round(float(smoothed[i]), 3),
+            days_left=None if np.isnan(days_left[i]) else round(float(days_left[i]), 1),
+            reorder_point=int(reorder_point[i]), reorder_qty=int(reorder_qty[i]), computed_for=today,
+        )
+        for i in range(len(items))
+    ]
+    # Deleted items lose their row in Item.soft_delete()
+    ItemForecast.objects.bulk_create(
+        rows, batch_size=1000, update_conflicts=True, unique_fields=['item'],
+        update_fields=['moving_average', 'smoothed', 'days_left', 'reorder_point', 'reorder_qty', 'computed_for'],
+    )
+    return len(rows)
@@ -1,6 +1,8 @@
+from zoneinfo import available_timezones
 from django import forms
 from django.contrib.auth.models import User
-from .models import Profile, Item, Purchase, Category
+from .models import Item, Purchase, Category, PriceChangeBatch
+from . import caching
 
 class SignUpForm(forms.ModelForm):
     full_name = forms.CharField(max_length=100, required=True, widget=forms.TextInput(attrs={'placeholder': 'Full Name'}))
@@ -31,6 +33,7 @@ class UserProfileForm(forms.ModelForm):
     full_name = forms.CharField(max_length=100, required=True, widget=forms.TextInput(attrs={'class': 'form-control custom-input'}))
     phone_number = forms.CharField(max_length=20, required=False, widget=forms.TextInput(attrs={'class': 'form-control custom-input'}))
     business_name = forms.CharField(max_length=100, required=False, widget=forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'e.g. My Stationery Shop'}))
+    timezone = forms.ChoiceField(choices=[(tz, tz) for tz in sorted(available_timezones())], widget=forms.Select(attrs={'class': 'form-select custom-input'}))
 
     class Meta:
         model = User
@@ -43,6 +46,7 @@ class UserProfileForm(forms.ModelForm):
             self.fields['full_name'].initial = self.user.profile.full_name
             self.fields['phone_number'].initial = self.user.profile.phone_number
             self.fields['business_name'].initial = self.user.profile.business_name
+            self.fields['timezone'].initial = self.user.profile.timezone
             self.fields['email'].initial = self.user.email
 
     def save(self, commit=True):
@@ -54,18 +58,20 @@ class UserProfileForm(forms.ModelForm):
                 user.profile.full_name = self.cleaned_data['full_name']
                 user.profile.phone_number = self.cleaned_data['phone_number']
                 user.profile.business_name = self.cleaned_data['business_name']
+                user.profile.timezone = self.cleaned_data['timezone']
                 user.profile.save()
         return user
 
 class ItemForm(forms.ModelForm):
     class Meta:
         model = Item
-        fields = ['name', 'category', 'company', 'selling_price', 'quantity', 'average_cost']
+        fields = ['name', 'sku', 'category', 'company', 'selling_price', 'quantity', 'average_cost']
         labels = {
             'average_cost': 'Buying Price (Cost)',
         }
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'e.g. Premium Notebook', 'autofocus': True}),
+            'sku': forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'Scan or type (optional)'}),
             'category': forms.Select(attrs={'class': 'form-select custom-input'}),
             'company': forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'Unknown'}),
             'selling_price': forms.NumberInput(attrs={'class': 'form-control custom-input', 'placeholder': '0'}),
@@ -73,6 +79,25 @@ class ItemForm(forms.ModelForm):
             'average_cost': forms.NumberInput(attrs={'class': 'form-control custom-input', 'placeholder': '0'}),
         }
 
+    def __init__(self, user=None, *args, **kwargs):
+        super(ItemForm, self).__init__(*args, **kwargs)
+        self.user = user
+        if user:
+            # Validation still goes through the queryset; the dropdown renders from the cache
+            self.fields['category'].queryset = Category.objects.filter(user=user)
+            self.fields['category'].choices = [('', '---------')] + [
+                (cat['id'], cat['name']) for cat in caching.get_categories(user)
+            ]
+
+    def clean_sku(self):
+        # `user` is not a form field, so the model's (user, sku) constraint is not checked by the form
+        sku = self.cleaned_data.get('sku', '').strip()
+        if sku and self.user:
+            clash = Item.objects.filter(user=self.user, sku=sku).exclude(pk=self.instance.pk)
+            if clash.exists():
+                raise forms.ValidationError("Another product already uses this code.")
+        return sku
+
 class PurchaseForm(forms.ModelForm):
     class Meta:
         model = Purchase
@@ -97,4 +122,47 @@ class CategoryForm(forms.ModelForm):
         fields = ['name']
         widgets = {
             'name': forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'e.g. Office Supplies', 'autofocus': True}),
-        }
\ No newline at end of file
+        }
+
+class RepriceForm(forms.Form):
+    field = forms.ChoiceField(choices=PriceChangeBatch.FIELD_CHOICES, widget=forms.Select(attrs={'class': 'form-select custom-input'}))
+    mode = forms.ChoiceField(choices=PriceChangeBatch.MODE_CHOICES, widget=forms.Select(attrs={'class': 'form-select custom-input'}))
+    amount = forms.DecimalField(max_digits=10, decimal_places=2, widget=forms.NumberInput(attrs={'class': 'form-control custom-input', 'placeholder': 'e.g. 10 or -5', 'step': 'any'}))
+    category = forms.ModelChoiceField(queryset=Category.objects.none(), required=False, empty_label='All categories', widget=forms.Select(attrs={'class': 'form-select custom-input'}))
+    company = forms.CharField(max_length=100, required=False, widget=forms.TextInput(attrs={'class': 'form-control custom-input', 'placeholder': 'Any company'}))
+    min_margin = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control custom-input', 'placeholder': 'Min %'}))
+    max_margin = forms.IntegerField(required=False, widget=forms.NumberInput(attrs={'class': 'form-control custom-input', 'placeholder': 'Max %'}))
+
+    def __init__(self, user=None, *args, **kwargs):
+        super(RepriceForm, self).__init__(*args, **kwargs)
+        if user:
+            self.fields['category'].queryset = Category.objects.filter(user=user)
+            self.fields['category'].choices = [('', 'All categories')] + [
+                (cat['id'], cat['name']) for cat in caching.get_categories(user)
+            ]
+
+    def clean(self):
+        cleaned = super().clean()
+        amount = cleaned.get('amount')
+        if amount is not None:
+            if amount == 0:
+                self.add_error('amount', "The change must not be zero.")
+            elif cleaned.get('mode') == PriceChangeBatch.PERCENT and amount <= -100:
+                self.add_error('amount', "A percentage cut must be less than 100%.")
+            elif cleaned.get('mode') == PriceChangeBatch.AMOUNT and amount != int(amount):
+                self.add_error('amount', "Amounts are in whole PKR.")
+        low, high = cleaned.get('min_margin'), cleaned.get('max_margin')
+        if low is not None and high is not None and low > high:
+            self.add_error('max_margin', "Max margin must not be below min margin.")
+        return cleaned
+
+    def filters(self):
+        """The item filters in the form inventory.repricing.select() takes (and the undo log stores)."""
+        data = self.cleaned_data
+        filters = {
+            'category': data['category'].pk if data.get('category') else None,
+            'company': data.get('company') or None,
+            'min_margin': data.get('min_margin'),
+            'max_margin': data.get('max_margin'),
+        }
+        return {key: value for key, value in filters.items() if value is not None}
@@ -0,0 +1,53 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from inventory import costing, workers
+from inventory.models import Profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays every tenant's purchases, sales and bulk cost changes in order to recompute each "
+        "item's weighted average cost exactly, and reports items whose stored cost has drifted "
+        "(Purchase.save() rounds to whole PKR on every purchase). --fix writes the replayed costs back, and "
+        "fills in the cost of sales recorded without one. Tenants are spread over worker processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Worker processes (default: one per CPU; 1 runs in this process).")
+        parser.add_argument('--user', type=int, action='append', dest='users', help="Only this tenant (repeatable).")
+        parser.add_argument('--fix', action='store_true', help="Write the replayed costs back with bulk_update().")
+
+    def handle(self, *args, **options):
+        tenants = Profile.objects.order_by('user_id').values_list('user_id')
+        if options['users']:
+            tenants = tenants.filter(user_id__in=options['users'])
+        tenants = list(tenants)
+
+        results, failed = [], 0
+        for user_id, result, error in workers.run_per_tenant(costing.audit_tenant, tenants, options['workers'], fix=options['fix']):
+            if error:
+                failed += 1
+                self.stderr.write(f"Tenant {user_id}: {error!r}")
+            else:
+                results.append(result)
+
+        for result in sorted(results, key=lambda result: result['user_id']):
+            if not (result['drifted'] or result['unknown'] or result['unpriced']):
+                continue
+            self.stdout.write(
+                f"Tenant {result['user_id']}: {len(result['drifted'])} of {result['items']} item(s) drifted, "
+                f"{result['unknown']} without a known opening cost, {result['unpriced']} sale(s) without a cost"
+                + (f"; fixed {result['fixed']} item(s)" if options['fix'] else "")
+            )
+            if options['verbosity'] > 1:
+                for item_id, stored, replayed, exact in result['drifted']:
+                    self.stdout.write(f"  item {item_id}: stored {stored}, replayed {replayed} ({exact:.3f})")
+
+        drifted = sum(len(result['drifted']) for result in results)
+        self.stdout.write(
+            f"Audited {len(results)} tenant(s); {drifted} item(s) drifted{' and were fixed' if options['fix'] else ''}; "
+            f"{failed} failed."
+        )
@@ -0,0 +1,68 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import caching, routers
+from inventory.models import Item
+
+
+def ean13(body):
+    """Appends the EAN-13 check digit to a 12-digit string."""
+    odd = sum(int(d) for d in body[0::2])
+    even = sum(int(d) for d in body[1::2])
+    return body + str((10 - (odd + 3 * even) % 10) % 10)
+
+
+class Command(BaseCommand):
+    help = (
+        "Gives every item without a SKU an in-store EAN-13 code (prefix + item id + check digit), "
+        "so existing stock can be labelled and scanned. Items that already have a code are left alone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help="Only this username's items.")
+        parser.add_argument('--prefix', default='20', help="Leading digits; 20-29 are reserved for in-store use.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        if not prefix.isdigit() or not 1 <= len(prefix) <= 4:
+            raise CommandError("--prefix must be 1 to 4 digits.")
+        width = 12 - len(prefix)
+
+        items = Item.objects.filter(sku='')
+        if options['user']:
+            # Accounts live on the default database, items maybe on a shard
+            items = items.filter(user_id__in=list(User.objects.filter(username=options['user']).values_list('pk', flat=True)))
+
+        done, tenants = 0, set()
+        for alias in routers.shard_aliases():
+            with routers.tenant_database(alias=alias):
+                done += self._backfill(items, prefix, width, tenants, options['batch_size'])
+
+        # bulk_update() sends no signals
+        for user_id in tenants:
+            caching.bump_version(caching.SCAN, user_id)
+            caching.bump_version(caching.CATALOG, user_id)
+        self.stdout.write(f"Assigned {done} SKU(s) across {len(tenants)} tenant(s).")
+
+    def _backfill(self, items, prefix, width, tenants, batch_size):
+        # One shard: the one in context
+        done, last_pk = 0, 0
+        while True:
+            batch = list(items.filter(pk__gt=last_pk).order_by('pk').only('pk', 'user_id')[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            for item in batch:
+                if len(str(item.pk)) > width:
+                    raise CommandError(f"Item {item.pk} does not fit in a {prefix} code; use a shorter prefix.")
+                item.sku = ean13(f"{prefix}{item.pk:0{width}d}")
+                tenants.add(item.user_id)
+            # Codes are derived from unique ids, so they only clash with a code someone typed in by hand
+            taken = set(Item.objects.filter(sku__in=[item.sku for item in batch]).values_list('user_id', 'sku'))
+            batch = [item for item in batch if (item.user_id, item.sku) not in taken]
+            with transaction.atomic(using=routers.current_database()):
+                Item.objects.bulk_update(batch, ['sku'])
+            done += len(batch)
+        return done
@@ -0,0 +1,72 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from inventory import caching, valuation
+from inventory.models import Category, Item, SaleRecord
+from inventory.views import HomeView, ProductListView, SalesBookView
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Measures render time of the heavy pages with and without {% cache %} fragments on a throwaway dataset."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help="Items and sale lines to create (default 5000).")
+        parser.add_argument('--repeat', type=int, default=5, help="Renders per measurement (default 5).")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        try:
+            with transaction.atomic():
+                user = self._build_dataset(rows)
+                self.stdout.write(f"Dataset: {rows} items, {rows} sale lines\n")
+                self.stdout.write(f"{'page':<14}{'uncached ms':>14}{'cached ms':>12}{'speedup':>10}")
+                for name, view in (
+                    ('products', ProductListView.as_view()),
+                    ('sales book', SalesBookView.as_view()),
+                    ('dashboard', HomeView.as_view()),
+                ):
+                    cold = self._measure(view, user, repeat, bust=True)
+                    warm = self._measure(view, user, repeat, bust=False)
+                    self.stdout.write(f"{name:<14}{cold:>14.1f}{warm:>12.1f}{cold / warm:>9.1f}x")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _build_dataset(self, rows):
+        user = User.objects.create_user(username=f"bench-{time.time_ns()}")
+        category = Category.objects.create(name='Bench', user=user)
+        items = Item.objects.bulk_create([
+            Item(name=f"Item {i}", category=category, quantity=i % 40, average_cost=50, selling_price=80, user=user)
+            for i in range(rows)
+        ])
+        SaleRecord.objects.bulk_create([
+            SaleRecord(order_id=f"ORD-B{i // 3:06d}", product=items[i], quantity=1, total_price=80,
+                       unit_cost_at_sale=50, user=user)
+            for i in range(rows)
+        ])
+        valuation.rebuild(user.pk)
+        return user
+
+    def _measure(self, view, user, repeat, bust):
+        timings = []
+        for _ in range(repeat):
+            if bust:
+                # A fresh version is exactly what a data change does: every fragment misses
+                caching.bump_all(user.pk)
+            request = RequestFactory().get('/')
+            request.user = user
+            request.tenant_tz = timezone.get_current_timezone()
+            start = time.perf_counter()
+            view(request).render()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,70 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from inventory import valuation
+from inventory.models import Category, Item
+
+
+class Rollback(Exception):
+    pass
+
+
+# (label, session engine, auth backend)
+MODES = (
+    ('db sessions, db user', 'django.contrib.sessions.backends.db', 'django.contrib.auth.backends.ModelBackend'),
+    ('cached_db, cached user', 'django.contrib.sessions.backends.cached_db', 'inventory.backends.CachedModelBackend'),
+    ('signed cookies, cached user', 'django.contrib.sessions.backends.signed_cookies', 'inventory.backends.CachedModelBackend'),
+)
+
+PAGES = (('POS', 'sales'), ('dashboard', 'dashboard'))
+
+
+class Command(BaseCommand):
+    help = "Counts queries and time per warm request for the POS and dashboard under each session/auth mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20, help="Requests per measurement (default 20).")
+
+    def handle(self, *args, **options):
+        repeat = options['repeat']
+        self.stdout.write(f"{'mode':<30}{'page':<12}{'queries':>9}{'ms':>9}")
+        try:
+            with transaction.atomic():
+                user = self._build_dataset()
+                for label, engine, backend in MODES:
+                    with override_settings(SESSION_ENGINE=engine, AUTHENTICATION_BACKENDS=[backend],
+                                           ALLOWED_HOSTS=['testserver'], THROTTLE_ENABLED=False):
+                        client = Client()
+                        client.force_login(user, backend=backend)
+                        for page, url_name in PAGES:
+                            queries, ms = self._measure(client, reverse(url_name), repeat)
+                            self.stdout.write(f"{label:<30}{page:<12}{queries:>9}{ms:>9.1f}")
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _build_dataset(self):
+        user = User.objects.create_user(username=f"bench-{time.time_ns()}")
+        category = Category.objects.create(name='Bench', user=user)
+        Item.objects.bulk_create([
+            Item(name=f"Item {i}", category=category, quantity=10, average_cost=50, selling_price=80, user=user)
+            for i in range(50)
+        ])
+        valuation.rebuild(user.pk)
+        return user
+
+    def _measure(self, client, url, repeat):
+        # The first request warms the fragment and lookup caches; only steady state is reported
+        client.get(url, secure=True)
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for _ in range(repeat):
+                client.get(url, secure=True)
+            elapsed = time.perf_counter() - start
+        return len(ctx.captured_queries) // repeat, elapsed * 1000 / repeat
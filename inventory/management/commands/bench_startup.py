@@ -0,0 +1,69 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+# A fresh interpreter per run: boot Django through the WSGI entry point, serve one request,
+# print the status and elapsed milliseconds. Run under `python -X importtime`.
+BOOT = """
+import os, time
+t0 = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'stationery_saas.settings')
+from django.core.wsgi import get_wsgi_application
+application = get_wsgi_application()
+{extra}
+from django.test import Client
+from django.test.utils import setup_test_environment
+setup_test_environment()
+response = Client().get({url!r}, secure=True)
+print(response.status_code, (time.perf_counter() - t0) * 1000)
+"""
+
+# 'eager' reproduces the module-level imports views.py used to have
+SCENARIOS = (
+    ('lazy imports', ''),
+    ('eager imports', 'import openpyxl, openpyxl.styles, inventory.analytics, inventory.checkout'),
+)
+
+HEAVY = ('numpy', 'openpyxl', 'pandas')
+
+IMPORT_LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|\s*(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures worker start-up: time from a fresh interpreter to the first response, plus "
+        "`python -X importtime` totals and the cost of heavy packages that got imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=5, help="Fresh interpreters per scenario (default 5).")
+        parser.add_argument('--url', default='/login/', help="Path of the first request (default /login/).")
+
+    def _run(self, extra, url):
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', BOOT.format(extra=extra, url=url)],
+            cwd=settings.BASE_DIR, env=os.environ.copy(), capture_output=True, text=True, check=True,
+        )
+        status, ms = result.stdout.split()[-2:]
+        total_us, heavy = 0, {}
+        for match in IMPORT_LINE.finditer(result.stderr):
+            self_us, cumulative_us, name = match.groups()
+            total_us += int(self_us)
+            if name in HEAVY:
+                heavy[name] = int(cumulative_us) / 1000
+        return int(status), float(ms), total_us / 1000, heavy
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'scenario':<16}{'status':>7}{'first response ms':>19}{'imports ms':>12}  heavy packages (ms)")
+        for label, extra in SCENARIOS:
+            runs = [self._run(extra, options['url']) for _ in range(options['repeat'])]
+            status = runs[-1][0]
+            first_response = statistics.median(run[1] for run in runs)
+            imports = statistics.median(run[2] for run in runs)
+            heavy = ', '.join(f"{name} {ms:.0f}" for name, ms in sorted(runs[-1][3].items())) or 'none'
+            self.stdout.write(f"{label:<16}{status:>7}{first_response:>19.1f}{imports:>12.1f}  {heavy}")
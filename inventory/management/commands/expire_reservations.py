@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from inventory import reservations
+
+
+class Command(BaseCommand):
+    help = "Deletes expired POS stock holds. Safe to run at any interval (e.g. every minute from cron)."
+
+    def handle(self, *args, **options):
+        removed = reservations.sweep()
+        self.stdout.write(f"Removed {removed} expired hold(s).")
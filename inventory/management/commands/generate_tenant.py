@@ -0,0 +1,210 @@
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from fractions import Fraction
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from inventory import caching, costing, pricing, valuation, workers
+from inventory.models import Category, Item, Purchase, SaleRecord
+
+COMPANIES = ('Dollar', 'Piano', 'Oxford', 'Deer', 'Faber-Castell', 'Pelikan', 'Staedtler', 'Local')
+NOUNS = ('Pen', 'Pencil', 'Notebook', 'Register', 'Marker', 'Eraser', 'Sharpener', 'Ruler',
+         'Stapler', 'File', 'Glue Stick', 'Highlighter', 'Chart Paper', 'Geometry Box', 'Envelope')
+ADJECTIVES = ('Blue', 'Black', 'Red', 'A4', 'A5', 'Ruled', 'Plain', 'Gel', 'Ball', 'Jumbo',
+              'Mini', 'Premium', 'School', 'Office', 'Color')
+
+SHOP_OPEN_HOUR = 9
+SHOP_HOURS = 12
+# History is generated a window at a time; each window opens with a restock, an hour before the
+# shop opens, of whatever its sales will need
+CHUNK_DAYS = 30
+SALE_FIELDS = ('order_id', 'product', 'quantity', 'total_price', 'discount', 'unit_cost_at_sale', 'date_sold', 'user')
+PURCHASE_FIELDS = ('item', 'quantity', 'unit_price', 'timestamp', 'user')
+
+
+class Command(BaseCommand):
+    help = (
+        "Creates synthetic tenants with a catalog and years of restocks and multi-line sales "
+        "(allocated discounts, some legacy rows without order_id), in time order with running "
+        "average costs, so audit_costs finds nothing to fix. Deterministic for a given --seed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=1)
+        parser.add_argument('--items', type=int, default=500, help="Catalog size per tenant (default 500).")
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--years', type=float, default=2, help="Years of sales history (default 2).")
+        parser.add_argument('--orders-per-day', type=float, default=40, help="Mean orders per day (default 40).")
+        parser.add_argument('--max-lines', type=int, default=6, help="Most lines in one order (default 6).")
+        parser.add_argument('--discount-share', type=float, default=0.3, help="Share of orders with a discount.")
+        parser.add_argument('--legacy-share', type=float, default=0.03,
+                            help="Share of orders saved as single legacy lines without order_id.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--prefix', default='load', help="Usernames are <prefix>-<seed>-<n>.")
+        parser.add_argument('--password', help="Password for the generated users (default: unusable).")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.batch_size = options['batch_size']
+        if options['items'] < 1 or options['categories'] < 1 or options['max_lines'] < 1:
+            raise CommandError("--items, --categories and --max-lines must be at least 1.")
+
+        total_start = time.perf_counter()
+        total_rows = 0
+        for n in range(options['tenants']):
+            username = f"{options['prefix']}-{options['seed']}-{n}"
+            if User.objects.filter(username=username).exists():
+                raise CommandError(f"User {username} already exists; pick another --seed or --prefix.")
+            start = time.perf_counter()
+            # One RNG per tenant so any tenant can be regenerated on its own
+            rng = np.random.default_rng([options['seed'], n])
+            with transaction.atomic():
+                user, rows = self._tenant(username, rng)
+            caching.bump_all(user.pk)
+            total_rows += rows
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"{username}: {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+        elapsed = time.perf_counter() - total_start
+        self.stdout.write(self.style.SUCCESS(f"Created {total_rows} rows in {elapsed:.1f}s."))
+
+    def _tenant(self, username, rng):
+        opts = self.options
+        user = User.objects.create_user(username=username, password=opts['password'])
+        tz = ZoneInfo(caching.get_profile(user).timezone)
+
+        categories = Category.objects.bulk_create(
+            [Category(name=f"{noun}s {i}", user=user) for i, noun in
+             enumerate(np.resize(NOUNS, opts['categories']))],
+            batch_size=self.batch_size,
+        )
+
+        n_items = opts['items']
+        base_cost = rng.integers(10, 2000, n_items)
+        markup = rng.uniform(1.15, 1.8, n_items)
+        items = Item.objects.bulk_create([
+            Item(
+                name=f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} #{i}",
+                category=categories[i % len(categories)],
+                company=str(rng.choice(COMPANIES)),
+                average_cost=int(base_cost[i]),
+                selling_price=int(base_cost[i] * markup[i]),
+                quantity=0,
+                user=user,
+            )
+            for i in range(n_items)
+        ], batch_size=self.batch_size)
+        self.item_ids = np.array([item.pk for item in items])
+        self.prices = np.array([item.selling_price for item in items])
+
+        # Popularity follows a Zipf-like curve so a few items dominate sales, like a real shop
+        popularity = 1.0 / np.arange(1, n_items + 1) ** 1.1
+        popularity = rng.permutation(popularity / popularity.sum())
+
+        days = max(int(opts['years'] * 365), 1)
+        today = datetime.now(tz).replace(hour=0, minute=0, second=0, microsecond=0)
+        first_day = today - timedelta(days=days)
+        legacy_until = days // 10  # legacy rows predate order ids, so keep them early in the history
+
+        # Running stock and exact average cost per item, as Purchase.save() and checkout would leave them
+        stock = np.zeros(n_items, dtype=np.int64)
+        cost = [None] * n_items
+        rows = 0
+        order_seq = 0
+        for chunk_start in range(0, days, CHUNK_DAYS):
+            chunk_days = min(CHUNK_DAYS, days - chunk_start)
+            orders = self._orders(rng, chunk_start, chunk_days, legacy_until, popularity)
+            restocked_at = first_day + timedelta(days=chunk_start, hours=SHOP_OPEN_HOUR - 1)
+            rows += self._restock(rng, user, orders, base_cost, stock, cost, restocked_at)
+            rows += self._sales(rng, user, orders, first_day, cost, order_seq)
+            order_seq += len(orders['legacy'])
+
+        for item, quantity, item_cost in zip(items, stock, cost):
+            item.quantity = int(quantity)
+            if item_cost is not None:
+                item.average_cost = costing.half_up(item_cost)
+        Item.objects.bulk_update(items, ['quantity', 'average_cost'], batch_size=self.batch_size)
+        valuation.rebuild(user.pk)
+        return user, rows + len(categories) + n_items
+
+    def _orders(self, rng, chunk_start, chunk_days, legacy_until, popularity):
+        """The window's orders and their lines (item index and quantity), not yet priced."""
+        opts = self.options
+        per_day = rng.poisson(opts['orders_per_day'], chunk_days)
+        n_orders = int(per_day.sum())
+        day_of_order = np.repeat(np.arange(chunk_start, chunk_start + chunk_days), per_day)
+        seconds = rng.integers(0, SHOP_HOURS * 3600, n_orders) + SHOP_OPEN_HOUR * 3600
+        legacy = (day_of_order < legacy_until) & (rng.random(n_orders) < opts['legacy_share'] * 10)
+        lines_per_order = np.where(legacy, 1, rng.integers(1, opts['max_lines'] + 1, n_orders))
+        order_of_line = np.repeat(np.arange(n_orders), lines_per_order)
+        return {
+            'day': day_of_order,
+            'seconds': seconds,
+            'legacy': legacy,
+            'order_of_line': order_of_line,
+            'product': rng.choice(len(popularity), len(order_of_line), p=popularity),
+            'quantity': np.minimum(rng.geometric(0.55, len(order_of_line)), 12),
+        }
+
+    def _restock(self, rng, user, orders, base_cost, stock, cost, at):
+        """
+        Buys, at prices around the base cost, what the window will sell beyond the stock on hand,
+        plus some spare; the running average moves like in Purchase.save(), kept exact here.
+        """
+        demand = np.bincount(orders['product'], weights=orders['quantity'], minlength=len(stock)).astype(np.int64)
+        short = np.flatnonzero(demand > stock)
+        bought = demand[short] - stock[short] + rng.integers(5, 60, len(short))
+        unit_price = (base_cost[short] * rng.uniform(0.9, 1.1, len(short))).astype(np.int64)
+        for i, quantity, price in zip(short.tolist(), bought.tolist(), unit_price.tolist()):
+            on_hand = int(stock[i])
+            cost[i] = (on_hand * (cost[i] or 0) + Fraction(quantity * price)) / (on_hand + quantity)
+        stock[short] += bought
+        stock -= demand
+
+        timestamp = connection.ops.adapt_datetimefield_value(at.astimezone(dt_timezone.utc))
+        return workers.insert_rows(Purchase, PURCHASE_FIELDS, (
+            (item_id, quantity, price, timestamp, user.pk)
+            for item_id, quantity, price in zip(self.item_ids[short].tolist(), bought.tolist(), unit_price.tolist())
+        ), batch_size=self.batch_size)
+
+    def _sales(self, rng, user, orders, first_day, cost, order_seq):
+        opts = self.options
+        legacy, order_of_line, product, quantity = (
+            orders['legacy'], orders['order_of_line'], orders['product'], orders['quantity'],
+        )
+        n_orders = len(legacy)
+        if not n_orders:
+            return 0
+        # Every item sold in the window was bought before it opened, so its cost is known
+        unit_cost = np.array([costing.half_up(c) if c is not None else 0 for c in cost], dtype=np.int64)[product]
+        total = self.prices[product] * quantity
+
+        # Flat order discounts, never taking an order below cost, split over the lines like
+        # checkout does (pricing.allocate: pro rata, largest remainder)
+        subtotal = np.bincount(order_of_line, weights=total, minlength=n_orders).astype(np.int64)
+        order_cost = np.bincount(order_of_line, weights=unit_cost * quantity, minlength=n_orders).astype(np.int64)
+        wants = (rng.random(n_orders) < opts['discount_share']) & ~legacy
+        discount = np.where(wants, (subtotal * rng.uniform(0, 0.1, n_orders)).astype(np.int64), 0)
+        discount = np.minimum(discount, np.maximum(subtotal - order_cost, 0))
+        share = pricing.allocate_groups(discount, total, order_of_line)
+
+        adapt = connection.ops.adapt_datetimefield_value
+        timestamps = [
+            adapt((first_day + timedelta(days=day, seconds=sec)).astimezone(dt_timezone.utc))
+            for day, sec in zip(orders['day'].tolist(), orders['seconds'].tolist())
+        ]
+        order_ids = [
+            None if is_legacy else f"ORD-{order_seq + i:08X}"
+            for i, is_legacy in enumerate(legacy.tolist())
+        ]
+        return workers.insert_rows(SaleRecord, SALE_FIELDS, (
+            (order_ids[o], p, q, t, d, c, timestamps[o], user.pk)
+            for o, p, q, t, d, c in zip(
+                order_of_line.tolist(), self.item_ids[product].tolist(), quantity.tolist(),
+                total.tolist(), share.tolist(), unit_cost.tolist(),
+            )
+        ), batch_size=self.batch_size)
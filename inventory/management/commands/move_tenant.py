@@ -0,0 +1,144 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from inventory import caching, routers, workers
+from inventory.models import (
+    Category, ChangeEvent, InventoryValuation, Item, ItemForecast, PriceChange, PriceChangeBatch, Promotion,
+    Purchase, SaleRecord, StockReservation, TenantShard, ValuationSnapshot,
+)
+
+# Copy order: every model after the ones it points at. Rows get new primary keys on the target
+# (the source's ids may already be taken there), so foreign keys to Category, Item and
+# PriceChangeBatch are translated as rows are copied. The only primary keys kept are foreign
+# keys themselves: ItemForecast's item (translated) and InventoryValuation's user.
+# ChangeEvents are not copied, since their payloads hold the source's item ids; live screens
+# pick up from the target's newest event after reconnecting. They are still deleted with the
+# rest, or a tenant moved back would replay them.
+MODELS = (
+    Category, Item, SaleRecord, Purchase, Promotion, StockReservation,
+    InventoryValuation, ValuationSnapshot, ItemForecast, PriceChangeBatch, PriceChange,
+)
+REMAPPED = (Category, Item, PriceChangeBatch)
+NOT_COPIED = (ChangeEvent,)
+
+
+def tenant_rows(model, user_id, alias):
+    manager = Item.all_objects if model is Item else model._default_manager
+    if model is PriceChange:
+        return manager.using(alias).filter(batch__user_id=user_id)
+    return manager.using(alias).filter(user_id=user_id)
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves one tenant's inventory rows (categories, items, sales, purchases and everything hanging "
+        "off them) to another database in TENANT_SHARDS, or back to 'default'. The tenant gets 503s "
+        "while it runs. Rows are copied in batches, counts are checked, then the source rows are "
+        "deleted and the shard map is switched. Accounts stay in 'default'. Needs a shared cache "
+        "when several processes serve requests, so they all see the move."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', help="Username or user id.")
+        parser.add_argument('target', help="Database alias to move the tenant to.")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--settle', type=float, default=5,
+                            help="Seconds to wait for in-flight requests after blocking the tenant.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None and options['user'].isdigit():
+            user = User.objects.filter(pk=options['user']).first()
+        if user is None:
+            raise CommandError(f"No user {options['user']!r}.")
+        target = options['target']
+        if target not in routers.shard_aliases():
+            raise CommandError(f"Unknown database {target!r}; choose from {', '.join(routers.shard_aliases())}.")
+        source = routers.shard_for(user.pk)
+        if source == target:
+            raise CommandError(f"{user.username} is already in {target!r}.")
+
+        counts = {model: tenant_rows(model, user.pk, source).count() for model in MODELS}
+        if options['dry_run']:
+            summary = ", ".join(f"{count} {model.__name__}" for model, count in counts.items())
+            self.stdout.write(f"Would move {user.username} from {source!r} to {target!r}: {summary}.")
+            return
+        if any(tenant_rows(model, user.pk, target).exists() for model in MODELS):
+            raise CommandError(f"{target!r} already holds rows for {user.username}; clean them up first.")
+
+        TenantShard.objects.update_or_create(user=user, defaults={'database': source, 'moving': True})
+        try:
+            time.sleep(options['settle'])
+            # Sources may have changed between the dry count and the block taking effect
+            counts = {model: tenant_rows(model, user.pk, source).count() for model in MODELS}
+            self._copy(user, source, target, options['batch_size'])
+            for model, count in counts.items():
+                copied = tenant_rows(model, user.pk, target).count()
+                if copied != count:
+                    raise CommandError(f"{model.__name__}: {count} row(s) in {source!r} but {copied} copied.")
+        except BaseException:
+            self._delete(user.pk, target, options['batch_size'])
+            TenantShard.objects.filter(user=user).update(moving=False)
+            routers.forget_shard(user.pk)
+            raise
+
+        self._delete(user.pk, source, options['batch_size'])
+        TenantShard.objects.update_or_create(user=user, defaults={'database': target, 'moving': False})
+        # Cached pages and scan results were built from the source's ids
+        caching.bump_all(user.pk)
+        caching.bump_version(caching.SCAN, user.pk)
+        summary = ", ".join(f"{count} {model.__name__}" for model, count in counts.items())
+        self.stdout.write(f"Moved {user.username} from {source!r} to {target!r}: {summary}.")
+
+    def _copy(self, user, source, target, batch_size):
+        # Shards hold their own auth_user table; the tenant's foreign keys need a row there
+        if target != 'default':
+            User.objects.using(target).bulk_create(
+                [User(pk=user.pk, username=user.username, password='!')], ignore_conflicts=True,
+            )
+        maps = {model: {} for model in REMAPPED}
+        with workers.explicit_timestamps(*MODELS):
+            for model in MODELS:
+                pk = model._meta.pk
+                translate = {
+                    field.attname: maps[field.related_model]
+                    for field in model._meta.concrete_fields
+                    if field.is_relation and field.related_model in maps
+                }
+                last_pk = None
+                while True:
+                    rows = tenant_rows(model, user.pk, source).order_by('pk')
+                    if last_pk is not None:
+                        rows = rows.filter(pk__gt=last_pk)
+                    rows = list(rows[:batch_size])
+                    if not rows:
+                        break
+                    last_pk = rows[-1].pk
+                    copies = []
+                    for row in rows:
+                        values = {field.attname: getattr(row, field.attname) for field in model._meta.concrete_fields}
+                        for attname, mapping in translate.items():
+                            if values[attname] is not None:
+                                values[attname] = mapping[values[attname]]
+                        if not pk.is_relation:
+                            del values[pk.attname]
+                        copies.append(model(**values))
+                    with transaction.atomic(using=target):
+                        model._default_manager.using(target).bulk_create(copies)
+                    if model in maps:
+                        maps[model].update((row.pk, copy.pk) for row, copy in zip(rows, copies))
+
+    def _delete(self, user_id, alias, batch_size):
+        # Reverse order, so nothing is deleted while rows still point at it
+        for model in reversed(MODELS + NOT_COPIED):
+            while True:
+                with transaction.atomic(using=alias):
+                    pks = list(tenant_rows(model, user_id, alias).values_list('pk', flat=True)[:batch_size])
+                    if not pks:
+                        break
+                    batch = model._default_manager.using(alias).filter(pk__in=pks)
+                    batch._raw_delete(alias)
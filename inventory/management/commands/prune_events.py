@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from inventory import events
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes change-feed events older than --days (default 2). Pages only need events since they "
+        "were loaded, so the feed can be kept short. Run daily from cron."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2)
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        removed = events.prune(options['days'], options['batch_size'])
+        self.stdout.write(f"Removed {removed} event(s).")
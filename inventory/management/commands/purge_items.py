@@ -0,0 +1,81 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from inventory import caching, routers
+from inventory.models import Item, ItemForecast, PriceChange, Promotion, Purchase, SaleRecord, StockReservation
+
+# Rows that point at an item, deleted before the item itself. Nothing references these in
+# turn, so they can skip Django's collector (which loads every row into Python first).
+DEPENDENTS = (
+    (SaleRecord, 'product_id'),
+    (Purchase, 'item_id'),
+    (Promotion, 'item_id'),
+    (StockReservation, 'item_id'),
+    (ItemForecast, 'item_id'),
+    (PriceChange, 'item_id'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Permanently removes items that were deleted (hidden) more than --days ago, together with "
+        "their sales, purchases, promotions and holds. Works in short batches so it never holds long "
+        "locks; safe to stop and re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help="Only items deleted at least this many days ago.")
+        parser.add_argument('--items-per-batch', type=int, default=100)
+        parser.add_argument('--rows-per-batch', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def _delete_in_batches(self, model, column, item_ids, size):
+        deleted = 0
+        while True:
+            with transaction.atomic(using=routers.current_database()):
+                pks = list(model.objects.filter(**{f"{column}__in": item_ids}).values_list('pk', flat=True)[:size])
+                if not pks:
+                    return deleted
+                batch = model.objects.filter(pk__in=pks)
+                deleted += batch._raw_delete(batch.db)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        doomed = Item.all_objects.filter(is_active=False, deleted_at__lte=cutoff)
+        if options['dry_run']:
+            count = sum(doomed.using(alias).count() for alias in routers.shard_aliases())
+            self.stdout.write(f"{count} item(s) would be purged.")
+            return
+
+        totals = {model.__name__: 0 for model, _ in DEPENDENTS}
+        items, tenants = 0, set()
+        for alias in routers.shard_aliases():
+            with routers.tenant_database(alias=alias):
+                items += self._purge(doomed, totals, tenants, options)
+
+        # _raw_delete() sends no signals. Hidden items were already out of the valuation.
+        for user_id in tenants:
+            caching.bump_all(user_id)
+        summary = ", ".join(f"{count} {name}" for name, count in totals.items())
+        self.stdout.write(f"Purged {items} item(s) across {len(tenants)} tenant(s); removed {summary}.")
+
+    def _purge(self, doomed, totals, tenants, options):
+        # One shard: the one in context
+        items, last_pk = 0, 0
+        while True:
+            batch = list(doomed.filter(pk__gt=last_pk).order_by('pk').values_list('pk', 'user_id')[:options['items_per_batch']])
+            if not batch:
+                break
+            last_pk = batch[-1][0]
+            item_ids = [pk for pk, _ in batch]
+            for model, column in DEPENDENTS:
+                totals[model.__name__] += self._delete_in_batches(model, column, item_ids, options['rows_per_batch'])
+            with transaction.atomic(using=routers.current_database()):
+                # Skips anything restored since the batch was read
+                gone = Item.all_objects.filter(pk__in=item_ids, is_active=False)
+                items += gone._raw_delete(gone.db)
+            tenants.update(user_id for _, user_id in batch)
+        return items
@@ -0,0 +1,138 @@
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from . import caching, routers, throttling
+from .periods import tenant_timezone
+
+
+class TenantTimezoneMiddleware:
+    """
+    Activates the shop's timezone for the rest of the request, so "today" and month
+    boundaries are computed once, in local time, and templates render local dates.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.user.is_authenticated:
+            request.tenant_tz = tenant_timezone(request.user)
+            timezone.activate(request.tenant_tz)
+        else:
+            request.tenant_tz = timezone.get_default_timezone()
+            timezone.deactivate()
+        try:
+            return self.get_response(request)
+        finally:
+            timezone.deactivate()
+
+
+class TenantShardMiddleware:
+    """
+    Routes the request's tenant-model queries to the shop's shard (see inventory/routers.py).
+    While move_tenant is copying the shop, its requests get a 503 with Retry-After instead.
+    Must come after AuthenticationMiddleware.
+    """
+
+    RETRY_AFTER = 30
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not request.user.is_authenticated:
+            return self.get_response(request)
+        database, moving = routers.tenant_state(request.user.pk)
+        if moving:
+            response = HttpResponse("Your shop is being moved; please try again shortly.", status=503, content_type='text/plain')
+            response['Retry-After'] = str(self.RETRY_AFTER)
+            return response
+        with routers.tenant_database(alias=database):
+            response = self.get_response(request)
+        if response.streaming and not response.is_async:
+            response.streaming_content = routers.tenant_stream(response.streaming_content, database)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sets request.use_replica for views decorated with routers.replica_reads.
+    Any write request (POST etc.) pins the tenant to the primary for
+    REPLICA_STICKY_SECONDS, so the shop sees its own sale on the next page load and no
+    {% cache %} fragment is rebuilt from a replica that has not caught up yet.
+    Must come after AuthenticationMiddleware.
+    """
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        enabled = routers.replica_configured() and request.user.is_authenticated
+        request.use_replica = (
+            enabled
+            and request.method in self.SAFE_METHODS
+            and not caching.pinned_to_primary(request.user.pk)
+        )
+        response = self.get_response(request)
+        if enabled and request.method not in self.SAFE_METHODS:
+            caching.pin_to_primary(request.user.pk, getattr(settings, 'REPLICA_STICKY_SECONDS', 10))
+        return response
+
+
+class TenantThrottleMiddleware:
+    """
+    Spends the tenant's throttle tokens for each request by the view's cost class and caps
+    concurrent exports (see inventory/throttling.py). Refusals are 429s with Retry-After.
+    Must come after AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.export_slot_held = False
+        try:
+            response = self.get_response(request)
+        except Exception:
+            if request.export_slot_held:
+                throttling.release_slot(request.user.pk)
+            raise
+        if request.export_slot_held:
+            if response.streaming:
+                # Held until the body has been sent
+                response.streaming_content = throttling.release_after(response.streaming_content, request.user.pk)
+            else:
+                throttling.release_slot(request.user.pk)
+        return response
+
+    def _refuse(self, request, message, retry_after):
+        if request.path.startswith('/api/') or request.content_type == 'application/json':
+            response = JsonResponse({'status': 'error', 'message': message}, status=429)
+        else:
+            response = HttpResponse(message, status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not throttling.enabled() or not request.user.is_authenticated:
+            return None
+        klass = throttling.cost_class(request.resolver_match.url_name)
+        user_id = request.user.pk
+        # The slot is checked first so a refused export spends no tokens
+        if klass == throttling.EXPORT:
+            if not throttling.acquire_slot(user_id):
+                throttling.record(user_id, klass, throttling.CONCURRENCY)
+                return self._refuse(request, "Another export is still running; try again when it finishes.", 5)
+            request.export_slot_held = True
+        wait = throttling.take(user_id, throttling.COSTS[klass])
+        if wait:
+            if request.export_slot_held:
+                throttling.release_slot(user_id)
+                request.export_slot_held = False
+            throttling.record(user_id, klass, throttling.RATE_LIMITED)
+            return self._refuse(request, "Too many requests; please wait a moment and try again.", wait)
+        return None
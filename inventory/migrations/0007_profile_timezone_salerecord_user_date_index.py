@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 17:58
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_salerecord_discount'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='timezone',
+            field=models.CharField(default='Asia/Karachi', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='salerecord',
+            index=models.Index(fields=['user', 'date_sold'], name='sale_user_date_idx'),
+        ),
+    ]
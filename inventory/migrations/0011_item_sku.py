@@ -0,0 +1,24 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_inventory_valuation'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='item',
+            name='sku',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='SKU / barcode'),
+        ),
+        migrations.AddConstraint(
+            model_name='item',
+            constraint=models.UniqueConstraint(condition=models.Q(('sku', ''), _negated=True), fields=('user', 'sku'), name='item_user_sku_uniq'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_changeevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItemForecast',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='inventory.item')),
+                ('moving_average', models.FloatField()),
+                ('smoothed', models.FloatField()),
+                ('days_left', models.FloatField(blank=True, null=True)),
+                ('reorder_point', models.PositiveIntegerField()),
+                ('reorder_qty', models.PositiveIntegerField()),
+                ('computed_for', models.DateField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'days_left'], name='forecast_user_days_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.8 on 2026-10-19 18:45
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_itemforecast'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceChangeBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(choices=[('selling_price', 'Selling price'), ('average_cost', 'Buying price (cost)')], max_length=20)),
+                ('mode', models.CharField(choices=[('percent', 'Percent'), ('amount', 'Amount (PKR)')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('filters', models.JSONField(blank=True, default=dict)),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('undone_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PriceChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_value', models.PositiveIntegerField()),
+                ('new_value', models.PositiveIntegerField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='inventory.item')),
+                ('batch', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='inventory.pricechangebatch')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pricechangebatch',
+            index=models.Index(fields=['user', '-created_at'], name='pricebatch_user_created_idx'),
+        ),
+    ]
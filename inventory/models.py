@@ -1,7 +1,10 @@
-from django.db import models, transaction
+from django.db import models
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from django.utils import timezone
+from . import caching, events, routers, valuation
 
 # --- Profile Model ---
 class Profile(models.Model):
@@ -9,19 +12,35 @@ class Profile(models.Model):
     full_name = models.CharField(max_length=100, blank=True)
     phone_number = models.CharField(max_length=20, blank=True)
     business_name = models.CharField(max_length=100, default="IMS", blank=True)
+    timezone = models.CharField(max_length=64, default="Asia/Karachi") # Shop's local zone; decides where the business day starts
 
     def __str__(self):
         return f"{self.user.username}'s Profile"
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
+    # Callers that change profile fields save the profile themselves, so nothing is
+    # written here on ordinary User saves (e.g. the last_login update on every login).
     if created:
         Profile.objects.create(user=instance)
 
-@receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
-    if hasattr(instance, 'profile'):
-        instance.profile.save()
+
+# --- Tenant Shards ---
+# Which database holds a tenant's inventory rows (see inventory/routers.py); no row means `default`.
+# Kept in `default` with the accounts. `manage.py move_tenant` is the only writer.
+class TenantShard(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    database = models.CharField(max_length=50, default='default')
+    moving = models.BooleanField(default=False) # Set while move_tenant copies the tenant; its requests get a 503
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id} -> {self.database}{' (moving)' if self.moving else ''}"
+
+@receiver(post_save, sender=TenantShard)
+@receiver(post_delete, sender=TenantShard)
+def refresh_tenant_shard(sender, instance, **kwargs):
+    routers.forget_shard(instance.user_id)
 
 
 # --- Inventory Models ---
@@ -35,6 +54,10 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = "Categories"
 
+class ActiveItemManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_active=True)
+
 class Item(models.Model):
     name = models.CharField(max_length=100)
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
@@ -42,15 +65,56 @@ class Item(models.Model):
     quantity = models.IntegerField(default=0)
     average_cost = models.PositiveIntegerField(default=0) 
     selling_price = models.PositiveIntegerField()
+    sku = models.CharField("SKU / barcode", max_length=64, blank=True, default='') # What the POS scanner reads
     user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # Deleting a product only hides it, so its sales history stays reportable. `manage.py purge_items`
+    # removes hidden products (and their history) for good, in batches, outside any request.
+    is_active = models.BooleanField(default=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveItemManager()
+    all_objects = models.Manager() # Includes deleted items; also what sale.product etc. resolve through
+
+    class Meta:
+        base_manager_name = 'all_objects'
+        constraints = [
+            # Also the index behind /api/scan/<code>/; items without a code, and deleted items, are left out
+            models.UniqueConstraint(fields=['user', 'sku'], condition=models.Q(is_active=True) & ~models.Q(sku=''),
+                                    name='item_user_sku_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'is_active'], name='item_user_active_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Value as loaded, so a later save() moves the tenant's running valuation by the difference
+        if {'quantity', 'average_cost', 'is_active'}.issubset(field_names):
+            instance._loaded_value = instance.book_value
+        return instance
+
     @property
     def total_value(self):
         return self.quantity * self.average_cost
 
+    @property
+    def book_value(self):
+        # What the item adds to the tenant's inventory valuation; deleted items add nothing
+        return self.total_value if self.is_active else 0
+
+    def soft_delete(self):
+        with routers.tenant_atomic(self.user_id):
+            self.is_active = False
+            self.deleted_at = timezone.now()
+            self.save(update_fields=['is_active', 'deleted_at'])
+            # Tills can no longer sell it, so drop their claims on its stock
+            StockReservation.objects.filter(item=self).delete()
+            ItemForecast.objects.filter(item=self).delete()
+
 class SaleRecord(models.Model):
     order_id = models.CharField(max_length=20, blank=True, null=True)
     product = models.ForeignKey(Item, on_delete=models.CASCADE)
@@ -61,6 +125,11 @@ class SaleRecord(models.Model):
     date_sold = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'date_sold'], name='sale_user_date_idx'),
+        ]
+
     def __str__(self):
         return f"{self.quantity} x {self.product.name}"
     
@@ -78,19 +147,252 @@ class Purchase(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
 
     def save(self, *args, **kwargs):
-        with transaction.atomic():
-            if not self.pk:
-                locked_item = Item.objects.select_for_update().get(pk=self.item.pk)
+        with routers.tenant_atomic(self.user_id):
+            is_new = not self.pk
+            if is_new:
+                locked_item = Item.all_objects.select_for_update().get(pk=self.item.pk)
+                value_before = locked_item.book_value
                 total_current_value = locked_item.quantity * locked_item.average_cost
                 new_purchase_value = self.quantity * self.unit_price
                 total_new_qty = locked_item.quantity + self.quantity
 
                 if total_new_qty > 0:
-                    new_average_cost = (total_current_value + new_purchase_value) // total_new_qty
+                    # Whole PKR, halves rounded up (costing.half_up)
+                    total_value = total_current_value + new_purchase_value
+                    new_average_cost = (2 * total_value + total_new_qty) // (2 * total_new_qty)
                     locked_item.average_cost = new_average_cost
                 
                 locked_item.quantity += self.quantity
                 locked_item.save()
                 self.item = locked_item
 
-            super().save(*args, **kwargs)
\ No newline at end of file
+            super().save(*args, **kwargs)
+            if is_new:
+                events.record(self.user_id, ChangeEvent.PURCHASE, {
+                    'item': locked_item.pk,
+                    'name': locked_item.name,
+                    'qty': self.quantity,
+                    'stock': locked_item.quantity,
+                    'average_cost': locked_item.average_cost,
+                    'value_delta': locked_item.book_value - value_before,
+                })
+
+class Promotion(models.Model):
+    # Per-item offer applied at checkout by inventory/pricing.py; the better of the two forms wins
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='promotions')
+    name = models.CharField(max_length=100, blank=True)
+    percent_off = models.PositiveSmallIntegerField(default=0) # e.g. 10 = 10% off the line
+    bundle_qty = models.PositiveIntegerField(null=True, blank=True) # e.g. 3 for 100: bundle_qty=3,
+    bundle_price = models.PositiveIntegerField(null=True, blank=True) # bundle_price=100
+    starts_at = models.DateTimeField(default=timezone.now)
+    ends_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['item', 'starts_at'], name='promotion_item_start_idx'),
+        ]
+
+    def __str__(self):
+        return self.name or f"Promotion on {self.item_id}"
+
+    @classmethod
+    def active(cls, now=None):
+        now = now or timezone.now()
+        return cls.objects.filter(starts_at__lte=now).filter(models.Q(ends_at__isnull=True) | models.Q(ends_at__gt=now))
+
+
+class StockReservation(models.Model):
+    # A till's short-lived claim on stock while a cart is being built; see inventory/reservations.py
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    cart_id = models.CharField(max_length=36)
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['cart_id', 'item'], name='reservation_cart_item_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['item', 'expires_at'], name='reservation_item_expiry_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.item_id} held by {self.cart_id}"
+
+
+# --- Change Feed ---
+# Append-only log of stock-moving events per tenant, streamed to open dashboards and tills
+# by the /events/ endpoint (inventory/events.py). Old rows are removed by `manage.py prune_events`.
+class ChangeEvent(models.Model):
+    SALE, PURCHASE, REFUND = 'sale', 'purchase', 'refund'
+    KIND_CHOICES = [(SALE, 'Sale'), (PURCHASE, 'Purchase'), (REFUND, 'Refund')]
+
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'id'], name='event_user_id_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} for {self.user_id}"
+
+
+# --- Inventory Valuation ---
+# Running sum of quantity x average_cost per tenant, kept in step by inventory/valuation.py
+class InventoryValuation(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True)
+    total_value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.user_id}: PKR {self.total_value}"
+
+class ValuationSnapshot(models.Model):
+    # Written once a day per tenant by `manage.py snapshot_valuation`
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    date = models.DateField()
+    total_value = models.BigIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='valuation_snapshot_user_date_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.date}: PKR {self.total_value}"
+
+@receiver(post_save, sender=User)
+def create_user_valuation(sender, instance, created, **kwargs):
+    if created:
+        InventoryValuation.objects.create(user=instance)
+
+@receiver(post_save, sender=Item)
+def track_item_value(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    value = instance.book_value
+    before = 0 if created else getattr(instance, '_loaded_value', None)
+    if before is None:
+        # Saved from an instance that was never loaded; the old value is unknown
+        with routers.tenant_database(instance.user_id):
+            routers.on_commit(lambda: valuation.rebuild(instance.user_id))
+    else:
+        valuation.adjust(instance.user_id, value - before)
+    instance._loaded_value = value
+
+@receiver(post_delete, sender=Item)
+def untrack_item_value(sender, instance, **kwargs):
+    valuation.adjust(instance.user_id, -getattr(instance, '_loaded_value', instance.book_value))
+
+
+# --- Demand Forecast ---
+# One row per active item, rewritten nightly by `manage.py forecast_demand` (inventory/forecast.py)
+class ItemForecast(models.Model):
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    moving_average = models.FloatField()  # units/day over the recent window
+    smoothed = models.FloatField()  # units/day, exponential smoothing over the whole history
+    days_left = models.FloatField(null=True, blank=True)  # null when nothing is selling
+    reorder_point = models.PositiveIntegerField()
+    reorder_qty = models.PositiveIntegerField()
+    computed_for = models.DateField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'days_left'], name='forecast_user_days_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.item_id}: {self.smoothed:.2f}/day, reorder {self.reorder_qty}"
+
+
+# --- Bulk Repricing ---
+# Undo log for inventory/repricing.py: one batch per bulk operation, one row per item it changed
+class PriceChangeBatch(models.Model):
+    SELLING_PRICE = 'selling_price'
+    AVERAGE_COST = 'average_cost'
+    FIELD_CHOICES = [
+        (SELLING_PRICE, 'Selling price'),
+        (AVERAGE_COST, 'Buying price (cost)'),
+    ]
+    PERCENT = 'percent'
+    AMOUNT = 'amount'
+    MODE_CHOICES = [
+        (PERCENT, 'Percent'),
+        (AMOUNT, 'Amount (PKR)'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    field = models.CharField(max_length=20, choices=FIELD_CHOICES)
+    mode = models.CharField(max_length=10, choices=MODE_CHOICES)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    filters = models.JSONField(default=dict, blank=True)
+    item_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    undone_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='pricebatch_user_created_idx'),
+        ]
+
+    def __str__(self):
+        unit = '%' if self.mode == self.PERCENT else ' PKR'
+        return f"{self.get_field_display()} {self.amount:+}{unit} on {self.item_count} item(s)"
+
+class PriceChange(models.Model):
+    batch = models.ForeignKey(PriceChangeBatch, on_delete=models.CASCADE, related_name='changes')
+    item = models.ForeignKey(Item, on_delete=models.CASCADE)
+    old_value = models.PositiveIntegerField()
+    new_value = models.PositiveIntegerField()
+
+    def __str__(self):
+        return f"{self.item_id}: {self.old_value} -> {self.new_value}"
+
+
+# --- Cache Invalidation ---
+# Bumping a tenant's version makes every {% cache %} fragment keyed on it stale.
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+@receiver(post_save, sender=Promotion)
+@receiver(post_delete, sender=Promotion)
+def bump_catalog_version(sender, instance, **kwargs):
+    caching.bump_version(caching.CATALOG, instance.user_id)
+
+@receiver(post_save, sender=Item)
+@receiver(post_delete, sender=Item)
+def bump_scan_version(sender, instance, **kwargs):
+    caching.bump_version(caching.SCAN, instance.user_id)
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def refresh_categories(sender, instance, **kwargs):
+    caching.forget_categories(instance.user_id)
+    caching.bump_version(caching.CATALOG, instance.user_id)
+
+@receiver(post_save, sender=SaleRecord)
+@receiver(post_delete, sender=SaleRecord)
+def bump_sales_version(sender, instance, **kwargs):
+    caching.bump_version(caching.SALES, instance.user_id)
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def refresh_user(sender, instance, **kwargs):
+    # Covers password changes and the last_login update on every login
+    caching.forget_user(instance.pk)
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def refresh_profile(sender, instance, **kwargs):
+    caching.forget_profile(instance.user_id)
+    # Fragments render dates in the shop's timezone
+    caching.bump_all(instance.user_id)
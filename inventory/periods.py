@@ -0,0 +1,80 @@
+from datetime import datetime, time, timedelta
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from django.conf import settings
+from django.utils import timezone
+
+from .caching import get_profile
+
+
+def zone(name):
+    """ZoneInfo for a profile's timezone name, falling back to settings.TIME_ZONE for blank or bad values."""
+    try:
+        return ZoneInfo(name or settings.TIME_ZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        return ZoneInfo(settings.TIME_ZONE)
+
+
+def tenant_timezone(user):
+    """The shop's configured zone; settings.TIME_ZONE for anonymous users."""
+    return zone(get_profile(user).timezone if user.is_authenticated else None)
+
+
+def local_today(tz=None):
+    return timezone.localdate(timezone=tz or timezone.get_current_timezone())
+
+
+def _start_of(day, tz):
+    return datetime.combine(day, time.min, tzinfo=tz)
+
+
+def day_range(day, tz=None):
+    """Half-open [start, end) UTC-comparable bounds of a local calendar day."""
+    tz = tz or timezone.get_current_timezone()
+    return _start_of(day, tz), _start_of(day + timedelta(days=1), tz)
+
+
+def days_range(first_day, last_day, tz=None):
+    """Bounds covering first_day..last_day inclusive."""
+    tz = tz or timezone.get_current_timezone()
+    return _start_of(first_day, tz), _start_of(last_day + timedelta(days=1), tz)
+
+
+def month_range(day, tz=None):
+    """Bounds of the local calendar month containing `day`."""
+    tz = tz or timezone.get_current_timezone()
+    first = day.replace(day=1)
+    next_first = (first + timedelta(days=32)).replace(day=1)
+    return _start_of(first, tz), _start_of(next_first, tz)
+
+
+def previous_month_range(day, tz=None):
+    last_day_prev_month = day.replace(day=1) - timedelta(days=1)
+    return month_range(last_day_prev_month, tz)
+
+
+# --- Report ranges from request parameters ---
+def default_range(days=30):
+    """Returns (start, end) datetimes covering the last `days` days, including today."""
+    today = timezone.localdate()
+    start = today - timedelta(days=days - 1)
+    return _day_start(start), _day_start(today + timedelta(days=1))
+
+
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def parse_range(params, days=30, start_key='start', end_key='end'):
+    """Reads `start`/`end` (YYYY-MM-DD, inclusive) from a QueryDict, falling back to the last `days` days."""
+    start, end = default_range(days)
+    try:
+        if params.get(start_key):
+            start = _day_start(datetime.strptime(params[start_key], '%Y-%m-%d').date())
+        if params.get(end_key):
+            end = _day_start(datetime.strptime(params[end_key], '%Y-%m-%d').date() + timedelta(days=1))
+    except ValueError:
+        raise ValueError("Dates must be in YYYY-MM-DD format.")
+    if end <= start:
+        raise ValueError("End date must not be before start date.")
+    return start, end
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Cart pricing in one vectorized pass over all lines.
+#
+# For every line: total_price (qty x list price, what SaleRecord.total_price stores), cost,
+# the best active promotion (percent off or bundle price), and a share of the order-level
+# discount (flat amount plus percent of the order). Order discounts are split pro rata on
+# each line's price after promotions using the largest-remainder method, so shares always
+# add up to the exact discount and no single line absorbs the rounding.
+# A line's `discount` is its promotion plus its share, which keeps revenue = total - discount
+# everywhere else in the app.
+
+
+def _as_int(values):
+    return np.asarray(values, dtype=np.int64)
+
+
+def allocate(amount, weights):
+    """
+    Splits integer `amount` across `weights` in proportion, by largest remainder.
+    Ties go to the earlier line. Returns an int64 array summing exactly to `amount`.
+    """
+    weights = _as_int(weights)
+    total = int(weights.sum())
+    if amount == 0 or total == 0:
+        return np.zeros(len(weights), dtype=np.int64)
+    numerators = weights * amount
+    shares = numerators // total
+    short = amount - int(shares.sum())
+    if short:
+        order = np.argsort(-(numerators % total), kind='stable')
+        shares[order[:short]] += 1
+    return shares
+
+
+def allocate_groups(amounts, weights, groups):
+    """
+    allocate() for many orders at once: `groups` gives each weight's index into `amounts` and
+    must be sorted, so each order's lines are contiguous. Same shares as calling allocate()
+    order by order.
+    """
+    amounts, weights, groups = _as_int(amounts), _as_int(weights), _as_int(groups)
+    total = np.bincount(groups, weights=weights, minlength=len(amounts)).astype(np.int64)
+    numerators = weights * amounts[groups]
+    denominators = np.maximum(total[groups], 1)
+    shares = numerators // denominators
+    short = amounts - np.bincount(groups, weights=shares, minlength=len(amounts)).astype(np.int64)
+    short[total == 0] = 0
+    # Rank each line within its order by remainder, largest first, ties to the earlier line
+    order = np.lexsort((np.arange(len(weights)), -(numerators % denominators), groups))
+    first = np.searchsorted(groups, np.arange(len(amounts)))
+    rank = np.empty(len(weights), dtype=np.int64)
+    rank[order] = np.arange(len(weights)) - first[groups[order]]
+    return shares + (rank < short[groups])
+
+
+def promotion_discounts(prices, quantities, promotions):
+    """
+    Best discount per line from `promotions`, an iterable of
+    (line, percent_off, bundle_qty, bundle_price); bundle fields may be None or 0.
+    """
+    best = np.zeros(len(prices), dtype=np.int64)
+    rows = [(line, pct or 0, bundle_qty or 0, bundle_price or 0) for line, pct, bundle_qty, bundle_price in promotions]
+    if not rows:
+        return best
+    line, pct, bundle_qty, bundle_price = (_as_int(column) for column in zip(*rows))
+
+    gross = prices[line] * quantities[line]
+    by_percent = gross * np.clip(pct, 0, 100) // 100
+
+    has_bundle = bundle_qty > 0
+    size = np.where(has_bundle, bundle_qty, 1)
+    bundled = (quantities[line] // size) * bundle_price + (quantities[line] % size) * prices[line]
+    by_bundle = np.where(has_bundle, np.maximum(gross - bundled, 0), 0)
+
+    np.maximum.at(best, line, np.maximum(by_percent, by_bundle))
+    return best
+
+
+def price_cart(prices, costs, quantities, flat_discount=0, percent_off=0, promotions=(), min_margin_pct=0):
+    """
+    Prices a whole cart. Raises ValueError if the discounts take revenue below cost plus
+    `min_margin_pct` percent of cost. Returns a dict of per-line int64 arrays
+    (total_price, cost, promotion, order_discount, discount, net) and order totals.
+    """
+    prices, costs, quantities = _as_int(prices), _as_int(costs), _as_int(quantities)
+    if len(quantities) == 0:
+        raise ValueError("Cart is empty")
+    if (quantities <= 0).any():
+        raise ValueError("Quantity must be positive.")
+    if flat_discount < 0 or not 0 <= percent_off <= 100:
+        raise ValueError("Discount must be a positive amount or a percentage up to 100.")
+
+    total_price = prices * quantities
+    line_cost = costs * quantities
+    promotion = promotion_discounts(prices, quantities, promotions)
+    after_promotions = total_price - promotion
+
+    subtotal = int(after_promotions.sum())
+    order_discount_total = int(flat_discount) + subtotal * int(percent_off) // 100
+    if order_discount_total > subtotal:
+        raise ValueError(f"Discount is larger than the order total of PKR {subtotal}.")
+    order_discount = allocate(order_discount_total, after_promotions)
+
+    discount = promotion + order_discount
+    net = total_price - discount
+    revenue, cost = int(net.sum()), int(line_cost.sum())
+
+    # VALIDATION: (Subtotal - Discount) >= Total Cost (+ optional margin)
+    floor = cost + cost * min_margin_pct // 100
+    if revenue < floor:
+        raise ValueError(f"Discount is too high! Minimum revenue required: PKR {floor}")
+
+    return {
+        'total_price': total_price,
+        'cost': line_cost,
+        'promotion': promotion,
+        'order_discount': order_discount,
+        'discount': discount,
+        'net': net,
+        'totals': {
+            'gross': int(total_price.sum()),
+            'promotion': int(promotion.sum()),
+            'order_discount': order_discount_total,
+            'discount': int(discount.sum()),
+            'revenue': revenue,
+            'cost': cost,
+            'profit': revenue - cost,
+        },
+    }
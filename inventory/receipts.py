@@ -0,0 +1,224 @@
+import textwrap
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import caching, periods, refunds, routers
+from .models import SaleRecord
+
+# Printable receipts. Each order is rendered once, right after checkout commits, and kept in
+# the cache under its own version counter, which only a refund of that order moves. Reprints,
+# and a whole day's receipts streamed as one document, then cost a cache read per order.
+# PDF is built from the thermal text, and only if reportlab is installed.
+#
+# Orders are keyed like in the sales book: their order_id, or LEGACY-<sale id> for lines
+# saved before order ids existed.
+
+HTML = 'html'
+TEXT = 'text'
+PDF = 'pdf'
+FORMATS = (HTML, TEXT, PDF)
+BATCH_SIZE = 100
+
+# Closes inventory/receipts_page.html; the page is split so a day can be streamed between the two
+PAGE_END = "</main>\n</body>\n</html>\n"
+# Form feed: a page break, or a cut on most receipt printers
+TEXT_SEPARATOR = "\f\n"
+
+
+def width():
+    """Characters per thermal line: 32 on 58 mm paper, 42 or 48 on 80 mm."""
+    return getattr(settings, 'RECEIPT_WIDTH', 42)
+
+
+def timeout():
+    return getattr(settings, 'RECEIPT_CACHE_TIMEOUT', 7 * 24 * 3600)
+
+
+def pdf_available():
+    try:
+        import reportlab  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _version_scope(key):
+    return f"receipt:{key}"
+
+
+def _cache_keys(user_id, keys, fmt):
+    # The database is part of the key: legacy keys are sale ids, which change when a tenant moves shards
+    versions = caching.get_versions([_version_scope(key) for key in keys], user_id)
+    database = routers.current_database()
+    return {
+        key: f"ims:receipt:{database}:{user_id}:{key}:{versions[_version_scope(key)]}:{fmt}"
+        for key in keys
+    }
+
+
+def invalidate(user_id, keys):
+    """Orders whose lines changed (refunds); their next print renders again."""
+    for key in set(keys):
+        caching.bump_version(_version_scope(key), user_id)
+
+
+def order_key(order_id, sale_id):
+    return order_id or f"{refunds.LEGACY_PREFIX}{sale_id}"
+
+
+def _orders(user, keys):
+    """{key: receipt dict} for the user's orders among `keys`; one query."""
+    order_ids = [key for key in keys if not key.startswith(refunds.LEGACY_PREFIX)]
+    legacy = [int(key[len(refunds.LEGACY_PREFIX):]) for key in keys
+              if key.startswith(refunds.LEGACY_PREFIX) and key[len(refunds.LEGACY_PREFIX):].isdigit()]
+    lines = (
+        SaleRecord.objects.filter(user=user)
+        .filter(Q(order_id__in=order_ids) | (Q(pk__in=legacy) & (Q(order_id__isnull=True) | Q(order_id=''))))
+        .order_by('date_sold', 'pk')
+        .values('pk', 'order_id', 'product__name', 'quantity', 'total_price', 'discount', 'date_sold')
+    )
+    orders = {}
+    for line in lines:
+        key = order_key(line['order_id'], line['pk'])
+        order = orders.setdefault(key, {
+            'key': key, 'order_id': line['order_id'] or None, 'date': line['date_sold'],
+            'lines': [], 'subtotal': 0, 'discount': 0, 'total': 0, 'items': 0,
+        })
+        order['lines'].append({'name': line['product__name'], 'qty': line['quantity'], 'amount': line['total_price']})
+        order['subtotal'] += line['total_price']
+        order['discount'] += line['discount']
+        order['total'] += line['total_price'] - line['discount']
+        order['items'] += line['quantity']
+    return orders
+
+
+def _row(left, right, cols):
+    return f"{left[:cols - len(right) - 1]:<{cols - len(right)}}{right}"
+
+
+def render_text(order, shop, tz, cols=None):
+    """Fixed-width receipt for thermal printers."""
+    cols = cols or width()
+    rule = "-" * cols
+    lines = [shop[:cols].center(cols).rstrip(), rule]
+    lines.append(_row(order['order_id'] or "Receipt", f"{timezone.localtime(order['date'], tz):%d %b %Y %H:%M}", cols))
+    lines.append(rule)
+    for line in order['lines']:
+        lines.extend(textwrap.wrap(line['name'], cols) or [""])
+        lines.append(_row(f"  {line['qty']} x", str(line['amount']), cols))
+    lines.append(rule)
+    lines.append(_row("Subtotal", f"PKR {order['subtotal']}", cols))
+    if order['discount']:
+        lines.append(_row("Discount", f"-PKR {order['discount']}", cols))
+    lines.append(_row("TOTAL", f"PKR {order['total']}", cols))
+    lines.append(_row("Items", str(order['items']), cols))
+    lines.append("")
+    lines.append("Thank you!".center(cols).rstrip())
+    return "\n".join(lines) + "\n"
+
+
+def render_html(order, shop, tz):
+    return render_to_string('inventory/receipt.html', {
+        'order': order, 'shop': shop, 'date': timezone.localtime(order['date'], tz),
+    })
+
+
+def _render(order, fmt, shop, tz):
+    return render_html(order, shop, tz) if fmt == HTML else render_text(order, shop, tz)
+
+
+def _shop(user):
+    return caching.get_profile(user).business_name or user.username
+
+
+def render_many(user, keys, fmt):
+    """
+    Rendered receipts for `keys` in the given order (HTML or TEXT), from the cache where
+    possible. Misses are read with one query and cached. Unknown keys are left out.
+    """
+    cache_keys = _cache_keys(user.pk, keys, fmt)
+    found = cache.get_many(list(cache_keys.values()))
+    missing = [key for key in keys if cache_keys[key] not in found]
+    if missing:
+        shop, tz = _shop(user), periods.tenant_timezone(user)
+        rendered = {
+            cache_keys[key]: _render(order, fmt, shop, tz)
+            for key, order in _orders(user, missing).items()
+        }
+        cache.set_many(rendered, timeout())
+        found.update(rendered)
+    return [found[cache_keys[key]] for key in keys if cache_keys[key] in found]
+
+
+def receipt(user, key, fmt):
+    """One rendered receipt, or None if the user has no such order."""
+    with routers.tenant_database(user.pk):
+        rendered = render_many(user, [key], fmt)
+    return rendered[0] if rendered else None
+
+
+def prerender(user, order_id):
+    """Caches both printable forms of a new order; run after checkout commits."""
+    with routers.tenant_database(user.pk):
+        for fmt in (HTML, TEXT):
+            render_many(user, [order_id], fmt)
+
+
+def day_keys(user, day, tz):
+    """Keys of the user's orders sold on a local calendar day, oldest first."""
+    start, end = periods.day_range(day, tz)
+    rows = (
+        SaleRecord.objects.filter(user=user, date_sold__gte=start, date_sold__lt=end)
+        .order_by('date_sold', 'pk').values_list('order_id', 'pk')
+    )
+    return list(dict.fromkeys(order_key(order_id, pk) for order_id, pk in rows))
+
+
+def page_start(user):
+    return render_to_string('inventory/receipts_page.html', {'shop': _shop(user)})
+
+
+def in_batches(user, keys, fmt):
+    """render_many() over BATCH_SIZE orders at a time."""
+    for start in range(0, len(keys), BATCH_SIZE):
+        yield from render_many(user, keys[start:start + BATCH_SIZE], fmt)
+
+
+def stream_day(user, keys, fmt):
+    """A whole day's receipts as one HTML page or one text document, for a StreamingHttpResponse."""
+    if fmt == HTML:
+        yield page_start(user)
+        yield from in_batches(user, keys, fmt)
+        yield PAGE_END
+    else:
+        for text in in_batches(user, keys, fmt):
+            yield text + TEXT_SEPARATOR
+
+
+def pdf(texts, cols=None):
+    """PDF with one page per thermal receipt. Needs reportlab (see pdf_available())."""
+    from io import BytesIO
+
+    from reportlab.lib.units import mm
+    from reportlab.pdfgen import canvas
+
+    cols = cols or width()
+    size, leading, margin = 8, 10, 4 * mm
+    page_width = cols * size * 0.6 + 2 * margin  # Courier glyphs are 0.6 em wide
+    buffer = BytesIO()
+    document = canvas.Canvas(buffer)
+    for text in texts:
+        lines = text.rstrip("\n").split("\n")
+        document.setPageSize((page_width, len(lines) * leading + 2 * margin))
+        body = document.beginText(margin, len(lines) * leading + margin - size)
+        body.setFont('Courier', size, leading)
+        for line in lines:
+            body.textLine(line)
+        document.drawText(body)
+        document.showPage()
+    document.save()
+    return buffer.getvalue()
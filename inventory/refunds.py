@@ -0,0 +1,89 @@
+from django.db.models import Case, F, Q, When
+
+from . import caching, events, receipts, routers, valuation
+from .models import ChangeEvent, Item, SaleRecord
+
+# Lines saved before order ids existed are addressed as LEGACY-<pk>, the same key the
+# sales book groups them under.
+LEGACY_PREFIX = 'LEGACY-'
+
+
+def _selection(order_ids, sale_ids):
+    orders, legacy = [], []
+    try:
+        query = Q(pk__in=[int(pk) for pk in sale_ids])
+        for order_id in order_ids:
+            if order_id.startswith(LEGACY_PREFIX):
+                legacy.append(int(order_id[len(LEGACY_PREFIX):]))
+            else:
+                orders.append(order_id)
+    except ValueError:
+        raise ValueError("Invalid selection.")
+    if orders:
+        query |= Q(order_id__in=orders)
+    if legacy:
+        query |= Q(pk__in=legacy) & (Q(order_id__isnull=True) | Q(order_id=''))
+    return query
+
+
+def refund(user, order_ids=(), sale_ids=()):
+    """
+    Reverses whole orders and/or individual sale lines in one transaction: stock goes back
+    with a single UPDATE and the lines are deleted with a single DELETE.
+    Returns {'lines': n, 'units': n}. Raises ValueError if nothing matched.
+    """
+    with routers.tenant_atomic(user.pk):
+        # Locking the lines first makes a concurrent refund of the same order wait and then find nothing
+        lines = list(
+            SaleRecord.objects.select_for_update()
+            .filter(_selection(order_ids, sale_ids), user=user)
+            .order_by('pk')
+            .values('pk', 'order_id', 'product_id', 'quantity', 'total_price', 'discount', 'unit_cost_at_sale', 'date_sold')
+        )
+        if not lines:
+            raise ValueError("No matching sales found.")
+
+        restock = {}
+        for line in lines:
+            restock[line['product_id']] = restock.get(line['product_id'], 0) + line['quantity']
+
+        # One lock pass in pk order (same order as checkout), then one UPDATE for every item
+        locked = {
+            item['pk']: item for item in
+            Item.all_objects.select_for_update().filter(pk__in=restock).order_by('pk')
+            .values('pk', 'name', 'quantity', 'average_cost', 'is_active')
+        }
+        Item.all_objects.filter(pk__in=locked).update(quantity=Case(
+            *[When(pk=pk, then=F('quantity') + restock[pk]) for pk in locked],
+            default=F('quantity'),
+        ))
+        # Units come back at today's average cost, which is what they are now valued at (deleted items count for nothing)
+        value_delta = sum(restock[pk] * item['average_cost'] for pk, item in locked.items() if item['is_active'])
+        valuation.adjust(user.pk, value_delta)
+
+        # Nothing references sale lines, so skip the per-row collector and delete signals
+        deleted = SaleRecord.objects.filter(pk__in=[line['pk'] for line in lines])
+        deleted._raw_delete(deleted.db)
+
+        # Negative deltas; sold_at lets a dashboard tell whether the line counted towards today or this month
+        events.record(user.pk, ChangeEvent.REFUND, {
+            'value_delta': value_delta,
+            'lines': [{
+                'item': line['product_id'],
+                'name': locked[line['product_id']]['name'],
+                'qty': -line['quantity'],
+                'stock': locked[line['product_id']]['quantity'] + restock[line['product_id']],
+                'revenue': -(line['total_price'] - line['discount']),
+                'cost': -(line['unit_cost_at_sale'] or locked[line['product_id']]['average_cost']) * line['quantity'],
+                'sold_at': line['date_sold'],
+            } for line in lines],
+        })
+
+        # update() and _raw_delete() send no signals
+        user_id = user.pk
+        routers.on_commit(lambda: caching.bump_all(user_id))
+        # The only change a printed receipt can go stale on
+        changed = [receipts.order_key(line['order_id'], line['pk']) for line in lines]
+        routers.on_commit(lambda: receipts.invalidate(user_id, changed))
+
+    return {'lines': len(lines), 'units': sum(restock.values())}
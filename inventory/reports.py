@@ -0,0 +1,183 @@
+from datetime import date, datetime, timedelta
+
+from django.db.models import Case, Count, F, Sum, When
+from django.db.models.functions import TruncDate, TruncMonth, TruncQuarter, TruncWeek
+from django.utils import timezone
+
+from .models import SaleRecord
+
+GRANULARITIES = {
+    'day': TruncDate,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'quarter': TruncQuarter,
+}
+
+METRICS = ('revenue', 'gross', 'discount', 'qty', 'cost', 'profit', 'orders')
+
+# Legacy rows saved before unit_cost_at_sale existed fall back to the item's current cost,
+# same rule as the monthly export and inventory.analytics. `manage.py audit_costs --fix`
+# gives them the cost replayed from their item's history instead.
+LINE_COST = Case(
+    When(unit_cost_at_sale=0, then=F('product__average_cost')),
+    default=F('unit_cost_at_sale'),
+) * F('quantity')
+
+AGGREGATES = {
+    'revenue': Sum(F('total_price') - F('discount')),
+    'gross': Sum('total_price'),
+    'discount': Sum('discount'),
+    'qty': Sum('quantity'),
+    'cost': Sum(LINE_COST),
+    'orders': Count('order_id', distinct=True),
+}
+
+
+def _clean(row):
+    data = {key: int(row.get(key) or 0) for key in AGGREGATES}
+    data['profit'] = data['revenue'] - data['cost']
+    return data
+
+
+def summarize(queryset):
+    """All report metrics for a SaleRecord queryset in a single aggregate query."""
+    return _clean(queryset.aggregate(**AGGREGATES))
+
+
+def _bucket_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    if granularity == 'quarter':
+        return day.replace(month=(day.month - 1) // 3 * 3 + 1, day=1)
+    return day
+
+
+def _next_bucket(day, granularity):
+    if granularity == 'day':
+        return day + timedelta(days=1)
+    if granularity == 'week':
+        return day + timedelta(days=7)
+    months = 3 if granularity == 'quarter' else 1
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_starts(start, end, granularity):
+    """Every bucket start date overlapping [start, end) so that empty periods are reported as zeros."""
+    first = timezone.localtime(start).date()
+    last = timezone.localtime(end - timedelta(microseconds=1)).date()
+    day = _bucket_start(first, granularity)
+    buckets = []
+    while day <= last:
+        buckets.append(day)
+        day = _next_bucket(day, granularity)
+    return buckets
+
+
+def _label(day, granularity):
+    if granularity == 'month':
+        return day.strftime('%b %Y')
+    if granularity == 'quarter':
+        return f"Q{(day.month - 1) // 3 + 1} {day.year}"
+    if granularity == 'week':
+        return f"Wk of {day.strftime('%b %d')}"
+    return day.strftime('%b %d')
+
+
+def sales_series(user, start, end, granularity='day'):
+    """
+    Revenue, qty, cost, profit and discount per bucket for [start, end).
+    One grouped query; buckets with no sales are filled with zeros.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"Granularity must be one of: {', '.join(GRANULARITIES)}.")
+
+    # Buckets follow the shop's local calendar (the timezone activated for the request)
+    tz = timezone.get_current_timezone()
+    rows = (
+        SaleRecord.objects.filter(user=user, date_sold__gte=start, date_sold__lt=end)
+        .annotate(period=GRANULARITIES[granularity]('date_sold', tzinfo=tz))
+        .values('period')
+        .annotate(**AGGREGATES)
+        .order_by('period')
+    )
+    by_period = {}
+    for row in rows:
+        period = row['period']
+        if isinstance(period, datetime):
+            period = timezone.localtime(period, tz).date()
+        by_period[period] = _clean(row)
+
+    empty = {key: 0 for key in METRICS}
+    return [
+        {'period': day.isoformat(), 'label': _label(day, granularity), **by_period.get(day, empty)}
+        for day in bucket_starts(start, end, granularity)
+    ]
+
+
+def totals(series):
+    return {key: sum(bucket[key] for bucket in series) for key in METRICS}
+
+
+def _delta(current, previous):
+    change = current - previous
+    pct = round(change * 100.0 / previous, 1) if previous else None
+    return {'change': change, 'pct': pct}
+
+
+def deltas(current, previous):
+    return {key: _delta(current[key], previous[key]) for key in METRICS}
+
+
+def previous_range(start, end, mode='previous'):
+    """The comparison window for [start, end): the same length immediately before, or one year earlier."""
+    if mode == 'yoy':
+        return _minus_year(start), _minus_year(end)
+    if mode == 'previous':
+        return start - (end - start), start
+    raise ValueError("Compare must be 'previous' or 'yoy'.")
+
+
+def _minus_year(moment):
+    local = timezone.localtime(moment)
+    try:
+        return local.replace(year=local.year - 1)
+    except ValueError:
+        # 29 February
+        return local.replace(year=local.year - 1, day=28)
+
+
+def compare(user, current, previous, granularity='day'):
+    """
+    Side-by-side series for two ranges plus period-over-period deltas, both overall and
+    bucket by bucket (buckets are aligned by position, so ranges of equal length line up).
+    """
+    current_series = sales_series(user, *current, granularity)
+    previous_series = sales_series(user, *previous, granularity)
+    current_totals = totals(current_series)
+    previous_totals = totals(previous_series)
+
+    bucket_deltas = []
+    for i, bucket in enumerate(current_series):
+        before = previous_series[i] if i < len(previous_series) else {key: 0 for key in METRICS}
+        bucket_deltas.append({'period': bucket['period'], **deltas(bucket, before)})
+
+    return {
+        'granularity': granularity,
+        'current': {
+            'start': current[0].isoformat(),
+            'end': current[1].isoformat(),
+            'series': current_series,
+            'totals': current_totals,
+        },
+        'previous': {
+            'start': previous[0].isoformat(),
+            'end': previous[1].isoformat(),
+            'series': previous_series,
+            'totals': previous_totals,
+        },
+        'deltas': deltas(current_totals, previous_totals),
+        'bucket_deltas': bucket_deltas,
+    }
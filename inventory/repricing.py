@@ -0,0 +1,139 @@
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Cast, Greatest, Round
+from django.db.models.lookups import GreaterThanOrEqual, LessThanOrEqual
+from django.utils import timezone
+
+from . import caching, routers, valuation
+from .models import Item, PriceChange, PriceChangeBatch
+
+# Bulk price / cost changes. Each operation is one UPDATE whose new value is an SQL expression
+# over the current one (F(field) * factor, or F(field) + amount), so hundreds of items change
+# in a single statement. The preview runs the same expression in a SELECT, and every applied
+# operation keeps the old values in PriceChange rows so it can be undone, again in one UPDATE.
+
+FIELDS = (PriceChangeBatch.SELLING_PRICE, PriceChangeBatch.AVERAGE_COST)
+MODES = (PriceChangeBatch.PERCENT, PriceChangeBatch.AMOUNT)
+PREVIEW_ROWS = 50
+
+
+def _check(field, mode, amount):
+    if field not in FIELDS:
+        raise ValueError(f"Field must be one of: {', '.join(FIELDS)}.")
+    if mode not in MODES:
+        raise ValueError(f"Mode must be one of: {', '.join(MODES)}.")
+    if not amount:
+        raise ValueError("The change must not be zero.")
+    if mode == PriceChangeBatch.PERCENT and amount <= -100:
+        raise ValueError("A percentage cut must be less than 100%.")
+
+
+def new_value(field, mode, amount):
+    """SQL expression for the changed value: whole PKR, never below zero."""
+    if mode == PriceChangeBatch.PERCENT:
+        changed = Round(F(field) * Value(float(100 + amount) / 100))
+    else:
+        changed = F(field) + Value(int(amount))
+    return Cast(Greatest(changed, Value(0)), IntegerField())
+
+
+def select(user, category=None, company=None, min_margin=None, max_margin=None):
+    """Active items matching every given filter; margins are percent of the selling price."""
+    items = Item.objects.filter(user=user)
+    if category:
+        items = items.filter(category_id=category)
+    if company:
+        items = items.filter(company__iexact=company)
+    # margin% >= x  <=>  (price - cost) * 100 >= price * x, which needs no division in SQL
+    margin = (F('selling_price') - F('average_cost')) * 100
+    if min_margin is not None:
+        items = items.filter(GreaterThanOrEqual(margin, F('selling_price') * min_margin))
+    if max_margin is not None:
+        items = items.filter(LessThanOrEqual(margin, F('selling_price') * max_margin))
+    return items
+
+
+def _flag(field):
+    # Prices that would end up under cost, or costs that would end up over the price
+    if field == PriceChangeBatch.SELLING_PRICE:
+        return Q(new_value__lt=F('average_cost'))
+    return Q(new_value__gt=F('selling_price'))
+
+
+def preview(user, field, mode, amount, filters):
+    """Totals and the first PREVIEW_ROWS items of an operation, all computed by the database."""
+    _check(field, mode, amount)
+    items = select(user, **filters).annotate(new_value=new_value(field, mode, amount))
+    totals = items.aggregate(
+        items=Count('pk'),
+        changed=Count('pk', filter=~Q(new_value=F(field))),
+        before=Sum(field),
+        after=Sum('new_value'),
+        flagged=Count('pk', filter=_flag(field)),
+    )
+    rows = list(items.order_by('name').values('pk', 'name', 'company', 'average_cost', 'selling_price', 'new_value')[:PREVIEW_ROWS])
+    return {**{key: value or 0 for key, value in totals.items()}, 'field': field, 'rows': rows}
+
+
+def _refresh(user_id):
+    # update() and bulk_create() send no signals: catalog fragments and the scan cache hold prices
+    def bump():
+        caching.bump_version(caching.CATALOG, user_id)
+        caching.bump_version(caching.SCAN, user_id)
+    routers.on_commit(bump)
+
+
+def apply(user, field, mode, amount, filters):
+    """
+    Applies the operation with one UPDATE and logs it. Returns the PriceChangeBatch.
+    Raises ValueError when the input is invalid or no item would change.
+    """
+    _check(field, mode, amount)
+    changed = new_value(field, mode, amount)
+    items = select(user, **filters)
+    with routers.tenant_atomic(user.pk):
+        # Locks the matched rows while reading the values the log needs
+        rows = list(
+            items.select_for_update().annotate(new_value=changed).filter(~Q(new_value=F(field)))
+            .order_by('pk').values_list('pk', field, 'new_value', 'quantity')
+        )
+        if not rows:
+            raise ValueError("No products would change.")
+        batch = PriceChangeBatch.objects.create(
+            user=user, field=field, mode=mode, amount=amount, filters=filters, item_count=len(rows),
+        )
+        PriceChange.objects.bulk_create(
+            [PriceChange(batch=batch, item_id=pk, old_value=old, new_value=new) for pk, old, new, _ in rows],
+            batch_size=1000,
+        )
+        items.update(**{field: changed})
+        if field == PriceChangeBatch.AVERAGE_COST:
+            valuation.adjust(user.pk, sum((new - old) * quantity for _, old, new, quantity in rows))
+        _refresh(user.pk)
+    return batch
+
+
+def undo(user, batch_id):
+    """
+    Puts back the old values of one operation with one UPDATE. Items edited since keep their
+    newer value. Returns {'reverted': n, 'skipped': n}; raises ValueError if it cannot be undone.
+    """
+    with routers.tenant_atomic(user.pk):
+        batch = PriceChangeBatch.objects.select_for_update().filter(user=user, pk=batch_id).first()
+        if batch is None:
+            raise ValueError("Price change not found.")
+        if batch.undone_at:
+            raise ValueError("That price change was already undone.")
+        field = batch.field
+        logged = PriceChange.objects.filter(batch=batch, item=OuterRef('pk'))
+        old_value = Subquery(logged.values('old_value')[:1])
+        items = Item.all_objects.filter(
+            user=user, pk__in=batch.changes.values('item_id'), **{field: Subquery(logged.values('new_value')[:1])},
+        )
+        rows = list(items.select_for_update().annotate(old_value=old_value).values_list(field, 'old_value', 'quantity', 'is_active'))
+        reverted = items.update(**{field: old_value})
+        if field == PriceChangeBatch.AVERAGE_COST:
+            valuation.adjust(user.pk, sum((old - now) * quantity for now, old, quantity, active in rows if active))
+        batch.undone_at = timezone.now()
+        batch.save(update_fields=['undone_at'])
+        _refresh(user.pk)
+    return {'reverted': reverted, 'skipped': batch.item_count - reverted}
@@ -0,0 +1,144 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import routers
+from .models import Item, StockReservation
+
+# Stock holds for POS carts.
+# Adding a line to a cart places (or resizes) a hold for that item, validated against
+# quantity minus every other cart's active holds. At checkout a line already covered by the
+# cart's own hold needs no further check; other lines are guarded by a conditional UPDATE that
+# leaves other carts' holds intact. Expired holds are simply ignored and are deleted by
+# `manage.py expire_reservations`.
+
+
+class StockUnavailable(ValueError):
+    pass
+
+
+def hold_ttl():
+    return timedelta(seconds=getattr(settings, 'STOCK_HOLD_TTL_SECONDS', 900))
+
+
+def active_holds(now=None):
+    return StockReservation.objects.filter(expires_at__gt=now or timezone.now())
+
+
+def held_quantities(user, item_ids=None, exclude_cart=None):
+    """{item_id: units held by active carts} in one grouped query."""
+    holds = active_holds().filter(user=user)
+    if item_ids is not None:
+        holds = holds.filter(item_id__in=item_ids)
+    if exclude_cart:
+        holds = holds.exclude(cart_id=exclude_cart)
+    return dict(holds.values('item_id').annotate(held=Sum('quantity')).values_list('item_id', 'held'))
+
+
+def with_available(user, products):
+    """Adds 'available' (quantity minus active holds) to product dicts with 'id' and 'quantity'."""
+    held = held_quantities(user)
+    for product in products:
+        product['available'] = max(product['quantity'] - held.get(product['id'], 0), 0)
+    return products
+
+
+def _check_cart_id(cart_id):
+    if not cart_id or len(cart_id) > 36:
+        raise ValueError("A cart id is required.")
+
+
+def hold(user, cart_id, item_id, quantity, add=False):
+    """
+    Sets this cart's hold on one item to `quantity` units (0 releases it), or raises it by
+    `quantity` with add=True, and extends every hold of the cart. Raises StockUnavailable
+    when other carts leave too little stock.
+    """
+    _check_cart_id(cart_id)
+    if quantity < 0:
+        raise ValueError("Quantity must not be negative.")
+    now = timezone.now()
+    expires_at = now + hold_ttl()
+
+    with routers.tenant_atomic(user.pk):
+        # Serialises holds on this item only; the lock ends with this short transaction
+        item = Item.objects.select_for_update().get(pk=item_id, user=user)
+        if add:
+            quantity += active_holds(now).filter(cart_id=cart_id, item=item).values_list('quantity', flat=True).first() or 0
+        available = item.quantity - held_quantities(user, [item.pk], exclude_cart=cart_id).get(item.pk, 0)
+        if quantity > available:
+            raise StockUnavailable(f"Only {max(available, 0)} of {item.name} available.")
+
+        if quantity:
+            StockReservation.objects.update_or_create(
+                cart_id=cart_id, item=item,
+                defaults={'user': user, 'quantity': quantity, 'expires_at': expires_at},
+            )
+        else:
+            StockReservation.objects.filter(cart_id=cart_id, item=item).delete()
+        # Any activity keeps the whole cart alive
+        StockReservation.objects.filter(user=user, cart_id=cart_id).update(expires_at=expires_at)
+
+    return {
+        'item': item.pk,
+        'held': quantity,
+        'available': max(available, 0),
+        'expires_at': expires_at.isoformat(),
+    }
+
+
+def release(user, cart_id):
+    _check_cart_id(cart_id)
+    return StockReservation.objects.filter(user=user, cart_id=cart_id).delete()[0]
+
+
+def take_stock(user, cart_id, quantities, names):
+    """
+    Deducts {item_id: qty} from stock inside the caller's transaction and consumes the
+    cart's holds. Raises StockUnavailable if a line cannot be covered.
+    Returns {item_id: {'average_cost', 'quantity'}}, read while the rows are locked by the UPDATEs.
+    """
+    now = timezone.now()
+    own = {}
+    if cart_id:
+        own = dict(
+            active_holds(now).filter(user=user, cart_id=cart_id, item_id__in=list(quantities))
+            .values_list('item_id', 'quantity')
+        )
+    held_by_others = Coalesce(
+        Subquery(
+            active_holds(now).filter(item_id=OuterRef('pk')).exclude(cart_id=cart_id or '')
+            .values('item_id').annotate(held=Sum('quantity')).values('held')
+        ),
+        Value(0),
+    )
+
+    # Ascending pk order so concurrent checkouts take row locks in the same order
+    for item_id in sorted(quantities):
+        qty = quantities[item_id]
+        rows = Item.objects.filter(pk=item_id, user=user)
+        if own.get(item_id, 0) >= qty:
+            # Validated when the hold was placed; the guard only protects against going negative
+            rows = rows.filter(quantity__gte=qty)
+        else:
+            rows = rows.alias(held=held_by_others).filter(quantity__gte=F('held') + qty)
+        if not rows.update(quantity=F('quantity') - qty):
+            raise StockUnavailable(f"Insufficient stock for {names[item_id]}")
+
+    if cart_id:
+        StockReservation.objects.filter(user=user, cart_id=cart_id).delete()
+    # all_objects: an item soft-deleted since the UPDATEs is still sold, and must still be found
+    rows = Item.all_objects.filter(pk__in=list(quantities)).values('pk', 'average_cost', 'quantity')
+    return {row['pk']: row for row in rows}
+
+
+def sweep(now=None):
+    """Deletes expired holds on every shard; returns how many were removed."""
+    now = now or timezone.now()
+    return sum(
+        StockReservation.objects.using(alias).filter(expires_at__lte=now).delete()[0]
+        for alias in routers.shard_aliases()
+    )
@@ -0,0 +1,203 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import transaction
+
+# Read-replica routing.
+# Nothing reads from the replica unless a view or job opts in with @replica_reads /
+# read_from_replica(), so writes, auth, sessions and the POS always use `default`.
+# ReplicaRoutingMiddleware decides per request whether opting in is allowed: only safe
+# methods, and not while the tenant is inside its "read your writes" window after a write.
+
+REPLICA = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_configured():
+    return REPLICA in settings.DATABASES
+
+
+def replica_alias():
+    """Where opted-in reads go once routing has picked the replica."""
+    return REPLICA
+
+
+@contextmanager
+def read_from_replica():
+    """Routes ORM reads in this block (and code it calls) to the replica, if one is configured."""
+    token = _use_replica.set(True)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+def replica_reads(view):
+    """
+    View decorator: reads go to the replica when the middleware allows it for this request.
+    Template responses are rendered inside the block, since lazy context (fragments,
+    SimpleLazyObject) is only evaluated at render time.
+    """
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if not getattr(request, 'use_replica', False):
+            return view(request, *args, **kwargs)
+        with read_from_replica():
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
+    return wrapped
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get() and replica_configured():
+            return replica_alias()
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica gets its schema through replication
+        return db != REPLICA
+
+
+# --- Tenant Shards ---
+# Whole tenants can live in extra databases (settings.TENANT_SHARDS, from SHARD_DATABASE_URLS).
+# TenantShard rows in `default` map a user to its shard; tenants without one stay in `default`.
+# Accounts (auth, sessions, Profile and the shard map itself) are always in `default`.
+#
+# Routing follows the tenant in context: TenantShardMiddleware sets it for the whole request,
+# tenant_atomic() for a write transaction, tenant_database() for anything else (jobs, streams).
+# Saves also route by the instance's user_id. Outside any context, unsaved querysets go to
+# `default`, so code that runs outside a request must enter the tenant first.
+
+SHARED_MODELS = {'profile', 'tenantshard'}
+SHARD_LOOKUP_TIMEOUT = 3600
+
+_tenant_db = ContextVar('tenant_db', default=None)
+
+
+def shard_aliases():
+    return ['default', *getattr(settings, 'TENANT_SHARDS', [])]
+
+
+def _shard_key(user_id):
+    return f"ims:shard:{user_id}"
+
+
+def tenant_state(user_id):
+    """(database alias, moving) for a tenant, from the cache or the shard map."""
+    from django.core.cache import cache
+    from .models import TenantShard
+
+    key = _shard_key(user_id)
+    state = cache.get(key)
+    if state is None:
+        row = TenantShard.objects.filter(user_id=user_id).values_list('database', 'moving').first()
+        state = row or ('default', False)
+        cache.set(key, state, SHARD_LOOKUP_TIMEOUT)
+    return state
+
+
+def shard_for(user_id):
+    return tenant_state(user_id)[0]
+
+
+def forget_shard(user_id):
+    from django.core.cache import cache
+
+    cache.delete(_shard_key(user_id))
+
+
+def current_database():
+    return _tenant_db.get() or 'default'
+
+
+@contextmanager
+def tenant_database(user_id=None, alias=None):
+    """Routes tenant-model queries in this block to the tenant's shard (or straight to `alias`)."""
+    token = _tenant_db.set(alias or shard_for(user_id))
+    try:
+        yield
+    finally:
+        _tenant_db.reset(token)
+
+
+@contextmanager
+def tenant_atomic(user_id):
+    """transaction.atomic() on the tenant's shard, with its queries routed there."""
+    with tenant_database(user_id):
+        with transaction.atomic(using=current_database()):
+            yield
+
+
+def per_tenant(func):
+    """Decorator for func(user_id, ...): runs it with that tenant's shard in context."""
+    @wraps(func)
+    def wrapped(user_id, *args, **kwargs):
+        with tenant_database(user_id):
+            return func(user_id, *args, **kwargs)
+    return wrapped
+
+
+def tenant_stream(chunks, alias):
+    """
+    Wraps a streaming body so each chunk is produced with queries routed to `alias`; the
+    body is only iterated after the middleware has returned. Set per chunk, since each
+    chunk may be produced in a different context.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while True:
+        with tenant_database(alias=alias):
+            chunk = next(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+def on_commit(func, robust=False):
+    """transaction.on_commit() for the shard of the tenant in context."""
+    transaction.on_commit(func, using=current_database(), robust=robust)
+
+
+def is_tenant_model(model):
+    return model._meta.app_label == 'inventory' and model._meta.model_name not in SHARED_MODELS
+
+
+class ShardRouter:
+    """
+    Sends tenant models to the tenant's shard. Returns None for `default` so ReplicaRouter
+    (listed after it) still decides between the primary and the replica there.
+    """
+
+    def _route(self, model, hints):
+        if not is_tenant_model(model):
+            return None
+        instance = hints.get('instance')
+        user_id = getattr(instance, 'user_id', None)
+        alias = shard_for(user_id) if user_id is not None else _tenant_db.get()
+        return alias if alias and alias != 'default' else None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shards get the full schema (their inventory tables reference auth_user), except the map
+        if app_label == 'inventory' and model_name == 'tenantshard':
+            return db == 'default'
+        return None
@@ -0,0 +1,55 @@
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from . import caching
+from .models import Item
+
+# Barcode / SKU lookups for the POS scanner.
+# Results are kept in a bounded LRU inside each worker process, keyed by (tenant, code) and
+# stamped with the tenant's SCAN version. Saving or deleting an item bumps that version (a
+# shared cache counter), so every process drops the tenant's entries on its next scan.
+# A hit costs one cache read for the version and no database query. Stock is deliberately
+# not part of the cached result; callers that need it get it from the hold.
+
+FIELDS = ('id', 'name', 'sku', 'selling_price', 'average_cost')
+
+_lock = threading.Lock()
+_entries = OrderedDict()  # (user_id, code) -> (version, product dict or None)
+
+
+def max_entries():
+    return getattr(settings, 'SCAN_CACHE_SIZE', 10000)
+
+
+def normalize(code):
+    return (code or '').strip()
+
+
+def lookup(user_id, code):
+    """The product dict (FIELDS) for a scanned code, or None if the tenant has no such code."""
+    code = normalize(code)
+    if not code:
+        return None
+    key = (user_id, code)
+    version = caching.get_version(caching.SCAN, user_id)
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None and entry[0] == version:
+            _entries.move_to_end(key)
+            return entry[1]
+
+    # Unknown codes are cached too, so a bad label scanned repeatedly costs one query
+    product = Item.objects.filter(user_id=user_id, sku=code).values(*FIELDS).first()
+    with _lock:
+        _entries[key] = (version, product)
+        _entries.move_to_end(key)
+        while len(_entries) > max_entries():
+            _entries.popitem(last=False)
+    return product
+
+
+def clear():
+    with _lock:
+        _entries.clear()
@@ -0,0 +1,6 @@
+document.addEventListener("DOMContentLoaded", function() {
+    const selects = document.querySelectorAll('select');
+    selects.forEach(select => {
+        select.classList.add('form-select', 'custom-input');
+    });
+});
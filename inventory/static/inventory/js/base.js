@@ -0,0 +1,41 @@
+const sidebar = document.getElementById('sidebar');
+const sidebarCollapseBtn = document.getElementById('sidebarCollapse');
+
+// 1. Sidebar Logic
+sidebarCollapseBtn.addEventListener('click', () => {
+    sidebar.classList.toggle('collapsed');
+    const isCollapsed = sidebar.classList.contains('collapsed');
+    localStorage.setItem('sidebarCollapsed', isCollapsed);
+});
+
+if (localStorage.getItem('sidebarCollapsed') === 'true') {
+    sidebar.classList.add('collapsed');
+}
+
+// 2. Logout Animation Logic
+function handleLogout() {
+    const overlay = document.getElementById('logoutOverlay');
+    const text = document.getElementById('logoutText');
+    const form = document.getElementById('logoutForm');
+
+    // Show Overlay
+    overlay.classList.add('active');
+
+    // Step 1: "Saving..."
+    setTimeout(() => {
+        text.innerText = "Syncing data...";
+    }, 1000);
+
+    // Step 2: "Goodbye!" & Submit
+    setTimeout(() => {
+        text.innerText = "See you soon!";
+        setTimeout(() => {
+            form.submit(); // Submit the form after animation
+        }, 800);
+    }, 2000);
+}
+
+// 3. CSRF token for fetch() calls made by page scripts
+function csrfToken() {
+    return document.querySelector('meta[name="csrf-token"]').content;
+}
@@ -0,0 +1,195 @@
+// Theme Colors (Fixed for Dim Light Theme)
+const textColor = '#4b5563'; // Gray-600
+const gridColor = '#e5e7eb'; // Gray-200
+const accentColor = '#06b6d4'; 
+
+// DATA from Django
+const chartData = JSON.parse(document.getElementById('chart-data').textContent);
+const dates30 = chartData.dates_30;
+const sales30 = chartData.sales_30;
+const dates7 = chartData.dates_7;
+const sales7 = chartData.sales_7;
+
+// 1. Sales Trend Chart
+const ctxSales = document.getElementById('salesChart').getContext('2d');
+const gradSales = ctxSales.createLinearGradient(0, 0, 0, 300);
+gradSales.addColorStop(0, 'rgba(6, 182, 212, 0.5)');
+gradSales.addColorStop(1, 'rgba(6, 182, 212, 0.0)');
+
+let salesChart = new Chart(ctxSales, {
+    type: 'line',
+    data: {
+        labels: dates30,
+        datasets: [{
+            label: 'Sales (PKR)',
+            data: sales30,
+            borderColor: accentColor,
+            backgroundColor: gradSales,
+            borderWidth: 2,
+            tension: 0.4,
+            fill: true,
+            pointRadius: 0,
+            pointHoverRadius: 6
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: { legend: { display: false } },
+        scales: {
+            x: { grid: { display: false }, ticks: { color: textColor } },
+            y: { grid: { color: gridColor }, ticks: { color: textColor }, beginAtZero: true }
+        }
+    }
+});
+
+// INTERACTIVE TOGGLE
+function updateChart(range) {
+    document.querySelectorAll('.chart-toggle-btn').forEach(btn => btn.classList.remove('active'));
+    document.getElementById(`btn${range}`).classList.add('active');
+
+    if (range === '7d') {
+        salesChart.data.labels = dates7;
+        salesChart.data.datasets[0].data = sales7;
+    } else {
+        salesChart.data.labels = dates30;
+        salesChart.data.datasets[0].data = sales30;
+    }
+    salesChart.update();
+}
+
+// 2. Top Products
+const ctxTop = document.getElementById('topProductsChart').getContext('2d');
+new Chart(ctxTop, {
+    type: 'bar',
+    data: {
+        labels: chartData.top_products_labels,
+        datasets: [{
+            label: 'Units Sold',
+            data: chartData.top_products_data,
+            backgroundColor: [accentColor, '#3b82f6', '#6366f1', '#8b5cf6', '#a855f7'],
+            borderRadius: 4,
+            barThickness: 20
+        }]
+    },
+    options: {
+        indexAxis: 'y',
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: { legend: { display: false } },
+        scales: {
+            x: { grid: { color: gridColor }, ticks: { color: textColor } },
+            y: { grid: { display: false }, ticks: { color: textColor } }
+        }
+    }
+});
+
+// 3. Category Chart
+const ctxCat = document.getElementById('categoryChart').getContext('2d');
+new Chart(ctxCat, {
+    type: 'doughnut',
+    data: {
+        labels: chartData.category_labels,
+        datasets: [{
+            data: chartData.category_data,
+            backgroundColor: [accentColor, '#6366f1', '#10b981', '#f59e0b', '#ef4444'],
+            borderWidth: 0,
+            hoverOffset: 4
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: { 
+            legend: { position: 'right', labels: { color: textColor, usePointStyle: true } } 
+        },
+        cutout: '70%'
+    }
+});
+
+// 4. Stock Value (daily snapshots + today's running total)
+const ctxValue = document.getElementById('valuationChart').getContext('2d');
+new Chart(ctxValue, {
+    type: 'line',
+    data: {
+        labels: chartData.valuation_dates,
+        datasets: [{
+            label: 'Stock Value (PKR)',
+            data: chartData.valuation_values,
+            borderColor: '#6366f1',
+            borderWidth: 2,
+            tension: 0.3,
+            pointRadius: chartData.valuation_values.length > 1 ? 0 : 4,
+            pointHoverRadius: 6
+        }]
+    },
+    options: {
+        responsive: true,
+        maintainAspectRatio: false,
+        plugins: { legend: { display: false } },
+        scales: {
+            x: { grid: { display: false }, ticks: { color: textColor } },
+            y: { grid: { color: gridColor }, ticks: { color: textColor }, beginAtZero: true }
+        }
+    }
+});
+
+// 5. Live updates: KPIs, stock value and the critical stock list move with each sale, refund or purchase
+const live = JSON.parse(document.getElementById('live-data').textContent);
+const dayStart = Date.parse(live.day_start);
+const monthStart = Date.parse(live.month_start);
+const lowStockList = document.getElementById('lowStockList');
+
+function showLive() {
+    document.querySelectorAll('[data-live]').forEach(el => {
+        el.innerText = (el.dataset.prefix || '') + live[el.dataset.live].toLocaleString();
+    });
+    document.getElementById('lowStockCount').innerText = lowStockList.querySelectorAll('[data-item]').length;
+}
+
+function showStock(itemId, name, stock) {
+    let row = lowStockList.querySelector(`[data-item="${itemId}"]`);
+    if (stock >= live.low_stock_below) {
+        if (row) row.remove();
+        return;
+    }
+    if (!row) {
+        row = document.createElement('li');
+        row.className = 'list-group-item bg-transparent d-flex justify-content-between align-items-center border-bottom border-secondary';
+        row.dataset.item = itemId;
+        row.innerHTML = `<span style="color: var(--text-main);"></span>
+            <span class="badge bg-danger bg-opacity-10 text-danger"><span class="js-qty"></span> Left</span>`;
+        row.firstElementChild.innerText = name;
+        lowStockList.prepend(row);
+    }
+    row.querySelector('.js-qty').innerText = stock;
+    const empty = lowStockList.querySelector('.js-empty');
+    if (empty) empty.remove();
+}
+
+// Sales and refunds carry per-line deltas (negative for refunds) and when the line was sold
+function applyLines(event) {
+    event.lines.forEach(line => {
+        const soldAt = Date.parse(line.sold_at);
+        if (soldAt >= dayStart) {
+            live.sales_today += line.revenue;
+            live.items_sold_today += line.qty;
+        }
+        if (soldAt >= monthStart) {
+            live.monthly_revenue += line.revenue;
+            live.monthly_items_sold += line.qty;
+            live.monthly_profit += line.revenue - line.cost;
+        }
+        showStock(line.item, line.name, line.stock);
+    });
+    live.total_inventory_value += event.value_delta;
+    showLive();
+}
+
+liveEvents.on('sale', applyLines);
+liveEvents.on('refund', applyLines);
+liveEvents.on('purchase', event => {
+    showStock(event.item, event.name, event.stock);
+    live.total_inventory_value += event.value_delta;
+    showLive();
+});
@@ -0,0 +1,23 @@
+// Live change feed (server-sent events from /events/).
+// Pages register handlers with liveEvents.on('sale' | 'purchase' | 'refund', fn); each handler
+// gets the event's payload. The browser reconnects on its own and resumes from the last event id.
+const liveEvents = (() => {
+    const handlers = {};
+    const source = document.querySelector('[data-events-url]');
+
+    if (source && window.EventSource) {
+        const stream = new EventSource(source.dataset.eventsUrl);
+        ['sale', 'purchase', 'refund'].forEach(kind => {
+            stream.addEventListener(kind, event => {
+                const payload = JSON.parse(event.data);
+                (handlers[kind] || []).forEach(handler => handler(payload));
+            });
+        });
+    }
+
+    return {
+        on(kind, handler) {
+            (handlers[kind] = handlers[kind] || []).push(handler);
+        }
+    };
+})();
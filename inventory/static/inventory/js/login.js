@@ -0,0 +1,42 @@
+// Desktop Slider Logic
+const container = document.getElementById('main-container');
+const signUpBtn = document.getElementById('signUpBtn');
+const signInBtn = document.getElementById('signInBtn');
+
+signUpBtn.addEventListener('click', () => {
+    container.classList.add("container-active-signup");
+});
+
+signInBtn.addEventListener('click', () => {
+    container.classList.remove("container-active-signup");
+});
+
+// Mobile Toggle Logic
+const mobileSignInToggle = document.getElementById('mobileSignInToggle');
+const mobileSignUpToggle = document.getElementById('mobileSignUpToggle');
+const mobileSignInForm = document.getElementById('mobileSignInForm');
+const mobileSignUpForm = document.getElementById('mobileSignUpForm');
+
+mobileSignUpToggle.addEventListener('click', () => {
+    mobileSignInForm.classList.add('hidden');
+    mobileSignInForm.classList.remove('block');
+    mobileSignUpForm.classList.remove('hidden');
+    mobileSignUpForm.classList.add('block');
+
+    mobileSignUpToggle.classList.add('bg-white', 'text-indigo-600', 'shadow-sm');
+    mobileSignUpToggle.classList.remove('text-gray-500');
+    mobileSignInToggle.classList.remove('bg-white', 'text-indigo-600', 'shadow-sm');
+    mobileSignInToggle.classList.add('text-gray-500');
+});
+
+mobileSignInToggle.addEventListener('click', () => {
+    mobileSignUpForm.classList.add('hidden');
+    mobileSignUpForm.classList.remove('block');
+    mobileSignInForm.classList.remove('hidden');
+    mobileSignInForm.classList.add('block');
+
+    mobileSignInToggle.classList.add('bg-white', 'text-indigo-600', 'shadow-sm');
+    mobileSignInToggle.classList.remove('text-gray-500');
+    mobileSignUpToggle.classList.remove('bg-white', 'text-indigo-600', 'shadow-sm');
+    mobileSignUpToggle.classList.add('text-gray-500');
+});
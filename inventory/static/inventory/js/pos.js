@@ -0,0 +1,259 @@
+// inventoryProducts includes average_cost from backend
+const inventoryProducts = JSON.parse(document.getElementById('products-data').textContent);
+const posConfig = document.getElementById('posApp').dataset;
+
+const productList = document.getElementById('productOptions');
+const productInput = document.getElementById('productInput');
+const scanInput = document.getElementById('scanInput');
+const qtyInput = document.getElementById('qtyInput');
+const cartTableBody = document.getElementById('cartTableBody');
+const emptyCartMsg = document.getElementById('emptyCartMsg');
+const discountInput = document.getElementById('discountInput');
+const percentInput = document.getElementById('percentInput');
+const warningDiv = document.getElementById('validationWarning');
+const warningMsg = document.getElementById('warningMsg');
+
+inventoryProducts.forEach(p => {
+    p.option = document.createElement('option');
+    p.option.value = p.name;
+    productList.appendChild(p.option);
+    showAvailable(p);
+});
+
+function showAvailable(product) {
+    product.option.label = `${product.name} (${product.available} available)`;
+}
+
+document.getElementById('dateDisplay').innerText = new Date().toLocaleDateString();
+document.getElementById('receiptNo').innerText = Math.floor(Math.random() * 100000);
+
+let cart = [];
+
+// Identifies this till's cart to the stock hold API; a new one starts after every checkout (page reload)
+const cartId = (window.crypto && crypto.randomUUID)
+    ? crypto.randomUUID()
+    : Date.now().toString(36) + Math.random().toString(36).slice(2);
+
+// Holds `qty` units of a product for this cart (0 releases). Resolves with the server's reply.
+function holdStock(productId, qty) {
+    return fetch(posConfig.holdUrl, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken() },
+        body: JSON.stringify({ cart_id: cartId, item_id: productId, qty: qty })
+    }).then(response => response.json());
+}
+
+function addToCart() {
+    const name = productInput.value;
+    const qty = parseInt(qtyInput.value);
+    const product = inventoryProducts.find(p => p.name.toLowerCase() === name.toLowerCase());
+
+    if (!product) { alert("Product not found!"); return; }
+    if (qty <= 0 || isNaN(qty)) { alert("Invalid quantity."); return; }
+
+    const existingItem = cart.find(item => item.id === product.id);
+    const newQty = (existingItem ? existingItem.qty : 0) + qty;
+    if (product.available < newQty) { alert(`Only ${product.available} available.`); return; }
+
+    holdStock(product.id, newQty).then(data => {
+        if (data.status !== 'success') {
+            if (data.available !== undefined) updateAvailable(product.id, data.available);
+            alert("Error: " + data.message);
+            return;
+        }
+        updateAvailable(product.id, data.available);
+        setLine(product, newQty);
+        productInput.value = "";
+        qtyInput.value = "1";
+        productInput.focus();
+    });
+}
+
+// Sets a product's cart line to `qty` units, adding the line if needed
+function setLine(product, qty) {
+    const existingItem = cart.find(item => item.id === product.id);
+    if (existingItem) {
+        existingItem.qty = qty;
+    } else {
+        cart.push({
+            id: product.id,
+            name: product.name,
+            price: product.selling_price,
+            cost: product.average_cost, // Store cost for client-side validation hint
+            offers: product.offers || [], // [percent_off, bundle_qty, bundle_price] rows
+            qty: qty
+        });
+    }
+    renderCart();
+}
+
+// Handheld scanners type the code and press Enter. One request looks the code up and holds one more unit.
+scanInput.addEventListener('keydown', event => {
+    if (event.key !== 'Enter') return;
+    event.preventDefault();
+    const code = scanInput.value.trim();
+    scanInput.value = "";
+    if (code) scanItem(code);
+});
+
+function scanItem(code) {
+    fetch(posConfig.scanUrl.replace('__code__', encodeURIComponent(code)), {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken() },
+        body: JSON.stringify({ cart_id: cartId, qty: 1 })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            alert("Error: " + data.message);
+            return;
+        }
+        // Offers come from the catalog embedded in the page; the scan reply only carries code, name and prices
+        const known = inventoryProducts.find(p => p.id === data.product.id);
+        updateAvailable(data.product.id, data.available);
+        setLine({ ...data.product, offers: known ? known.offers : [] }, data.held);
+        scanInput.focus();
+    });
+}
+
+function renderCart() {
+    cartTableBody.innerHTML = "";
+    if (cart.length === 0) {
+        cartTableBody.appendChild(emptyCartMsg);
+        document.getElementById('checkoutBtn').disabled = true;
+        calculateFinalTotal();
+        return;
+    }
+    cart.forEach((item, index) => {
+        const lineTotal = item.price * item.qty;
+        const row = document.createElement('tr');
+        row.innerHTML = `
+            <td class="fw-medium">${item.name}</td>
+            <td>${item.price}</td>
+            <td>${item.qty}</td>
+            <td class="text-end fw-bold">${lineTotal}</td>
+            <td class="text-center"><i class="bi bi-x-lg remove-btn" onclick="removeFromCart(${index})"></i></td>
+        `;
+        cartTableBody.appendChild(row);
+    });
+    document.getElementById('checkoutBtn').disabled = false;
+    calculateFinalTotal();
+}
+
+function removeFromCart(index) {
+    const [item] = cart.splice(index, 1);
+    holdStock(item.id, 0);
+    renderCart();
+}
+
+// Give the stock back straight away when the till page is closed; otherwise holds lapse after the TTL
+let checkedOut = false;
+window.addEventListener('pagehide', () => {
+    if (cart.length === 0 || checkedOut) return;
+    fetch(posConfig.releaseUrl, {
+        method: "POST",
+        keepalive: true,
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken() },
+        body: JSON.stringify({ cart_id: cartId })
+    });
+});
+
+// Best promotion on a line; mirrors inventory/pricing.py (the server's figures are authoritative)
+function promotionDiscount(item) {
+    const gross = item.price * item.qty;
+    let best = 0;
+    (item.offers || []).forEach(([percentOff, bundleQty, bundlePrice]) => {
+        let saving = Math.floor(gross * Math.min(percentOff || 0, 100) / 100);
+        if (bundleQty) {
+            const bundled = Math.floor(item.qty / bundleQty) * bundlePrice + (item.qty % bundleQty) * item.price;
+            saving = Math.max(saving, gross - bundled);
+        }
+        best = Math.max(best, saving);
+    });
+    return best;
+}
+
+function calculateFinalTotal() {
+    let subtotal = 0;
+    let totalCost = 0;
+    let promotions = 0;
+    cart.forEach(item => {
+        subtotal += (item.price * item.qty);
+        totalCost += (item.cost * item.qty);
+        promotions += promotionDiscount(item);
+    });
+
+    const percentOff = parseInt(percentInput.value) || 0;
+    let discount = promotions + (parseInt(discountInput.value) || 0)
+        + Math.floor((subtotal - promotions) * percentOff / 100);
+
+    // Client-side validation hint
+    if (discount > 0 && (subtotal - discount) < totalCost) {
+        warningDiv.classList.remove('d-none');
+        warningMsg.innerText = `Warning: Sale price (PKR ${subtotal - discount}) is below cost (PKR ${totalCost}).`;
+    } else {
+        warningDiv.classList.add('d-none');
+    }
+
+    document.getElementById('subtotalDisplay').innerText = `PKR ${subtotal}`;
+    document.getElementById('promoDisplay').innerText = `- PKR ${promotions}`;
+    // Final Total = (Subtotal - Discount) + Tax (Tax is 0%)
+    document.getElementById('totalDisplay').innerText = `PKR ${subtotal - discount}`;
+}
+
+function processCheckout() {
+    if (cart.length === 0) return;
+    const btn = document.getElementById('checkoutBtn');
+    btn.innerText = "Processing...";
+    btn.disabled = true;
+
+    fetch(posConfig.checkoutUrl, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken() },
+        body: JSON.stringify({
+            items: cart.map(item => ({ id: item.id, qty: item.qty })),
+            cart_id: cartId,
+            discount: parseInt(discountInput.value) || 0,
+            percent_off: parseInt(percentInput.value) || 0
+        })
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'success') {
+            checkedOut = true;
+            window.location.reload();
+        } else {
+            alert("Error: " + data.message);
+            btn.innerText = "Complete Sale";
+            btn.disabled = false;
+        }
+    });
+}
+
+// Stock moved by other tills, purchases and refunds (see live.js). Sale lines carry what is left
+// after every cart's holds, ours included, while `available` here excludes this cart's own hold.
+function ownQty(productId) {
+    const line = cart.find(item => item.id === productId);
+    return line ? line.qty : 0;
+}
+
+function updateAvailable(productId, available) {
+    const product = inventoryProducts.find(p => p.id === productId);
+    if (!product) return;
+    product.available = Math.max(available, 0);
+    showAvailable(product);
+}
+
+liveEvents.on('sale', event => {
+    event.lines.forEach(line => updateAvailable(line.item, line.available + ownQty(line.item)));
+});
+liveEvents.on('refund', event => {
+    event.lines.forEach(line => {
+        const product = inventoryProducts.find(p => p.id === line.item);
+        if (product) updateAvailable(line.item, product.available - line.qty);
+    });
+});
+liveEvents.on('purchase', event => {
+    const product = inventoryProducts.find(p => p.id === event.item);
+    if (product) updateAvailable(event.item, product.available + event.qty);
+});
@@ -0,0 +1,23 @@
+document.getElementById('addProductForm').addEventListener('submit', function (e) {
+    e.preventDefault();
+    const form = this;
+    const formData = new FormData(form);
+
+    fetch(form.action, {
+        method: 'POST',
+        body: formData,
+        headers: { 'X-Requested-With': 'XMLHttpRequest' }
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status === 'success') {
+            var modalEl = document.getElementById('addProductModal');
+            var modal = bootstrap.Modal.getInstance(modalEl);
+            if (modal) { modal.hide(); }
+            window.location.reload();
+        } else {
+            alert('Error: ' + JSON.stringify(data.errors));
+        }
+    })
+    .catch(error => console.error('Error:', error));
+});
@@ -0,0 +1,49 @@
+// Preview: the same form sent to the JSON API with preview=true; nothing is written
+const repriceForm = document.getElementById('repriceForm');
+const previewPanel = document.getElementById('previewPanel');
+
+document.getElementById('previewBtn').addEventListener('click', () => {
+    const payload = Object.fromEntries(new FormData(repriceForm));
+    delete payload.csrfmiddlewaretoken;
+    payload.preview = true;
+
+    fetch(repriceForm.dataset.previewUrl, {
+        method: "POST",
+        headers: { "Content-Type": "application/json", "X-CSRFToken": csrfToken() },
+        body: JSON.stringify(payload)
+    })
+    .then(response => response.json())
+    .then(data => {
+        if (data.status !== 'success') {
+            alert("Error: " + (data.message || JSON.stringify(data.errors)));
+            return;
+        }
+        showPreview(data.preview);
+    });
+});
+
+function showPreview(preview) {
+    const flagged = preview.field === 'selling_price' ? 'would sell below cost' : 'would cost more than their price';
+    document.getElementById('previewSummary').innerText =
+        `${preview.changed} of ${preview.items} matching product(s) change. ` +
+        `Total ${preview.before.toLocaleString()} → ${preview.after.toLocaleString()} PKR. ` +
+        (preview.flagged ? `${preview.flagged} ${flagged}.` : '') +
+        (preview.items > preview.rows.length ? ` First ${preview.rows.length} shown.` : '');
+
+    const body = document.getElementById('previewRows');
+    body.innerHTML = "";
+    preview.rows.forEach(row => {
+        const tr = document.createElement('tr');
+        tr.innerHTML = `
+            <td class="fw-bold"></td>
+            <td></td>
+            <td class="font-monospace text-muted">PKR ${row.average_cost}</td>
+            <td class="font-monospace">PKR ${row.selling_price}</td>
+            <td class="font-monospace fw-bold" style="color: #059669;">PKR ${row.new_value}</td>
+        `;
+        tr.children[0].innerText = row.name;
+        tr.children[1].innerText = row.company;
+        body.appendChild(tr);
+    });
+    previewPanel.classList.remove('d-none');
+}
@@ -0,0 +1,46 @@
+function toggleDetails(rowId, clickedRow) {
+    const detailRow = document.getElementById(rowId);
+    if (detailRow.classList.contains('show')) {
+        detailRow.classList.remove('show');
+        clickedRow.classList.remove('expanded');
+    } else {
+        detailRow.classList.add('show');
+        clickedRow.classList.add('expanded');
+    }
+}
+
+// --- Refunds ---
+// Checked orders and lines are posted together through the single hidden #refundForm.
+function selectedRefunds() {
+    return Array.from(document.querySelectorAll('.refund-check:checked'));
+}
+
+function updateRefundSelection() {
+    const count = selectedRefunds().length;
+    document.getElementById('refundCount').innerText = count;
+    document.getElementById('refundSelectedBtn').classList.toggle('d-none', count === 0);
+}
+
+function submitRefund(entries) {
+    const form = document.getElementById('refundForm');
+    entries.forEach(([field, value]) => {
+        const input = document.createElement('input');
+        input.type = 'hidden';
+        input.name = field;
+        input.value = value;
+        form.appendChild(input);
+    });
+    form.submit();
+}
+
+function refundSelected() {
+    const checks = selectedRefunds();
+    if (checks.length === 0) return;
+    if (!confirm(`Refund ${checks.length} selected order(s)/line(s) and return the stock?`)) return;
+    submitRefund(checks.map(c => [c.dataset.field, c.value]));
+}
+
+function refundOrder(orderKey) {
+    if (!confirm("Refund this whole order and return its stock?")) return;
+    submitRefund([['order_id', orderKey]]);
+}
@@ -0,0 +1,238 @@
+import random
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.db import OperationalError, connection
+from django.db.models import Max, Min, Sum
+
+from . import checkout, refunds, valuation
+from .models import Category, Item, Purchase, SaleRecord
+
+# Concurrency stress harness for the stock paths: checkout (checkout.place_order), purchases
+# (Purchase.save) and refunds (refunds.refund) fired from many threads at a few hot items.
+# Used by `manage.py stress_stock` and inventory.tests.StockConcurrencyTests.
+#
+# On PostgreSQL, row locks block and the time shows up in operation latency. SQLite has a
+# single writer and reports "database is locked" instead, so those errors are retried with
+# backoff and the time spent is reported as lock wait. Deadlocks are counted, never hidden.
+
+OPERATIONS = (('checkout', 0.6), ('purchase', 0.25), ('refund', 0.15))
+RETRYABLE = ('locked', 'deadlock', 'could not serialize')
+
+
+def create_fixture(username, hot_items=5, stock=40, cost=100, price=150):
+    user = User.objects.create_user(username=username)
+    category = Category.objects.create(name='Stress', user=user)
+    items = [
+        Item.objects.create(name=f"Hot {i}", category=category, quantity=stock,
+                            average_cost=cost, selling_price=price, user=user)
+        for i in range(hot_items)
+    ]
+    return user, items
+
+
+def _new_stats():
+    return {
+        'ok': {name: 0 for name, _ in OPERATIONS},
+        'rejected': {name: 0 for name, _ in OPERATIONS},
+        'latency': [],
+        'retries': 0,
+        'deadlocks': 0,
+        'lock_wait': 0.0,
+        'errors': [],
+    }
+
+
+def _with_retry(operation, stats):
+    delay = 0.002
+    waited_since = None
+    while True:
+        started = time.perf_counter()
+        try:
+            result = operation()
+        except OperationalError as e:
+            message = str(e).lower()
+            if not any(word in message for word in RETRYABLE):
+                raise
+            if 'deadlock' in message:
+                stats['deadlocks'] += 1
+            stats['retries'] += 1
+            waited_since = waited_since or started
+            time.sleep(delay * (1 + random.random()))
+            delay = min(delay * 2, 0.1)
+            continue
+        if waited_since is not None:
+            stats['lock_wait'] += started - waited_since
+        return result
+
+
+class _Worker:
+    def __init__(self, user, item_ids, orders, orders_lock, operations, mix, seed, barrier):
+        self.user = user
+        self.item_ids = item_ids
+        self.orders = orders
+        self.orders_lock = orders_lock
+        self.operations = operations
+        self.mix = mix
+        self.rng = random.Random(seed)
+        self.barrier = barrier
+        self.stats = _new_stats()
+
+    def run(self):
+        names = [name for name, _ in self.mix]
+        weights = [weight for _, weight in self.mix]
+        try:
+            self.barrier.wait()
+            for _ in range(self.operations):
+                name = self.rng.choices(names, weights)[0]
+                started = time.perf_counter()
+                try:
+                    done = getattr(self, name)()
+                except Exception as e:
+                    self.stats['errors'].append(f"{name}: {e!r}")
+                    continue
+                self.stats['latency'].append(time.perf_counter() - started)
+                self.stats['ok' if done else 'rejected'][name] += 1
+        finally:
+            # Each thread has its own connection
+            connection.close()
+
+    def _retry(self, operation):
+        return _with_retry(operation, self.stats)
+
+    def checkout(self):
+        lines = [
+            {'id': item_id, 'qty': self.rng.randint(1, 3)}
+            for item_id in self.rng.sample(self.item_ids, self.rng.randint(1, min(3, len(self.item_ids))))
+        ]
+        try:
+            order_id = self._retry(lambda: checkout.place_order(self.user, lines))
+        except ValueError:
+            # Out of stock is the expected outcome for some checkouts under contention
+            return False
+        with self.orders_lock:
+            self.orders.append(order_id)
+        return True
+
+    def purchase(self):
+        item_id, qty, price = self.rng.choice(self.item_ids), self.rng.randint(1, 10), self.rng.randint(60, 140)
+        self._retry(lambda: Purchase(item_id=item_id, quantity=qty, unit_price=price, user=self.user).save())
+        return True
+
+    def refund(self):
+        with self.orders_lock:
+            if not self.orders:
+                return False
+            order_id = self.orders.pop(self.rng.randrange(len(self.orders)))
+        try:
+            self._retry(lambda: refunds.refund(self.user, order_ids=[order_id]))
+        except ValueError:
+            return False
+        return True
+
+
+def run(user, items, workers=8, operations=50, seed=0, mix=OPERATIONS):
+    """
+    Runs `workers` threads of `operations` random operations each, drawn from `mix`
+    ((name, weight) pairs), and returns the combined report.
+    """
+    initial = {item.pk: (item.quantity, item.average_cost) for item in items}
+    orders, orders_lock = [], threading.Lock()
+    barrier = threading.Barrier(workers)
+    pool = [
+        _Worker(user, list(initial), orders, orders_lock, operations, mix, seed * 1000 + n, barrier)
+        for n in range(workers)
+    ]
+    threads = [threading.Thread(target=worker.run) for worker in pool]
+
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    stats = _new_stats()
+    for worker in pool:
+        for key in ('ok', 'rejected'):
+            for name in stats[key]:
+                stats[key][name] += worker.stats[key][name]
+        for key in ('latency', 'errors'):
+            stats[key].extend(worker.stats[key])
+        for key in ('retries', 'deadlocks', 'lock_wait'):
+            stats[key] += worker.stats[key]
+
+    latency = sorted(stats.pop('latency')) or [0.0]
+    return {
+        'workers': workers,
+        'operations': workers * operations,
+        'seconds': elapsed,
+        'orders_per_sec': stats['ok']['checkout'] / elapsed if elapsed else 0.0,
+        'ops_per_sec': len(latency) / elapsed if elapsed else 0.0,
+        'latency_ms': {
+            'p50': statistics.median(latency) * 1000,
+            'p95': latency[int(len(latency) * 0.95) - 1 if len(latency) > 1 else 0] * 1000,
+            'max': latency[-1] * 1000,
+        },
+        **stats,
+        'problems': verify(user, initial, purchases_only=all(name == 'purchase' for name, _ in mix)),
+    }
+
+
+def replay_purchases(user, initial):
+    """
+    {item id: average_cost} from the opening stock and the committed purchases in id order, with
+    Purchase.save()'s rounding. Each purchase gets its id inside the transaction that holds the item
+    row, so id order is the order they were applied in.
+    """
+    state = dict(initial)
+    rows = Purchase.objects.filter(user=user, item_id__in=initial).order_by('pk')
+    for item_id, quantity, unit_price in rows.values_list('item_id', 'quantity', 'unit_price'):
+        on_hand, cost = state[item_id]
+        total_qty = on_hand + quantity
+        if total_qty > 0:
+            cost = (2 * (on_hand * cost + quantity * unit_price) + total_qty) // (2 * total_qty)
+        state[item_id] = (total_qty, cost)
+    return {item_id: cost for item_id, (_, cost) in state.items()}
+
+
+def verify(user, initial, purchases_only=False):
+    """
+    Invariants that must hold after any interleaving. Returns a list of problems (empty when correct):
+    - stock never goes negative
+    - stock is conserved: initial + purchased - still sold == on hand
+    - average_cost stays between the cheapest and dearest cost it was ever given
+    - with purchases only, average_cost is exactly the replay of the purchases in commit order
+    - the running inventory valuation matches a full recount
+    """
+    problems = []
+    # Sales and refunds move stock between purchases, so only a purchase-only run can be replayed
+    replayed = replay_purchases(user, initial) if purchases_only else {}
+    purchased = {
+        row['item_id']: row for row in
+        Purchase.objects.filter(user=user).values('item_id')
+        .annotate(qty=Sum('quantity'), low=Min('unit_price'), high=Max('unit_price'))
+    }
+    sold = dict(
+        SaleRecord.objects.filter(user=user).values('product_id').annotate(qty=Sum('quantity'))
+        .values_list('product_id', 'qty')
+    )
+    for item in Item.objects.filter(pk__in=initial):
+        start_qty, start_cost = initial[item.pk]
+        bought = purchased.get(item.pk, {'qty': 0, 'low': start_cost, 'high': start_cost})
+        if item.quantity < 0:
+            problems.append(f"{item.name}: oversold, quantity {item.quantity}")
+        expected = start_qty + bought['qty'] - sold.get(item.pk, 0)
+        if item.quantity != expected:
+            problems.append(f"{item.name}: quantity {item.quantity}, expected {expected}")
+        low, high = min(start_cost, bought['low']), max(start_cost, bought['high'])
+        if not low <= item.average_cost <= high:
+            problems.append(f"{item.name}: average_cost {item.average_cost} outside [{low}, {high}]")
+        if item.pk in replayed and item.average_cost != replayed[item.pk]:
+            problems.append(f"{item.name}: average_cost {item.average_cost}, replay gives {replayed[item.pk]}")
+    running, counted = valuation.current(user.pk), valuation.scan(user.pk)
+    if running != counted:
+        problems.append(f"valuation: running total {running}, recount {counted}")
+    return problems
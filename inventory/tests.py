@@ -1,3 +1,1202 @@
-from django.test import TestCase
+import io
+import json
+import random
+import threading
+import time
+import unittest
+from unittest import mock
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from fractions import Fraction
 
-# Create your tests here.
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.db.models import Min, Sum
+from django.db.models.signals import post_delete
+from django.http import StreamingHttpResponse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import analytics, caching, checkout, costing, events, exports, forecast, periods, pricing, receipts, refunds, reports, repricing, reservations, routers, scanning, stress, throttling, valuation, workers
+from .models import Category, ChangeEvent, InventoryValuation, Item, ItemForecast, PriceChangeBatch, Profile, Promotion, Purchase, SaleRecord, StockReservation, TenantShard
+
+
+def _sql(queries):
+    return [q['sql'] for q in queries]
+
+
+class ShopTestCase(TestCase):
+    """A shop user (password 'pass') with a 'Pens' category; item() adds products to it."""
+
+    databases = '__all__'  # routed views also read from the replica and shard aliases when configured
+    username = 'shop'
+
+    def setUp(self):
+        cache.clear()
+        # The replica mirrors `default` over a connection of its own, which cannot see this test's
+        # uncommitted rows; routing still runs, and ReplicaReadTests covers the real alias
+        patcher = mock.patch.object(routers, 'replica_alias', return_value='default')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.user = User.objects.create_user(username=self.username, password='pass')
+        self.category = Category.objects.create(name='Pens', user=self.user)
+
+    def item(self, name='Pen', **fields):
+        fields = {'selling_price': 50, 'average_cost': 20, 'quantity': 10, **fields}
+        return Item.objects.create(name=name, category=self.category, user=self.user, **fields)
+
+    def login(self):
+        self.client.login(username=self.user.username, password='pass')
+
+    def sell(self, item, at, quantity=1):
+        """A sale line dated `at`, recorded without checkout (stock is left alone)."""
+        sale = SaleRecord.objects.create(product=item, quantity=quantity, total_price=item.selling_price * quantity,
+                                         user=self.user)
+        SaleRecord.objects.filter(pk=sale.pk).update(date_sold=at)
+        return sale
+
+
+class AnalyticsTests(ShopTestCase):
+
+    def test_abc_cut_offs(self):
+        # Ranked 50, 30, 15, 5: the revenue share before each is 0, 0.5, 0.8 and 0.95
+        classes = analytics.abc_classes(np.array([5, 50, 0, 30, 15]))
+        self.assertEqual(list(classes), ['C', 'A', 'C', 'A', 'B'])
+        self.assertEqual(list(analytics.abc_classes(np.array([0, 0]))), ['C', 'C'])
+
+    def test_costs_and_days_of_cover(self):
+        pen = self.item()
+        self.item('Book', selling_price=300, average_cost=200, quantity=5)
+        # A legacy line saved without its cost is costed at the item's average cost
+        SaleRecord.objects.create(product=pen, quantity=2, total_price=100, user=self.user)
+        SaleRecord.objects.create(product=pen, quantity=1, total_price=50, discount=5, unit_cost_at_sale=25,
+                                  user=self.user)
+        report = analytics.analyze(self.user, *periods.default_range(30))
+        products = {product['name']: product for product in report['products']}
+        pen = products['Pen']
+        self.assertEqual((pen['sold'], pen['revenue'], pen['cost'], pen['profit']), (3, 145, 2 * 20 + 25, 80))
+        self.assertEqual((pen['abc'], pen['days_of_cover']), ('A', 100.0))  # 10 on hand at 0.1 a day
+        book = products['Book']
+        self.assertEqual((book['sold'], book['abc'], book['days_of_cover']), (0, 'C', None))
+        self.assertEqual(report['totals']['margin_pct'], round(80 * 100 / 145, 1))
+
+
+class SalesReportTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(quantity=100)
+
+    def test_empty_days_are_zeros(self):
+        self.sell(self.pen, datetime(2024, 1, 3, 12, tzinfo=dt_timezone.utc))
+        self.sell(self.pen, datetime(2024, 1, 6, 12, tzinfo=dt_timezone.utc), quantity=2)
+        series = reports.sales_series(self.user, datetime(2024, 1, 1, tzinfo=dt_timezone.utc),
+                                      datetime(2024, 1, 8, tzinfo=dt_timezone.utc))
+        self.assertEqual([bucket['revenue'] for bucket in series], [0, 0, 50, 0, 0, 100, 0])
+        self.assertEqual((series[0]['period'], series[0]['label']), ('2024-01-01', 'Jan 01'))
+        self.assertEqual(reports.totals(series)['qty'], 3)
+
+    def test_week_month_and_quarter_buckets(self):
+        self.sell(self.pen, datetime(2023, 12, 30, tzinfo=dt_timezone.utc))
+        self.sell(self.pen, datetime(2024, 2, 14, tzinfo=dt_timezone.utc))
+        start, end = datetime(2023, 11, 15, tzinfo=dt_timezone.utc), datetime(2024, 4, 2, tzinfo=dt_timezone.utc)
+
+        weeks = reports.sales_series(self.user, start, end, 'week')
+        self.assertEqual((weeks[0]['period'], weeks[0]['label']), ('2023-11-13', 'Wk of Nov 13'))  # its Monday
+        self.assertEqual(len(weeks), 21)
+        months = reports.sales_series(self.user, start, end, 'month')
+        self.assertEqual([month['label'] for month in months],
+                         ['Nov 2023', 'Dec 2023', 'Jan 2024', 'Feb 2024', 'Mar 2024', 'Apr 2024'])
+        self.assertEqual([month['qty'] for month in months], [0, 1, 0, 1, 0, 0])
+        quarters = reports.sales_series(self.user, start, end, 'quarter')
+        self.assertEqual([(quarter['label'], quarter['qty']) for quarter in quarters],
+                         [('Q4 2023', 1), ('Q1 2024', 1), ('Q2 2024', 0)])
+        with self.assertRaises(ValueError):
+            reports.sales_series(self.user, start, end, 'year')
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class LocalPeriodTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(quantity=100)
+        Profile.objects.filter(user=self.user).update(timezone='Asia/Karachi')  # UTC+5
+        cache.clear()
+
+    def test_yoy_across_leap_day(self):
+        tz = periods.zone('Asia/Karachi')
+        with timezone.override(tz):
+            leap_day = periods.days_range(date(2024, 2, 29), date(2024, 2, 29), tz)
+            self.assertEqual(reports.previous_range(*leap_day, 'yoy'),
+                             periods.days_range(date(2023, 2, 28), date(2023, 2, 28), tz))
+            february = periods.month_range(date(2024, 2, 1), tz)
+            self.assertEqual(reports.previous_range(*february, 'yoy'), periods.month_range(date(2023, 2, 1), tz))
+
+    def test_days_roll_over_at_local_midnight(self):
+        self.sell(self.pen, datetime(2024, 3, 1, 18, 59, tzinfo=dt_timezone.utc))  # 23:59 on 1 March in Karachi
+        self.sell(self.pen, datetime(2024, 3, 1, 19, 0, tzinfo=dt_timezone.utc), quantity=2)  # 00:00 on 2 March
+        self.sell(self.pen, datetime(2023, 2, 28, 20, 0, tzinfo=dt_timezone.utc), quantity=3)  # 01:00 on 1 March 2023
+        self.login()
+        response = self.client.get(reverse('sales_report_api'),
+                                   {'start': '2024-03-01', 'end': '2024-03-02', 'compare': 'yoy'}, secure=True)
+        data = response.json()
+        self.assertEqual(data['current']['start'], '2024-03-01T00:00:00+05:00')
+        self.assertEqual([day['qty'] for day in data['current']['series']], [1, 2])
+        self.assertEqual([day['qty'] for day in data['previous']['series']], [3, 0])
+        self.assertEqual(data['deltas']['qty']['change'], 0)
+
+
+class CachedLookupQueryTests(ShopTestCase):
+    """Profile, business name and category lookups are served from the cache once warm."""
+
+    def setUp(self):
+        super().setUp()
+        Profile.objects.filter(user=self.user).update(business_name='Corner Stationers')
+        cache.clear()
+        self.item('Gel Pen', average_cost=30)
+        self.login()
+
+    def _queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return _sql(ctx.captured_queries)
+
+    def test_warm_page_loads_skip_profile_and_category_queries(self):
+        for name in ('dashboard', 'product_list', 'add_item', 'profile'):
+            url = reverse(name)
+            cache.clear()
+            cold = self._queries(url)
+            warm = self._queries(url)
+            self.assertTrue(any('inventory_profile' in sql for sql in cold), name)
+            self.assertFalse(any('inventory_profile' in sql for sql in warm), name)
+            self.assertFalse(
+                any('FROM "inventory_category"' in sql and 'JOIN' not in sql for sql in warm), name
+            )
+            self.assertLess(len(warm), len(cold), name)
+
+    def test_product_list_drops_several_queries(self):
+        url = reverse('product_list')
+        cold = self._queries(url)
+        warm = self._queries(url)
+        self.assertGreaterEqual(len(cold) - len(warm), 2)
+
+    def test_login_does_not_write_profile(self):
+        self.client.logout()
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.login(username='shop', password='pass')
+        writes = [sql for sql in _sql(ctx.captured_queries)
+                  if 'inventory_profile' in sql and sql.startswith(('UPDATE', 'INSERT'))]
+        self.assertEqual(writes, [])
+
+    def test_profile_change_refreshes_business_name(self):
+        url = reverse('dashboard')
+        self.assertContains(self.client.get(url), 'Corner Stationers')
+        profile = Profile.objects.get(user=self.user)
+        profile.business_name = 'Main Street Paper'
+        profile.save()
+        response = self.client.get(url)
+        self.assertContains(response, 'Main Street Paper')
+        self.assertNotContains(response, 'Corner Stationers')
+
+    def test_new_category_appears_in_cached_choices(self):
+        self._queries(reverse('product_list'))
+        Category.objects.create(name='Notebooks', user=self.user)
+        self.assertContains(self.client.get(reverse('add_item')), 'Notebooks')
+        self.assertContains(self.client.get(reverse('product_list')), 'Notebooks')
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class FragmentCacheTests(ShopTestCase):
+    """Cached page fragments are rebuilt as soon as the data under them changes."""
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+        self.login()
+
+    def get(self, name):
+        return self.client.get(reverse(name), secure=True)
+
+    def test_product_table_follows_item_edits(self):
+        self.assertContains(self.get('product_list'), 'PKR 50')
+        self.pen.name, self.pen.selling_price = 'Fountain Pen', 75
+        self.pen.save()
+        response = self.get('product_list')
+        self.assertContains(response, 'Fountain Pen')
+        self.assertContains(response, 'PKR 75')
+
+    def test_sales_book_and_dashboard_follow_new_sales(self):
+        self.assertNotContains(self.get('dashboard'), '<span class="js-qty">')
+        self.get('sales_book')
+        with self.captureOnCommitCallbacks(execute=True):
+            order_id = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 3}])
+        self.assertContains(self.get('sales_book'), order_id)
+        dashboard = self.get('dashboard')
+        self.assertContains(dashboard, '<span class="js-qty">7</span> Left', html=False)  # low stock now
+        self.assertContains(dashboard, '<span class="log-qty">x3</span>')
+
+
+class CachedAuthTests(ShopTestCase):
+    """The request user comes from the cache but a password change still ends other sessions."""
+
+    username = 'till'
+
+    def setUp(self):
+        super().setUp()
+        self.login()
+
+    def test_warm_request_does_not_select_user(self):
+        self.client.get(reverse('sales'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('sales'))
+        self.assertFalse(any('FROM "auth_user"' in sql for sql in _sql(ctx.captured_queries)))
+
+    def test_password_change_logs_out_existing_session(self):
+        self.assertEqual(self.client.get(reverse('sales')).status_code, 200)
+        self.user.set_password('changed')
+        self.user.save()
+        response = self.client.get(reverse('sales'))
+        self.assertEqual(response.status_code, 302)
+
+
+class StockHoldTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+
+    def test_available_is_stock_less_other_carts(self):
+        self.assertEqual(reservations.hold(self.user, 'cart-a', self.pen.pk, 4)['available'], 10)
+        with self.assertRaises(reservations.StockUnavailable):
+            reservations.hold(self.user, 'cart-b', self.pen.pk, 7)
+        self.assertEqual(reservations.hold(self.user, 'cart-b', self.pen.pk, 6)['available'], 6)
+        with self.assertRaises(reservations.StockUnavailable):
+            reservations.hold(self.user, 'cart-a', self.pen.pk, 1, add=True)
+        # Resizing a cart's own hold only counts the others
+        resized = reservations.hold(self.user, 'cart-a', self.pen.pk, 3)
+        self.assertEqual((resized['held'], resized['available']), (3, 4))
+        products = reservations.with_available(self.user, [{'id': self.pen.pk, 'quantity': 10}])
+        self.assertEqual(products[0]['available'], 1)
+
+    def test_checkout_uses_its_own_hold(self):
+        reservations.hold(self.user, 'cart-a', self.pen.pk, 4)
+        reservations.hold(self.user, 'cart-b', self.pen.pk, 6)
+        with self.assertRaises(reservations.StockUnavailable):
+            checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 1}], cart_id='cart-c')
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 4}], cart_id='cart-a')
+        self.pen.refresh_from_db()
+        self.assertEqual(self.pen.quantity, 6)
+        self.assertEqual(list(StockReservation.objects.values_list('cart_id', flat=True)), ['cart-b'])
+
+    def test_expired_holds_are_ignored_then_swept(self):
+        reservations.hold(self.user, 'cart-b', self.pen.pk, 10)
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(reservations.hold(self.user, 'cart-a', self.pen.pk, 3)['available'], 10)
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 7}])
+        out = io.StringIO()
+        call_command('expire_reservations', stdout=out)
+        self.assertIn("Removed 1 expired hold(s).", out.getvalue())
+        self.assertEqual(list(StockReservation.objects.values_list('cart_id', flat=True)), ['cart-a'])
+
+    def test_item_deleted_during_checkout_is_still_sold(self):
+        reservations.hold(self.user, 'cart-a', self.pen.pk, 2)
+
+        def delete_pen(**kwargs):
+            # Lands after the stock UPDATE, as the cart's holds are cleared
+            Item.all_objects.filter(pk=self.pen.pk).update(is_active=False)
+
+        post_delete.connect(delete_pen, sender=StockReservation)
+        self.addCleanup(post_delete.disconnect, delete_pen, sender=StockReservation)
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 2}], cart_id='cart-a')
+        self.assertEqual(SaleRecord.objects.get().unit_cost_at_sale, 20)
+
+
+class RefundTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+        self.book = self.item('Book', selling_price=300, average_cost=200, quantity=5)
+        self.first = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 2}, {'id': self.book.pk, 'qty': 1}])
+        self.second = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 3}])
+        # Saved before order ids existed
+        self.legacy = SaleRecord.objects.create(product=self.pen, quantity=1, total_price=50, user=self.user)
+        Item.objects.filter(pk=self.pen.pk).update(quantity=4)
+        valuation.rebuild(self.user.pk)
+
+    def stock(self):
+        return list(Item.objects.order_by('pk').values_list('quantity', flat=True))
+
+    def test_orders_legacy_rows_and_single_lines_in_one_update(self):
+        line = SaleRecord.objects.get(order_id=self.second)
+        value = valuation.current(self.user.pk)
+        version = caching.get_version(caching.SALES, self.user.pk)
+        with self.captureOnCommitCallbacks() as callbacks, CaptureQueriesContext(connection) as ctx:
+            result = refunds.refund(self.user, order_ids=[self.first, f'LEGACY-{self.legacy.pk}'], sale_ids=[line.pk])
+        self.assertEqual(result, {'lines': 4, 'units': 7})
+        self.assertEqual(sum(sql.startswith('UPDATE "inventory_item"') for sql in _sql(ctx.captured_queries)), 1)
+        self.assertEqual(self.stock(), [10, 5])
+        self.assertFalse(SaleRecord.objects.exists())
+        # Units come back at today's average cost
+        self.assertEqual(valuation.current(self.user.pk), value + 6 * 20 + 200)
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+
+        self.assertEqual(caching.get_version(caching.SALES, self.user.pk), version)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(caching.get_version(caching.SALES, self.user.pk), version)
+
+    def test_nothing_matching_changes_nothing(self):
+        line = SaleRecord.objects.get(order_id=self.second)
+        refunds.refund(self.user, order_ids=[self.second])
+        # Refunded already, or not a legacy row
+        for selection in ({'order_ids': [self.second]}, {'sale_ids': [line.pk]},
+                          {'order_ids': [f'LEGACY-{SaleRecord.objects.filter(order_id=self.first).first().pk}']}):
+            with self.assertRaises(ValueError):
+                refunds.refund(self.user, **selection)
+        with self.assertRaises(ValueError):
+            refunds.refund(self.user, order_ids=['LEGACY-x'])
+        self.assertEqual(self.stock(), [7, 4])
+
+    def test_views_only_refund_on_post(self):
+        self.login()
+        sale = SaleRecord.objects.get(order_id=self.second)
+        delete = reverse('delete_sale', args=[sale.pk])
+        self.assertEqual(self.client.get(delete, secure=True).status_code, 405)
+        self.assertRedirects(self.client.post(delete, secure=True), reverse('sales'), fetch_redirect_response=False)
+        self.assertEqual(self.client.post(delete, secure=True).status_code, 404)
+
+        response = self.client.post(reverse('refund_sales'), {'order_id': [self.first, f'LEGACY-{self.legacy.pk}']},
+                                    secure=True)
+        self.assertRedirects(response, reverse('sales_book'), fetch_redirect_response=False)
+        self.assertEqual(self.stock(), [10, 5])
+        self.assertEqual(self.client.get(reverse('refund_sales'), secure=True).status_code, 405)
+
+
+class StockConcurrencyTests(TransactionTestCase):
+    """
+    Parallel checkouts, purchases and refunds on the same hot items. Runs against whatever
+    database is configured; PostgreSQL exercises the real row locks, SQLite serialises writers.
+    `manage.py stress_stock` runs the same harness at larger sizes and prints the report.
+    """
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest("Needs a file-backed SQLite test database (see DATABASES in settings).")
+        cache.clear()
+
+    def test_no_oversell_under_contention(self):
+        user, items = stress.create_fixture('stress', hot_items=3, stock=15)
+        report = stress.run(user, items, workers=8, operations=25, seed=1)
+
+        self.assertEqual(report['errors'], [])
+        self.assertEqual(report['problems'], [])
+        self.assertEqual(report['deadlocks'], 0)
+        # Stock is scarce on purpose: some checkouts must have been turned away, none oversold
+        self.assertGreater(report['ok']['checkout'], 0)
+        self.assertGreater(report['rejected']['checkout'], 0)
+        self.assertGreater(report['orders_per_sec'], 0)
+
+    def test_average_cost_with_only_purchases(self):
+        user, items = stress.create_fixture('stress-cost', hot_items=1, stock=10, cost=100)
+        report = stress.run(user, items, workers=6, operations=10, seed=2, mix=(('purchase', 1),))
+        self.assertEqual(report['problems'], [])
+        self.assertEqual(report['ok']['purchase'], 60)
+        initial = {items[0].pk: (10, 100)}
+        cost = stress.replay_purchases(user, initial)[items[0].pk]
+        self.assertEqual(Item.objects.get(pk=items[0].pk).average_cost, cost)
+        # A lost or misapplied update shows up as a problem
+        Item.objects.filter(pk=items[0].pk).update(average_cost=cost + 1)
+        self.assertIn(f"Hot 0: average_cost {cost + 1}, replay gives {cost}", stress.verify(user, initial, purchases_only=True))
+
+    def test_racing_refunds_of_one_order_restock_once(self):
+        user, items = stress.create_fixture('stress-refund', hot_items=1, stock=10)
+        order_id = checkout.place_order(user, [{'id': items[0].pk, 'qty': 4}])
+        barrier, results = threading.Barrier(4), []
+
+        def refund():
+            try:
+                barrier.wait()
+                results.append(stress._with_retry(lambda: refunds.refund(user, order_ids=[order_id]), stress._new_stats()))
+            except ValueError:
+                results.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=refund) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(results, key=bool), [None, None, None, {'lines': 1, 'units': 4}])
+        self.assertEqual(stress.verify(user, {items[0].pk: (10, 100)}), [])
+
+
+class PricingPropertyTests(SimpleTestCase):
+    """Randomised (seeded, so reproducible) carts: totals must always reconcile."""
+
+    CASES = 500
+
+    def _random_cart(self, rng):
+        lines = rng.randint(1, 40)
+        prices = [rng.randint(1, 5000) for _ in range(lines)]
+        costs = [rng.randint(0, price) for price in prices]
+        quantities = [rng.randint(1, 50) for _ in range(lines)]
+        promotions = [
+            (rng.randrange(lines), rng.choice([0, 5, 10, 50, 100]), rng.choice([None, 2, 3, 6]), rng.randint(0, 9000))
+            for _ in range(rng.randint(0, 5))
+        ]
+        return prices, costs, quantities, promotions
+
+    def test_allocation_reconciles_and_is_fair(self):
+        rng = random.Random(37)
+        for _ in range(self.CASES):
+            weights = [rng.choice([0, rng.randint(1, 10 ** 6)]) for _ in range(rng.randint(1, 60))]
+            amount = rng.randint(0, sum(weights))
+            shares = pricing.allocate(amount, weights)
+            self.assertEqual(int(shares.sum()), amount if sum(weights) else 0)
+            for share, weight in zip(shares, weights):
+                exact = Fraction(amount * weight, sum(weights) or 1)
+                self.assertLess(abs(share - exact), 1)
+                self.assertLessEqual(share, weight)
+
+    def test_grouped_allocation_matches_allocate(self):
+        rng = random.Random(35)
+        sizes = [rng.randint(1, 8) for _ in range(200)]
+        weights = [rng.choice([0, rng.randint(1, 5000)]) for _ in range(sum(sizes))]
+        groups = [group for group, size in enumerate(sizes) for _ in range(size)]
+        amounts, start = [], 0
+        for size in sizes:
+            amounts.append(rng.randint(0, sum(weights[start:start + size])))
+            start += size
+        shares = pricing.allocate_groups(amounts, weights, groups)
+        start = 0
+        for amount, size in zip(amounts, sizes):
+            self.assertEqual(list(shares[start:start + size]), list(pricing.allocate(amount, weights[start:start + size])))
+            start += size
+
+    def test_cart_totals_reconcile(self):
+        rng = random.Random(2024)
+        for _ in range(self.CASES):
+            prices, costs, quantities, promotions = self._random_cart(rng)
+            gross = sum(p * q for p, q in zip(prices, quantities))
+            flat = rng.randint(0, gross // 4)
+            percent = rng.choice([0, 0, 5, 15])
+            try:
+                result = pricing.price_cart(prices, costs, quantities, flat, percent, promotions)
+            except ValueError:
+                continue
+            totals = result['totals']
+            self.assertEqual(totals['gross'], gross)
+            self.assertEqual(int(result['order_discount'].sum()), totals['order_discount'])
+            self.assertEqual(int((result['promotion'] + result['order_discount']).sum()), totals['discount'])
+            self.assertEqual(totals['revenue'], gross - totals['discount'])
+            self.assertEqual(int(result['net'].sum()), totals['revenue'])
+            self.assertTrue((result['net'] >= 0).all())
+            self.assertTrue((result['promotion'] <= result['total_price']).all())
+            self.assertGreaterEqual(totals['revenue'], totals['cost'])
+
+    def test_margin_floor_rejects_below_cost(self):
+        rng = random.Random(7)
+        for _ in range(self.CASES):
+            prices, costs, quantities, _ = self._random_cart(rng)
+            gross = sum(p * q for p, q in zip(prices, quantities))
+            cost = sum(c * q for c, q in zip(costs, quantities))
+            margin = rng.choice([0, 10, 25])
+            flat = rng.randint(0, gross)
+            floor = cost + cost * margin // 100
+            if gross - flat < floor:
+                with self.assertRaises(ValueError):
+                    pricing.price_cart(prices, costs, quantities, flat, min_margin_pct=margin)
+            else:
+                pricing.price_cart(prices, costs, quantities, flat, min_margin_pct=margin)
+
+    def test_bundle_and_percent_promotions(self):
+        # 7 units at 50 with "3 for 120" and "10% off": bundles save 2 x 30 = 60 > 35
+        result = pricing.price_cart([50], [20], [7], promotions=[(0, 10, None, None), (0, 0, 3, 120)])
+        self.assertEqual(int(result['promotion'][0]), 60)
+        self.assertEqual(result['totals']['revenue'], 290)
+
+    def test_wholesale_cart_prices_in_milliseconds(self):
+        rng = random.Random(1000)
+        prices = [rng.randint(10, 5000) for _ in range(1000)]
+        costs = [price // 2 for price in prices]
+        quantities = [rng.randint(1, 500) for _ in range(1000)]
+        promotions = [(line, 5, 12, prices[line] * 10) for line in range(0, 1000, 3)]
+        started = time.perf_counter()
+        result = pricing.price_cart(prices, costs, quantities, 10000, 10, promotions)
+        elapsed = time.perf_counter() - started
+        self.assertEqual(int(result['order_discount'].sum()), result['totals']['order_discount'])
+        self.assertLess(elapsed, 0.05)
+
+
+@override_settings(THROTTLE_ENABLED=False, REPLICA_STICKY_SECONDS=42)
+class ReplicaRoutingTests(ShopTestCase):
+    """Runs with or without REPLICA_DATABASE_URL; the replica is reported as configured either way."""
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+        self.login()
+        for patcher in (mock.patch.object(routers, 'replica_configured', return_value=True),
+                        mock.patch.object(caching, 'pin_to_primary', wraps=caching.pin_to_primary)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.replica = mock.patch.object(routers, 'read_from_replica', wraps=routers.read_from_replica).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_router_sends_opted_in_reads_to_the_replica(self):
+        router = routers.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Item))
+        with routers.read_from_replica():
+            self.assertEqual(router.db_for_read(Item), 'default')
+            self.assertEqual(router.db_for_write(Item), 'default')
+            routers.replica_alias.assert_called_once_with()
+
+    def test_writes_pin_the_tenant_to_the_primary(self):
+        self.assertContains(self.client.get(reverse('product_list'), secure=True), 'Pen')
+        self.assertEqual(self.replica.call_count, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('sales'), json.dumps({'items': [{'id': self.pen.pk, 'qty': 1}]}),
+                                        content_type='application/json', secure=True)
+        self.assertEqual(response.json()['status'], 'success')
+        caching.pin_to_primary.assert_called_once_with(self.user.pk, 42)
+        self.assertContains(self.client.get(reverse('product_list'), secure=True), '<td>9</td>')
+        self.assertEqual(self.replica.call_count, 1)
+
+        cache.delete(caching._primary_pin_key(self.user.pk))  # REPLICA_STICKY_SECONDS later
+        self.client.get(reverse('product_list'), secure=True)
+        self.assertEqual(self.replica.call_count, 2)
+
+    def test_unsafe_methods_never_read_the_replica(self):
+        url = reverse('sales_report_api')
+        for method in ('post', 'put', 'patch', 'delete'):
+            self.assertEqual(getattr(self.client, method)(url, secure=True).status_code, 200)
+        self.assertEqual(self.replica.call_count, 0)
+        self.assertEqual(caching.pin_to_primary.call_count, 4)
+
+
+@unittest.skipUnless(routers.replica_configured(), "no REPLICA_DATABASE_URL configured")
+class ReplicaReadTests(TransactionTestCase):
+    """
+    Reads through the real replica alias, which mirrors `default` under test: run with e.g.
+    REPLICA_DATABASE_URL=sqlite:////tmp/replica.sqlite3. Rows are committed so its connection sees them.
+    """
+    databases = '__all__'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='shop', password='pass')
+        category = Category.objects.create(name='Pens', user=self.user)
+        self.pen = Item.objects.create(name='Pen', category=category, selling_price=50, average_cost=20,
+                                       quantity=10, user=self.user)
+        self.client.login(username='shop', password='pass')
+
+    def test_dashboards_and_dumps_read_the_replica(self):
+        self.assertEqual(routers.replica_alias(), routers.REPLICA)
+        with routers.read_from_replica():
+            self.assertEqual(Item.objects.get(pk=self.pen.pk).name, 'Pen')
+            self.assertEqual(Item.objects.all().db, routers.REPLICA)
+
+        with CaptureQueriesContext(connections[routers.REPLICA]) as replica_queries:
+            self.assertContains(self.client.get(reverse('product_list'), secure=True), 'Pen')
+        self.assertTrue(any('inventory_item' in sql for sql in _sql(replica_queries)))
+
+        with CaptureQueriesContext(connections[routers.REPLICA]) as replica_queries:
+            dumped = list(exports.rows(Item.all_objects.filter(user=self.user), ['name']))
+        self.assertEqual((dumped, len(replica_queries)), ([['Pen']], 1))
+
+        # A write pins the tenant to the primary, which reads its own rows
+        response = self.client.post(reverse('sales'), json.dumps({'items': [{'id': self.pen.pk, 'qty': 1}]}),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.json()['status'], 'success')
+        with CaptureQueriesContext(connections[routers.REPLICA]) as replica_queries:
+            self.assertContains(self.client.get(reverse('product_list'), secure=True), '<td>9</td>')
+        self.assertEqual(len(replica_queries), 0)
+
+
+class CheckoutPricingTests(ShopTestCase):
+    username = 'pos'
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(quantity=100)
+        self.book = self.item('Book', selling_price=300, average_cost=200, quantity=100)
+        self.login()
+
+    def _checkout(self, **payload):
+        return self.client.post(reverse('sales'), json.dumps(payload), content_type='application/json')
+
+    def test_promotion_and_order_discounts_are_stored_per_line(self):
+        Promotion.objects.create(user=self.user, item=self.pen, bundle_qty=3, bundle_price=120)
+        response = self._checkout(items=[{'id': self.pen.pk, 'qty': 6}, {'id': self.book.pk, 'qty': 1}],
+                                  discount=7, percent_off=10)
+        self.assertEqual(response.status_code, 200)
+        lines = {line.product_id: line for line in SaleRecord.objects.filter(user=self.user)}
+        # Pen: 300 gross, 60 off by bundles; book 300. Order discount 7 + 10% of 540 = 61,
+        # split 240:300 -> 27.1 and 33.9, so the spare unit goes to the book
+        self.assertEqual(sum(line.discount for line in lines.values()), 60 + 61)
+        self.assertEqual(lines[self.pen.pk].total_price, 300)
+        self.assertEqual(lines[self.pen.pk].discount, 60 + 27)
+        self.assertEqual(lines[self.book.pk].discount, 34)
+
+    def test_discount_below_cost_is_rejected(self):
+        response = self._checkout(items=[{'id': self.book.pk, 'qty': 1}], discount=150)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(SaleRecord.objects.exists())
+        self.book.refresh_from_db()
+        self.assertEqual(self.book.quantity, 100)
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class AdminExportTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.items = [self.item('=HYPERLINK("x")'), *(self.item(f'Pen {n}') for n in range(4))]
+        User.objects.create_superuser(username='admin', password='pass')
+        self.client.login(username='admin', password='pass')
+
+    def export(self, action):
+        return self.client.post(reverse('admin:inventory_item_changelist'), {
+            'action': action, '_selected_action': [item.pk for item in self.items],
+        }, secure=True)
+
+    def test_csv_is_streamed_with_escaped_cells(self):
+        response = self.export('export_csv')
+        self.assertIsInstance(response, StreamingHttpResponse)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(lines[0], 'Id,User Username,Category Name,Name,Sku / Barcode,Company,Quantity,Average Cost,'
+                                   'Selling Price,Is Active,Deleted At')
+        self.assertEqual(len(lines), 6)
+        self.assertIn("""'=HYPERLINK(""x"")""", lines[1])
+
+    def test_xlsx_starts_a_new_sheet_at_the_row_limit(self):
+        import openpyxl
+
+        with mock.patch.object(exports, 'XLSX_MAX_ROWS', 2):
+            response = self.export('export_xlsx')
+        workbook = openpyxl.load_workbook(io.BytesIO(b''.join(response.streaming_content)))
+        self.assertEqual(workbook.sheetnames, ['Items', 'Items 2', 'Items 3'])
+        sheets = [list(sheet.values) for sheet in workbook]
+        self.assertEqual([len(rows) for rows in sheets], [3, 3, 2])
+        self.assertTrue(all(rows[0][0] == 'Id' for rows in sheets))
+        self.assertEqual(sheets[0][1][3], "'=HYPERLINK(\"x\")")
+
+
+class ValuationTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+
+    def assertInStep(self):
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+
+    def test_running_total_follows_every_stock_movement(self):
+        self.assertEqual(valuation.current(self.user.pk), 200)
+        Purchase.objects.create(item=self.pen, quantity=5, unit_price=29, user=self.user)
+        self.assertInStep()
+        order_id = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 4}])
+        self.assertInStep()
+        refunds.refund(self.user, order_ids=[order_id])
+        self.assertInStep()
+        book = self.item('Book', selling_price=300, average_cost=200, quantity=3)
+        book.quantity = 1
+        book.save()
+        self.assertInStep()
+        self.category.delete()
+        self.assertEqual(valuation.current(self.user.pk), 0)
+
+    def test_dashboard_does_not_scan_items_for_stock_value(self):
+        self.login()
+        InventoryValuation.objects.filter(user=self.user).update(total_value=123456)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('dashboard'), secure=True)
+        self.assertContains(response, 'PKR 123,456')
+        self.assertEqual(response.context['chart_data']['valuation_values'][-1], 123456)
+        # The only item reads left are the low-stock list and its count
+        item_reads = [sql for sql in _sql(ctx.captured_queries) if 'FROM "inventory_item"' in sql]
+        self.assertTrue(item_reads)
+        self.assertTrue(all('"quantity" < 10' in sql for sql in item_reads), item_reads)
+
+
+class ScanTests(ShopTestCase):
+    username = 'till'
+
+    def setUp(self):
+        super().setUp()
+        scanning.clear()
+        self.pen = self.item(sku='2000000000015', quantity=3)
+        self.login()
+
+    def _scan(self, code, **payload):
+        return self.client.post(reverse('scan_code', args=[code]), json.dumps(payload),
+                                content_type='application/json', secure=True)
+
+    def test_repeat_lookups_skip_the_database_until_the_item_changes(self):
+        self.assertEqual(scanning.lookup(self.user.pk, '2000000000015')['id'], self.pen.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(scanning.lookup(self.user.pk, '2000000000015')['selling_price'], 50)
+        self.pen.selling_price = 60
+        self.pen.save()
+        self.assertEqual(scanning.lookup(self.user.pk, '2000000000015')['selling_price'], 60)
+        self.assertIsNone(scanning.lookup(self.user.pk, 'nope'))
+
+    def test_each_scan_holds_one_more_unit(self):
+        for held in (1, 2, 3):
+            response = self._scan('2000000000015', cart_id='cart-a')
+            self.assertEqual(response.json()['held'], held)
+        self.assertEqual(self._scan('2000000000015', cart_id='cart-a').status_code, 409)
+        self.assertEqual(StockReservation.objects.get(cart_id='cart-a').quantity, 3)
+        self.assertEqual(self._scan('0000', cart_id='cart-a').status_code, 404)
+
+
+class SoftDeleteTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(sku='111')
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 2}])
+        self.login()
+
+    def test_delete_hides_item_but_keeps_history(self):
+        delete = reverse('delete_item', args=[self.pen.pk])
+        self.assertEqual(self.client.get(delete, secure=True).status_code, 405)
+        self.assertTrue(Item.objects.filter(pk=self.pen.pk).exists())
+        self.assertRedirects(self.client.post(delete, secure=True), reverse('product_list'), fetch_redirect_response=False)
+        self.assertFalse(Item.objects.filter(pk=self.pen.pk).exists())
+        self.assertEqual(SaleRecord.objects.get().product.name, 'Pen')
+        self.assertEqual(valuation.current(self.user.pk), 0)
+        # The code is free again for a replacement product
+        self.item('New Pen', sku='111')
+
+    def test_anonymous_delete_goes_to_login(self):
+        self.client.logout()
+        response = self.client.post(reverse('delete_item', args=[self.pen.pk]), secure=True)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Item.objects.filter(pk=self.pen.pk).exists())
+
+    def test_purge_removes_item_and_history_in_batches(self):
+        self.pen.soft_delete()
+        call_command('purge_items', days=0, rows_per_batch=1, stdout=io.StringIO())
+        self.assertFalse(Item.all_objects.filter(pk=self.pen.pk).exists())
+        self.assertFalse(SaleRecord.objects.exists())
+
+
+class EventFeedTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+        self.login()
+
+    def test_stock_movements_append_deltas(self):
+        Purchase.objects.create(item=self.pen, quantity=10, unit_price=30, user=self.user)
+        order_id = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 4}])
+        refunds.refund(self.user, order_ids=[order_id])
+        purchase, sale, refund = ChangeEvent.objects.order_by('id')
+        self.assertEqual((purchase.kind, purchase.payload['stock'], purchase.payload['value_delta']),
+                         (ChangeEvent.PURCHASE, 20, 300))
+        line = sale.payload['lines'][0]
+        self.assertEqual((line['qty'], line['stock'], line['revenue'], line['cost']), (4, 16, 200, 100))
+        self.assertEqual(sale.payload['value_delta'], -100)
+        line = refund.payload['lines'][0]
+        self.assertEqual((line['qty'], line['stock'], line['revenue']), (-4, 20, -200))
+        self.assertEqual(valuation.current(self.user.pk), 500)
+
+    def test_stream_resumes_after_last_event_id(self):
+        first = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 1}])
+        seen = events.latest_id(self.user.pk)
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 2}])
+        response = self.client.get(reverse('event_stream'), HTTP_LAST_EVENT_ID=str(seen), secure=True)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('event: sale'), 1)
+        self.assertNotIn(f'"order_id": "{first}"', body)
+        self.assertIn(f"id: {seen + 1}", body)
+        # Other tenants' events never show up
+        other = User.objects.create_user(username='other', password='pass')
+        self.assertEqual(events.pending(other.pk, 0), [])
+
+    def test_prune_drops_old_events(self):
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 1}])
+        call_command('prune_events', days=0, stdout=io.StringIO())
+        self.assertFalse(ChangeEvent.objects.exists())
+
+
+class ForecastTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(quantity=12)
+        self.book = self.item('Book', selling_price=300, average_cost=200, quantity=5)
+
+    def test_smoothing_matches_the_recursion(self):
+        matrix = np.array([[3., 0., 5., 2., 4.], [1., 1., 1., 1., 1.]])
+        level = matrix[:, 0].copy()
+        for day in range(1, matrix.shape[1]):
+            level = 0.3 * matrix[:, day] + 0.7 * level
+        np.testing.assert_allclose(forecast.exponential_smoothing(matrix, alpha=0.3), level)
+
+    def test_reorder_plan(self):
+        days_left, point, qty = forecast.reorder_plan(
+            np.array([2.0, 0.0]), np.array([0.0, 0.0]), np.array([10.0, 4.0]), lead_days=7, cover_days=14)
+        self.assertEqual(days_left[0], 5.0)
+        self.assertTrue(np.isnan(days_left[1]))
+        self.assertEqual(list(point), [14, 0])
+        self.assertEqual(list(qty), [32, 0])  # 2/day for 21 days, less the 10 on hand
+
+    def test_command_writes_forecasts_the_dashboard_reads(self):
+        today = periods.local_today(periods.zone(self.user.profile.timezone))  # the tenant's day, as the command uses
+        for days_ago in range(1, 15):
+            sale = SaleRecord.objects.create(product=self.pen, quantity=2, total_price=100, user=self.user)
+            SaleRecord.objects.filter(pk=sale.pk).update(date_sold=timezone.now() - timedelta(days=days_ago))
+        call_command('forecast_demand', workers=1, stdout=io.StringIO())
+        pen = ItemForecast.objects.get(item=self.pen)
+        self.assertEqual((pen.moving_average, pen.computed_for), (2.0, today))
+        self.assertGreater(pen.reorder_qty, 0)
+        self.assertIsNone(ItemForecast.objects.get(item=self.book).days_left)
+
+        self.login()
+        response = self.client.get(reverse('dashboard'), secure=True)
+        self.assertEqual([f.item for f in response.context['reorder_items']], [self.pen])
+
+        self.book.soft_delete()
+        call_command('forecast_demand', workers=1, stdout=io.StringIO())
+        self.assertFalse(ItemForecast.objects.filter(item=self.book).exists())
+
+
+class TenantPoolTests(SimpleTestCase):
+
+    def test_failures_are_reported_per_tenant(self):
+        for pool_size in (1, 2):
+            results = sorted(workers.run_per_tenant(pow, [(2,), (0,), (3,)], pool_size, exp=-1), key=lambda r: r[0])
+            self.assertEqual([(user_id, result) for user_id, result, _ in results], [(0, None), (2, 0.5), (3, 1 / 3)])
+            self.assertIsInstance(results[0][2], ZeroDivisionError)
+
+
+class RepricingTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pens = self.category
+        books = Category.objects.create(name='Books', user=self.user)
+        self.gel = self.item('Gel Pen', average_cost=40)  # 20% margin
+        self.ink = self.item('Ink Pen', selling_price=100, average_cost=50, quantity=4)  # 50% margin
+        self.book = Item.objects.create(name='Book', category=books, selling_price=300, average_cost=200,
+                                        quantity=2, user=self.user)
+
+    def _prices(self):
+        return list(Item.objects.order_by('pk').values_list('selling_price', flat=True))
+
+    def test_preview_and_apply_in_one_update(self):
+        filters = {'category': self.pens.pk, 'max_margin': 30}
+        preview = repricing.preview(self.user, 'selling_price', 'percent', Decimal('10'), filters)
+        self.assertEqual((preview['items'], preview['before'], preview['after']), (1, 50, 55))
+        self.assertEqual(self._prices(), [50, 100, 300])
+
+        version = caching.get_version(caching.CATALOG, self.user.pk)
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as ctx:
+            batch = repricing.apply(self.user, 'selling_price', 'percent', Decimal('10'), filters)
+        self.assertEqual(sum(sql.startswith('UPDATE "inventory_item"') for sql in _sql(ctx.captured_queries)), 1)
+        self.assertEqual(self._prices(), [55, 100, 300])
+        self.assertEqual(batch.item_count, 1)
+        self.assertNotEqual(caching.get_version(caching.CATALOG, self.user.pk), version)
+
+    def test_cost_change_keeps_valuation_and_undo_skips_later_edits(self):
+        batch = repricing.apply(self.user, 'average_cost', 'amount', Decimal('-30'), {})
+        self.assertEqual(list(Item.objects.order_by('pk').values_list('average_cost', flat=True)), [10, 20, 170])
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+
+        book = Item.objects.get(pk=self.book.pk)
+        book.average_cost = 180
+        book.save()
+        self.assertEqual(repricing.undo(self.user, batch.pk), {'reverted': 2, 'skipped': 1})
+        self.assertEqual(list(Item.objects.order_by('pk').values_list('average_cost', flat=True)), [40, 50, 180])
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+        with self.assertRaises(ValueError):
+            repricing.undo(self.user, batch.pk)
+
+    def test_api_preview_writes_nothing(self):
+        self.login()
+        payload = {'field': 'selling_price', 'mode': 'amount', 'amount': '-60', 'preview': True}
+        response = self.client.post(reverse('reprice_api'), json.dumps(payload),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.json()['preview']['flagged'], 2)  # 50 -> 0 and 100 -> 40 fall under cost
+        self.assertFalse(PriceChangeBatch.objects.exists())
+        payload['amount'] = '2.5'
+        response = self.client.post(reverse('reprice_api'), json.dumps(payload),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(THROTTLE_RATE=0.5, THROTTLE_BURST=10, THROTTLE_EXPORT_CONCURRENCY=1)
+class ThrottleTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.filter(pk=self.user.pk).update(is_staff=True)
+        self.pen = self.item(quantity=100)
+        self.login()
+
+    def test_expensive_pages_run_out_but_the_till_does_not(self):
+        dashboard = reverse('dashboard')
+        self.assertEqual(self.client.get(dashboard, secure=True).status_code, 200)
+        self.assertEqual(self.client.get(dashboard, secure=True).status_code, 200)
+        refused = self.client.get(dashboard, secure=True)
+        self.assertEqual(refused.status_code, 429)
+        self.assertGreater(int(refused['Retry-After']), 0)
+        # Checkout and holds cost nothing
+        for _ in range(3):
+            response = self.client.post(reverse('sales'), json.dumps({'items': [{'id': self.pen.pk, 'qty': 1}]}),
+                                        content_type='application/json', secure=True)
+            self.assertEqual(response.json()['status'], 'success')
+        # Other tenants have their own bucket
+        User.objects.create_user(username='other', password='pass')
+        self.client.login(username='other', password='pass')
+        self.assertEqual(self.client.get(dashboard, secure=True).status_code, 200)
+
+        self.login()
+        metrics = self.client.get(reverse('throttle_metrics'), {'user': self.user.pk}, secure=True).json()
+        self.assertEqual(metrics['throttled']['expensive.rate'], 1)
+        self.assertEqual(metrics['tenants'], {str(self.user.pk): 1})
+
+    def test_one_export_at_a_time(self):
+        self.assertTrue(throttling.acquire_slot(self.user.pk))  # an export still streaming elsewhere
+        response = self.client.get(reverse('export_daily'), secure=True)
+        self.assertEqual((response.status_code, response['Retry-After']), (429, '5'))
+        throttling.release_slot(self.user.pk)
+        self.assertEqual(self.client.get(reverse('export_daily'), secure=True).status_code, 200)
+        # Given back once the response is built; a streamed body keeps it until fully sent
+        body = throttling.release_after(iter([b'a', b'b']), self.user.pk)
+        self.assertTrue(throttling.acquire_slot(self.user.pk))
+        self.assertFalse(throttling.acquire_slot(self.user.pk))
+        b''.join(body)
+        self.assertTrue(throttling.acquire_slot(self.user.pk))
+
+
+class CostAuditTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item(average_cost=0, quantity=0)
+        Purchase.objects.create(item=self.pen, quantity=3, unit_price=10, user=self.user)
+        Purchase.objects.create(item=self.pen, quantity=3, unit_price=11, user=self.user)
+        Purchase.objects.create(item=self.pen, quantity=6, unit_price=10, user=self.user)
+        # A legacy line recorded without its cost
+        self.sale = SaleRecord.objects.create(product=self.pen, quantity=2, total_price=100, user=self.user)
+        Item.objects.filter(pk=self.pen.pk).update(quantity=10)
+
+    def test_purchase_rounds_half_up(self):
+        costs = ChangeEvent.objects.filter(kind=ChangeEvent.PURCHASE).order_by('pk').values_list('payload__average_cost', flat=True)
+        # 10, then 63 / 6 = 10.5
+        self.assertEqual(list(costs)[:2], [10, 11])
+
+    def test_replay_finds_and_fixes_rounding_drift(self):
+        self.pen.refresh_from_db()
+        # 10.5 rounds up to 11, then (66 + 60) / 12 = 10.5 again, where exactly it is 10.25
+        self.assertEqual(self.pen.average_cost, 11)
+        result = costing.audit_tenant(self.user.pk)
+        self.assertEqual(result['drifted'], [(self.pen.pk, 11, 10, 10.25)])
+        self.assertEqual((result['unpriced'], result['fixed']), (1, 0))
+
+        out = io.StringIO()
+        call_command('audit_costs', workers=1, fix=True, stdout=out)
+        self.assertIn("1 item(s) drifted and were fixed", out.getvalue())
+        self.pen.refresh_from_db()
+        self.sale.refresh_from_db()
+        self.assertEqual((self.pen.average_cost, self.sale.unit_cost_at_sale), (10, 10))
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+        self.assertEqual(costing.audit_tenant(self.user.pk)['drifted'], [])
+
+    def test_opening_cost(self):
+        at = timezone.now()
+        sale = (self.pen.pk, at, costing.SALE, 1, 2, 7)
+        purchase = (self.pen.pk, at + timedelta(days=1), costing.PURCHASE, 1, 2, 10)
+        # Opening stock of 2 valued by the first sale's recorded cost, then 2 more bought at 10
+        self.assertEqual(costing.replay(4, 0, [sale, purchase])[0], Fraction(17, 2))
+        # Opening stock with nothing showing what it cost
+        self.assertEqual(costing.replay(2, 0, [purchase])[0], None)
+        # Never bought: the stored cost stands
+        self.assertEqual(costing.replay(2, 9, [sale])[0], 7)
+
+
+class GenerateTenantTests(ShopTestCase):
+
+    def _generate(self, prefix):
+        call_command('generate_tenant', prefix=prefix, seed=3, items=25, categories=3, years=0.5,
+                     orders_per_day=8, stdout=io.StringIO())
+        return User.objects.get(username=f"{prefix}-3-0")
+
+    def _history(self, user):
+        sales = SaleRecord.objects.filter(user=user).order_by('date_sold', 'pk').values_list(
+            'order_id', 'product__name', 'quantity', 'total_price', 'discount', 'unit_cost_at_sale', 'date_sold')
+        purchases = Purchase.objects.filter(user=user).order_by('timestamp', 'pk').values_list(
+            'item__name', 'quantity', 'unit_price', 'timestamp')
+        return list(sales), list(purchases)
+
+    def test_same_seed_same_history(self):
+        first, second = self._history(self._generate('a')), self._history(self._generate('b'))
+        self.assertGreater(len(first[0]), 500)
+        self.assertEqual(first, second)
+
+    def test_history_is_consistent(self):
+        user = self._generate('load')
+        orders = {}
+        for order_id, total, discount, cost, quantity in SaleRecord.objects.filter(user=user).values_list(
+                'order_id', 'total_price', 'discount', 'unit_cost_at_sale', 'quantity'):
+            orders.setdefault(order_id or object(), []).append((total, discount, cost * quantity))
+        discounted = 0
+        for lines in orders.values():
+            order_total, order_discount = sum(line[0] for line in lines), sum(line[1] for line in lines)
+            discounted += order_discount > 0
+            # Each line's share is the pro rata one rounded up or down, and no order is sold below cost
+            for total, discount, _ in lines:
+                self.assertLess(abs(discount * order_total - order_discount * total), order_total)
+            self.assertGreaterEqual(order_total - order_discount, sum(line[2] for line in lines))
+        self.assertGreater(discounted, 0)
+        self.assertTrue(SaleRecord.objects.filter(user=user, order_id__isnull=True).exists())
+
+        # Every item sold was bought first, and stock adds up
+        bought = {row['item_id']: row for row in Purchase.objects.filter(user=user).values('item_id')
+                  .annotate(n=Sum('quantity'), first=Min('timestamp'))}
+        sold = {row['product_id']: row for row in SaleRecord.objects.filter(user=user).values('product_id')
+                .annotate(n=Sum('quantity'), first=Min('date_sold'))}
+        for item in Item.objects.filter(user=user):
+            purchases, sales = bought.get(item.pk, {'n': 0}), sold.get(item.pk, {'n': 0})
+            if sales['n']:
+                self.assertLess(purchases['first'], sales['first'])
+            self.assertGreaterEqual(item.quantity, 0)
+            self.assertEqual(item.quantity, purchases['n'] - sales['n'])
+
+        result = costing.audit_tenant(user.pk)
+        self.assertEqual((result['drifted'], result['unknown'], result['unpriced']), ([], 0, 0))
+        self.assertEqual(valuation.current(user.pk), valuation.scan(user.pk))
+
+
+@override_settings(THROTTLE_ENABLED=False)
+class ReceiptTests(ShopTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.user.profile.business_name = 'Corner Stationers'
+        self.user.profile.save()
+        self.pen = self.item('Gel Pen', quantity=100)
+        self.book = self.item('Register', selling_price=300, average_cost=200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order_id = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 2}, {'id': self.book.pk, 'qty': 1}])
+        self.login()
+
+    def test_rendered_at_checkout_and_invalidated_by_refund(self):
+        with self.assertNumQueries(0):
+            text = receipts.receipt(self.user, self.order_id, receipts.TEXT)
+        self.assertIn("Corner Stationers", text)
+        self.assertIn("PKR 400", text)
+        self.assertTrue(all(len(line) <= receipts.width() for line in text.splitlines()))
+
+        sale = SaleRecord.objects.get(order_id=self.order_id, product=self.book)
+        with self.captureOnCommitCallbacks(execute=True):
+            refunds.refund(self.user, sale_ids=[sale.pk])
+        text = receipts.receipt(self.user, self.order_id, receipts.TEXT)
+        self.assertNotIn("Register", text)
+        self.assertIn("PKR 100", text)
+
+        response = self.client.get(reverse('receipt', args=[self.order_id]), secure=True)
+        self.assertContains(response, 'Gel Pen')
+        self.assertContains(response, '</html>')
+        self.assertEqual(self.client.get(reverse('receipt', args=['ORD-NOPE']), secure=True).status_code, 404)
+
+    def test_day_streams_every_receipt(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            second = checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 1}])
+        response = self.client.get(reverse('receipts_day'), {'format': 'text'}, secure=True)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count(receipts.TEXT_SEPARATOR), 2)
+        self.assertLess(body.index(self.order_id), body.index(second))
+
+        response = self.client.get(reverse('receipts_day'), secure=True)
+        body = b''.join(response.streaming_content).decode()
+        self.assertEqual(body.count('class="receipt"'), 2)
+        self.assertTrue(body.rstrip().endswith('</html>'))
+        response = self.client.get(reverse('receipts_day'), {'date': '2020-01-01', 'format': 'pdf'}, secure=True)
+        self.assertEqual(response.status_code, 200 if receipts.pdf_available() else 404)
+        self.assertEqual(self.client.get(reverse('receipts_day'), {'date': 'today'}, secure=True).status_code, 400)
+
+
+class ShardTests(ShopTestCase):
+    """The moves need a shard: run with e.g. SHARD_DATABASE_URLS="shard1=sqlite:////tmp/shard1.sqlite3"."""
+
+    def setUp(self):
+        super().setUp()
+        self.pen = self.item()
+        Purchase.objects.create(item=self.pen, quantity=5, unit_price=29, user=self.user)
+        checkout.place_order(self.user, [{'id': self.pen.pk, 'qty': 3}])
+        self.login()
+
+    def test_moving_tenant_gets_503(self):
+        TenantShard.objects.create(user=self.user, moving=True)
+        response = self.client.get(reverse('product_list'), secure=True)
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '30'))
+        with self.assertRaises(CommandError):
+            call_command('move_tenant', 'shop', 'nowhere', stdout=io.StringIO())
+
+    @unittest.skipUnless(len(routers.shard_aliases()) > 1, "no SHARD_DATABASE_URLS configured")
+    def test_move_and_back(self):
+        shard = routers.shard_aliases()[1]
+        sold_at = SaleRecord.objects.get(user=self.user).date_sold
+        call_command('move_tenant', 'shop', shard, settle=0, batch_size=1, stdout=io.StringIO())
+
+        self.assertEqual(routers.shard_for(self.user.pk), shard)
+        self.assertFalse(Item.all_objects.using('default').filter(user=self.user).exists())
+        # Events name the source's item ids; they are dropped, not copied
+        self.assertFalse(ChangeEvent.objects.using('default').filter(user=self.user).exists())
+        self.assertFalse(ChangeEvent.objects.using(shard).filter(user=self.user).exists())
+        sale = SaleRecord.objects.using(shard).select_related('product').get(user=self.user)
+        self.assertEqual((sale.product.name, sale.quantity, sale.date_sold), ('Pen', 3, sold_at))
+        self.assertEqual(Purchase.objects.using(shard).get(user=self.user).item_id, sale.product_id)
+
+        # Requests follow the tenant; running totals moved with it
+        pen = Item.objects.using(shard).get(user=self.user)
+        self.assertContains(self.client.get(reverse('product_list'), secure=True), 'Pen')
+        response = self.client.post(reverse('sales'), json.dumps({'items': [{'id': pen.pk, 'qty': 2}]}),
+                                    content_type='application/json', secure=True)
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(SaleRecord.objects.using(shard).filter(user=self.user).count(), 2)
+        self.assertEqual(valuation.current(self.user.pk), valuation.scan(self.user.pk))
+        self.assertEqual(valuation.current(self.user.pk), 10 * 23)  # (10 * 20 + 5 * 29) / 15 average cost
+
+        call_command('move_tenant', 'shop', 'default', settle=0, stdout=io.StringIO())
+        self.assertEqual(Item.all_objects.using('default').get(user=self.user).quantity, 10)
+        self.assertFalse(SaleRecord.objects.using(shard).filter(user=self.user).exists())
+        self.assertFalse(ChangeEvent.objects.using(shard).filter(user=self.user).exists())
+
+    @unittest.skipUnless(len(routers.shard_aliases()) > 1, "no SHARD_DATABASE_URLS configured")
+    def test_move_into_a_shard_that_has_rows(self):
+        shard = routers.shard_aliases()[1]
+        other = User.objects.create_user(username='other')
+        category = Category.objects.create(name='Books', user=other)
+        book = Item.objects.create(name='Book', category=category, selling_price=300, average_cost=200,
+                                   quantity=10, user=other)
+        Purchase.objects.create(item=book, quantity=2, unit_price=200, user=other)
+        checkout.place_order(other, [{'id': book.pk, 'qty': 1}])
+        call_command('move_tenant', 'shop', shard, settle=0, stdout=io.StringIO())
+        # The shop's next sale on the shard takes the id that the other tenant's sale has in `default`
+        pen = Item.objects.using(shard).get(user=self.user)
+        checkout.place_order(self.user, [{'id': pen.pk, 'qty': 1}])
+
+        call_command('move_tenant', 'other', shard, settle=0, stdout=io.StringIO())
+        sales = SaleRecord.objects.using(shard).select_related('product')
+        self.assertEqual(sorted((sale.user_id, sale.product.name) for sale in sales),
+                         [(self.user.pk, 'Pen'), (self.user.pk, 'Pen'), (other.pk, 'Book')])
+        self.assertEqual(Purchase.objects.using(shard).get(user=other).item.name, 'Book')
+        self.assertEqual(Item.objects.using(shard).get(user=other).quantity, 11)
@@ -0,0 +1,144 @@
+import math
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+# Per-tenant token buckets, so one shop refreshing reports or pulling exports cannot tie up
+# every worker. Each request spends its class's cost from the tenant's bucket, which refills
+# at THROTTLE_RATE tokens a second up to THROTTLE_BURST. The till (checkout, holds, scans)
+# costs nothing and is never refused. Exports also hold one of THROTTLE_EXPORT_CONCURRENCY
+# slots per tenant until their response has been sent.
+#
+# Buckets live in the default cache. With LocMemCache every worker process keeps its own, so
+# the limit applies per worker; a shared backend (Redis, Memcached) makes it per tenant. The
+# read-modify-write is not atomic, so racing requests can overdraw a bucket by a little.
+
+CRITICAL = 'critical'
+STANDARD = 'standard'
+EXPENSIVE = 'expensive'
+EXPORT = 'export'
+
+COSTS = {
+    CRITICAL: 0,
+    STANDARD: 1,
+    EXPENSIVE: 5,
+    EXPORT: 10,
+}
+
+# URL names by class; anything not listed is STANDARD
+CLASSES = {
+    'sales': CRITICAL,
+    'sale_alias': CRITICAL,
+    'stock_hold': CRITICAL,
+    'release_holds': CRITICAL,
+    'scan_code': CRITICAL,
+    'event_stream': CRITICAL,
+    'throttle_metrics': CRITICAL,
+    'receipt': CRITICAL,
+    'dashboard': EXPENSIVE,
+    'analytics': EXPENSIVE,
+    'analytics_api': EXPENSIVE,
+    'sales_report_api': EXPENSIVE,
+    'sales_book': EXPENSIVE,
+    'reprice_api': EXPENSIVE,
+    'export_daily': EXPORT,
+    'export_monthly': EXPORT,
+    'export_csv': EXPORT,
+    'receipts_day': EXPORT,
+}
+
+# Upper bound on how long a crashed worker's export slot can stay taken
+SLOT_TIMEOUT = 600
+METRICS_TIMEOUT = None  # counters are kept until the cache evicts them
+RATE_LIMITED = 'rate'
+CONCURRENCY = 'concurrency'
+
+
+def enabled():
+    return getattr(settings, 'THROTTLE_ENABLED', True)
+
+
+def cost_class(url_name):
+    return CLASSES.get(url_name, STANDARD)
+
+
+def _bucket_key(user_id):
+    return f"throttle:bucket:{user_id}"
+
+
+def _slots_key(user_id):
+    return f"throttle:exports:{user_id}"
+
+
+def take(user_id, cost):
+    """Spends `cost` tokens. Returns 0 if allowed, else seconds until the bucket holds enough."""
+    rate = getattr(settings, 'THROTTLE_RATE', 1.0)
+    burst = getattr(settings, 'THROTTLE_BURST', 30)
+    now = time.time()
+    tokens, updated_at = cache.get(_bucket_key(user_id)) or (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens < cost:
+        cache.set(_bucket_key(user_id), (tokens, now), math.ceil(burst / rate))
+        return math.ceil((cost - tokens) / rate)
+    cache.set(_bucket_key(user_id), (tokens - cost, now), math.ceil(burst / rate))
+    return 0
+
+
+def acquire_slot(user_id):
+    """Takes one of the tenant's export slots; False when all are in use."""
+    key = _slots_key(user_id)
+    cache.add(key, 0, SLOT_TIMEOUT)
+    try:
+        taken = cache.incr(key)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(key, 1, SLOT_TIMEOUT)
+        taken = 1
+    if taken > getattr(settings, 'THROTTLE_EXPORT_CONCURRENCY', 1):
+        release_slot(user_id)
+        return False
+    return True
+
+
+def release_slot(user_id):
+    try:
+        cache.decr(_slots_key(user_id))
+    except ValueError:
+        pass
+
+
+def release_after(chunks, user_id):
+    """Wraps a streaming body so the export slot is given back once it has been sent (or abandoned)."""
+    try:
+        yield from chunks
+    finally:
+        release_slot(user_id)
+
+
+# --- Metrics ---
+
+def _count(key):
+    cache.add(key, 0, METRICS_TIMEOUT)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, METRICS_TIMEOUT)
+
+
+def record(user_id, klass, reason):
+    _count(f"throttle:metrics:{klass}:{reason}")
+    _count(f"throttle:metrics:tenant:{user_id}")
+
+
+def metrics(user_ids=()):
+    """Refusal counts by class and reason (since the cache last lost them), plus the given tenants'."""
+    keys = {
+        f"throttle:metrics:{klass}:{reason}": (klass, reason)
+        for klass in COSTS for reason in (RATE_LIMITED, CONCURRENCY)
+    }
+    counts = cache.get_many(list(keys))
+    tenants = cache.get_many([f"throttle:metrics:tenant:{user_id}" for user_id in user_ids])
+    return {
+        'throttled': {f"{klass}.{reason}": counts.get(key, 0) for key, (klass, reason) in keys.items()},
+        'tenants': {key.rsplit(':', 1)[1]: count for key, count in tenants.items()},
+    }
@@ -3,7 +3,9 @@ from .views import (
     CustomLoginView, HomeView, ProductListView, AddProductView, 
     SaleView, export_daily_sales, export_monthly_sales, 
     AddCategoryView, delete_sale, delete_item, AddPurchaseView, SignUpView,
-    SalesBookView, ProfileView
+    SalesBookView, ProfileView, AnalyticsView, analytics_api, sales_report_api,
+    stock_hold, release_holds, refund_sales, scan_code, event_stream,
+    RepriceView, reprice_api, undo_reprice, throttle_metrics, print_receipt, print_day_receipts
 )
 from django.contrib.auth.views import LogoutView
 
@@ -23,6 +25,9 @@ urlpatterns = [
     path('products/new/', AddProductView.as_view(), name='add_product'),
     path('products/delete/<int:pk>/', delete_item, name='delete_item'),
     path('products/add-category/', AddCategoryView.as_view(), name='add_category'),
+    path('products/reprice/', RepriceView.as_view(), name='reprice'),
+    path('products/reprice/<int:pk>/undo/', undo_reprice, name='undo_reprice'),
+    path('api/reprice/', reprice_api, name='reprice_api'),
     
     path('purchase/add/', AddPurchaseView.as_view(), name='add_purchase'),
     
@@ -31,8 +36,21 @@ urlpatterns = [
     path('sales/book/', SalesBookView.as_view(), name='sales_book'),
     path('sale/', SaleView.as_view(), name='sale_alias'),
     path('sales/delete/<int:pk>/', delete_sale, name='delete_sale'),
+    path('sales/refund/', refund_sales, name='refund_sales'),
+    path('sales/receipts/', print_day_receipts, name='receipts_day'),
+    path('sales/receipts/<str:key>/', print_receipt, name='receipt'),
+    path('api/holds/', stock_hold, name='stock_hold'),
+    path('api/holds/release/', release_holds, name='release_holds'),
+    path('api/scan/<str:code>/', scan_code, name='scan_code'),
+    path('events/', event_stream, name='event_stream'),
     
     path('export/daily/', export_daily_sales, name='export_daily'),
     path('export/monthly/', export_monthly_sales, name='export_monthly'),
     path('export/', export_daily_sales, name='export_csv'),
+
+    # --- Reports ---
+    path('reports/analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('api/analytics/', analytics_api, name='analytics_api'),
+    path('api/reports/sales/', sales_report_api, name='sales_report_api'),
+    path('api/metrics/throttle/', throttle_metrics, name='throttle_metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,60 @@
+from datetime import timedelta
+
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from . import models
+from .routers import per_tenant, tenant_atomic
+
+# Each tenant's stock value (sum of quantity x average_cost) is kept as a running total
+# in InventoryValuation, so the dashboard never sums the whole catalog.
+# Every write that changes stock or cost moves the total in the same transaction:
+# - Item.save() / delete(): through the receivers in models.py (covers Purchase too)
+# - checkout and refunds, which move stock with update(): they call adjust() themselves
+# Anything else that bypasses save() (bulk_create, raw SQL) must call rebuild().
+
+
+@per_tenant
+def adjust(user_id, delta):
+    if delta:
+        models.InventoryValuation.objects.filter(user_id=user_id).update(
+            total_value=F('total_value') + delta, updated_at=timezone.now(),
+        )
+
+
+@per_tenant
+def scan(user_id):
+    """Full recount from the items table."""
+    total = models.Item.objects.filter(user_id=user_id).aggregate(
+        total=Sum(F('quantity') * F('average_cost'))
+    )['total']
+    return total or 0
+
+
+def rebuild(user_id):
+    """Resets the running total from a full scan; returns the new total."""
+    with tenant_atomic(user_id):
+        # Row lock first: writers that commit after our scan then wait and add their delta on top
+        row, _ = models.InventoryValuation.objects.select_for_update().get_or_create(user_id=user_id)
+        row.total_value = scan(user_id)
+        row.save(update_fields=['total_value', 'updated_at'])
+    return row.total_value
+
+
+@per_tenant
+def current(user_id):
+    total = models.InventoryValuation.objects.filter(user_id=user_id).values_list('total_value', flat=True).first()
+    if total is None:
+        return rebuild(user_id)
+    return total
+
+
+@per_tenant
+def history(user_id, today, days=90):
+    """[(date, total_value), ...] for the last `days` days, oldest first, ending with today's live total."""
+    points = dict(
+        models.ValuationSnapshot.objects.filter(user_id=user_id, date__gt=today - timedelta(days=days), date__lt=today)
+        .order_by('date').values_list('date', 'total_value')
+    )
+    points[today] = current(user_id)
+    return list(points.items())
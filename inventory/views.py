@@ -1,25 +1,29 @@
 import json
-import csv
-import uuid
-import openpyxl
 from collections import defaultdict
-from openpyxl.styles import Font
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.generic import ListView, CreateView, TemplateView, View
 from django.contrib.auth.views import LoginView
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.contrib.auth.decorators import login_required
+from django.views.decorators.http import require_POST, require_http_methods
 from django.contrib.auth.forms import AuthenticationForm
-from .models import Item, Purchase, Category, SaleRecord, Profile
-from .forms import SignUpForm, ItemForm, PurchaseForm, CategoryForm, UserProfileForm
+from .models import Item, Purchase, Category, SaleRecord, Promotion, ItemForecast, PriceChangeBatch
+from .forms import SignUpForm, ItemForm, PurchaseForm, CategoryForm, UserProfileForm, RepriceForm
+from . import exports, reports, periods, caching, receipts, reservations, refunds, valuation, scanning, events, repricing, throttling
 from django.urls import reverse_lazy
 from django.db.models import Sum, F, Count, Max, Q
-from django.utils import timezone
-from datetime import timedelta
-from django.http import HttpResponse, JsonResponse
-from django.db import transaction
+from datetime import datetime, timedelta
+from django.http import Http404, HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.http import url_has_allowed_host_and_scheme
 from django.contrib import messages
 from django.contrib.auth import login
-from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.decorators import method_decorator
+from django.utils.functional import SimpleLazyObject
+from .routers import replica_reads
+
+# `analytics` and `checkout` (numpy) are imported inside the views that use them, and openpyxl
+# only inside the xlsx export, so a worker boots without them.
 
 class CustomLoginView(LoginView):
     template_name = 'inventory/login.html'
@@ -55,54 +59,66 @@ class SignUpView(CreateView):
             'active_panel': 'signup'
         })
 
+@method_decorator(replica_reads, name='dispatch')
 class HomeView(LoginRequiredMixin, TemplateView):
     template_name = 'inventory/home.html'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         user = self.request.user
-        today = timezone.now().date()
+        tz = self.request.tenant_tz
+        today = periods.local_today(tz)
         
         all_items = Item.objects.filter(user=user)
         low_stock_items = all_items.filter(quantity__lt=10)
         low_stock_count = low_stock_items.count()
-        total_inventory_value = sum(item.total_value for item in all_items)
+        # Nightly demand forecast (manage.py forecast_demand): soonest to run out first
+        reorder_items = (
+            ItemForecast.objects.filter(user=user, reorder_qty__gt=0, item__is_active=True)
+            .select_related('item').order_by(F('days_left').asc(nulls_last=True))[:8]
+        )
+        # Running total kept up to date by every stock movement, plus the daily snapshots
+        value_history = valuation.history(user.pk, today)
+        total_inventory_value = value_history[-1][1]
 
-        todays_sales_query = SaleRecord.objects.filter(user=user, date_sold__date=today)
+        # All boundaries are local-time half-open ranges so filters can use the (user, date_sold) index
+        day_start, day_end = periods.day_range(today, tz)
+        month_start, month_end = periods.month_range(today, tz)
+        prev_month_start, prev_month_end = periods.previous_month_range(today, tz)
+        last_day_prev_month = month_start.date() - timedelta(days=1)
+
+        todays_sales = reports.summarize(SaleRecord.objects.filter(user=user, date_sold__gte=day_start, date_sold__lt=day_end))
         # Revenue = Total Price - Discount
-        sales_today = todays_sales_query.aggregate(net=Sum(F('total_price') - F('discount')))['net'] or 0
-        items_sold_today = todays_sales_query.aggregate(qty=Sum('quantity'))['qty'] or 0
+        sales_today = todays_sales['revenue']
+        items_sold_today = todays_sales['qty']
 
         current_month_sales = SaleRecord.objects.filter(
             user=user, 
-            date_sold__year=today.year, 
-            date_sold__month=today.month
+            date_sold__gte=month_start, 
+            date_sold__lt=month_end
         )
         
-        first_day_this_month = today.replace(day=1)
-        last_day_prev_month = first_day_this_month - timedelta(days=1)
-        
         previous_month_sales = SaleRecord.objects.filter(
             user=user,
-            date_sold__year=last_day_prev_month.year,
-            date_sold__month=last_day_prev_month.month
+            date_sold__gte=prev_month_start,
+            date_sold__lt=prev_month_end
         )
 
-        monthly_revenue = current_month_sales.aggregate(net=Sum(F('total_price') - F('discount')))['net'] or 0
-        monthly_items_sold = current_month_sales.aggregate(qty=Sum('quantity'))['qty'] or 0
-        
-        monthly_profit = sum(sale.profit for sale in current_month_sales) # Uses updated profit property
+        this_month = reports.summarize(current_month_sales)
+        last_month = reports.summarize(previous_month_sales)
+        monthly_revenue = this_month['revenue']
+        monthly_items_sold = this_month['qty']
+        monthly_profit = this_month['profit']
+        revenue_change = reports.deltas(this_month, last_month)['revenue']['pct']
 
         current_month_records = current_month_sales.select_related('product').order_by('-date_sold')
         previous_month_records = previous_month_sales.select_related('product').order_by('-date_sold')
 
-        dates_30 = []
-        sales_30 = []
-        for i in range(30):
-            d = today - timedelta(days=29-i)
-            day_sales = SaleRecord.objects.filter(user=user, date_sold__date=d).aggregate(net=Sum(F('total_price') - F('discount')))['net'] or 0
-            dates_30.append(d.strftime('%b %d'))
-            sales_30.append(int(day_sales))
+        # One grouped query for the whole 30-day trend instead of one aggregate per day
+        series_start, series_end = periods.days_range(today - timedelta(days=29), today, tz)
+        series_30 = reports.sales_series(user, series_start, series_end, 'day')
+        dates_30 = [bucket['label'] for bucket in series_30]
+        sales_30 = [bucket['revenue'] for bucket in series_30]
 
         dates_7 = dates_30[-7:]
         sales_7 = sales_30[-7:]
@@ -118,20 +134,38 @@ class HomeView(LoginRequiredMixin, TemplateView):
         context.update({
             'low_stock_count': low_stock_count,
             'low_stock_items': low_stock_items,
+            'reorder_items': reorder_items,
             'total_inventory_value': f"{int(total_inventory_value):,}",
             'sales_today': f"{int(sales_today):,}",
             'items_sold_today': items_sold_today,
             'monthly_revenue': f"{int(monthly_revenue):,}",
             'monthly_items_sold': monthly_items_sold,
             'monthly_profit': f"{int(monthly_profit):,}",
-            'graph_dates_30': json.dumps(dates_30),
-            'graph_sales_30': json.dumps(sales_30),
-            'graph_dates_7': json.dumps(dates_7),
-            'graph_sales_7': json.dumps(sales_7),
-            'top_products_labels': json.dumps(top_products_labels),
-            'top_products_data': json.dumps(top_products_data),
-            'category_labels': json.dumps(category_labels),
-            'category_data': json.dumps(category_data),
+            'revenue_change': revenue_change,
+            'chart_data': {
+                'dates_30': dates_30,
+                'sales_30': sales_30,
+                'dates_7': dates_7,
+                'sales_7': sales_7,
+                'top_products_labels': top_products_labels,
+                'top_products_data': top_products_data,
+                'category_labels': category_labels,
+                'category_data': category_data,
+                'valuation_dates': [day.strftime('%b %d') for day, _ in value_history],
+                'valuation_values': [total for _, total in value_history],
+            },
+            # Starting point for the live updates in dashboard.js
+            'live_data': {
+                'sales_today': int(sales_today),
+                'items_sold_today': items_sold_today or 0,
+                'monthly_revenue': int(monthly_revenue),
+                'monthly_items_sold': monthly_items_sold or 0,
+                'monthly_profit': int(monthly_profit),
+                'total_inventory_value': int(total_inventory_value),
+                'day_start': day_start.isoformat(),
+                'month_start': month_start.isoformat(),
+                'low_stock_below': 10,
+            },
             'current_month_records': current_month_records,
             'previous_month_records': previous_month_records,
             'current_month_name': today.strftime('%B'),
@@ -143,8 +177,7 @@ class ProfileView(LoginRequiredMixin, View):
     template_name = 'inventory/profile.html'
 
     def get(self, request):
-        if not hasattr(request.user, 'profile'):
-            Profile.objects.create(user=request.user)
+        caching.get_profile(request.user)
 
         profile_form = UserProfileForm(instance=request.user, user=request.user)
         return render(request, self.template_name, {
@@ -152,8 +185,7 @@ class ProfileView(LoginRequiredMixin, View):
         })
 
     def post(self, request):
-        if not hasattr(request.user, 'profile'):
-            Profile.objects.create(user=request.user)
+        caching.get_profile(request.user)
 
         profile_form = UserProfileForm(request.POST, instance=request.user, user=request.user)
         if profile_form.is_valid():
@@ -165,6 +197,7 @@ class ProfileView(LoginRequiredMixin, View):
             'profile_form': profile_form
         })
 
+@method_decorator(replica_reads, name='dispatch')
 class ProductListView(LoginRequiredMixin, ListView):
     model = Item
     template_name = 'inventory/product_list.html'
@@ -172,16 +205,17 @@ class ProductListView(LoginRequiredMixin, ListView):
 
     def get_queryset(self):
         query = self.request.GET.get('q')
-        qs = Item.objects.filter(user=self.request.user)
+        qs = Item.objects.filter(user=self.request.user).select_related('category')
         if query:
-            qs = qs.filter(name__icontains=query)
+            qs = qs.filter(Q(name__icontains=query) | Q(sku=query.strip()))
         return qs
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['categories'] = Category.objects.filter(user=self.request.user)
+        context['categories'] = caching.get_categories(self.request.user)
         return context
 
+@method_decorator(replica_reads, name='dispatch')
 class SalesBookView(LoginRequiredMixin, TemplateView):
     template_name = 'inventory/sales_book.html'
 
@@ -197,52 +231,124 @@ class SalesBookView(LoginRequiredMixin, TemplateView):
                 Q(product__name__icontains=query)
             )
 
-        grouped_orders = defaultdict(lambda: {
-            'items': [], 
-            'subtotal': 0,
-            'discount': 0,
-            'total_amount': 0, 
-            'total_qty': 0, 
-            'date': None,
-            'order_id': None,
-            'is_legacy': False
-        })
+        # Grouping runs only if the template's cached receipt fragment misses
+        context['receipts'] = SimpleLazyObject(lambda: group_receipts(sales_qs))
+        context['search_query'] = query
+        return context
 
-        sorted_order_ids = []
+def group_receipts(sales_qs):
+    grouped_orders = defaultdict(lambda: {
+        'items': [], 
+        'subtotal': 0,
+        'discount': 0,
+        'total_amount': 0, 
+        'total_qty': 0, 
+        'date': None,
+        'order_id': None,
+        'key': None, # order_id, or LEGACY-<pk> for rows saved before order ids existed
+        'is_legacy': False
+    })
+
+    sorted_order_ids = []
+
+    for sale in sales_qs:
+        if not sale.order_id:
+            oid = f"{refunds.LEGACY_PREFIX}{sale.pk}"
+            is_legacy = True
+        else:
+            oid = sale.order_id
+            is_legacy = False
+        
+        if oid not in grouped_orders:
+            grouped_orders[oid]['order_id'] = sale.order_id if not is_legacy else "N/A"
+            grouped_orders[oid]['key'] = oid
+            grouped_orders[oid]['date'] = sale.date_sold
+            grouped_orders[oid]['is_legacy'] = is_legacy
+            sorted_order_ids.append(oid)
+        
+        grouped_orders[oid]['items'].append(sale)
+        grouped_orders[oid]['subtotal'] += sale.total_price
+        grouped_orders[oid]['discount'] += sale.discount # Summing allocated discounts
+        grouped_orders[oid]['total_amount'] += (sale.total_price - sale.discount)
+        grouped_orders[oid]['total_qty'] += sale.quantity
 
-        for sale in sales_qs:
-            if not sale.order_id:
-                oid = f"LEGACY-{sale.pk}"
-                is_legacy = True
-            else:
-                oid = sale.order_id
-                is_legacy = False
-            
-            if oid not in grouped_orders:
-                grouped_orders[oid]['order_id'] = sale.order_id if not is_legacy else "N/A"
-                grouped_orders[oid]['date'] = sale.date_sold
-                grouped_orders[oid]['is_legacy'] = is_legacy
-                sorted_order_ids.append(oid)
-            
-            grouped_orders[oid]['items'].append(sale)
-            grouped_orders[oid]['subtotal'] += sale.total_price
-            grouped_orders[oid]['discount'] += sale.discount # Summing allocated discounts
-            grouped_orders[oid]['total_amount'] += (sale.total_price - sale.discount)
-            grouped_orders[oid]['total_qty'] += sale.quantity
+    receipts_list = []
+    for oid in sorted_order_ids:
+        receipts_list.append(grouped_orders[oid])
 
-        receipts_list = []
-        for oid in sorted_order_ids:
-            receipts_list.append(grouped_orders[oid])
+    return receipts_list
 
-        context['receipts'] = receipts_list
-        context['search_query'] = query
+@method_decorator(replica_reads, name='dispatch')
+class AnalyticsView(LoginRequiredMixin, TemplateView):
+    template_name = 'inventory/analytics.html'
+
+    def get_context_data(self, **kwargs):
+        from . import analytics
+
+        context = super().get_context_data(**kwargs)
+        try:
+            start, end = periods.parse_range(self.request.GET)
+        except ValueError as e:
+            messages.error(self.request, str(e))
+            start, end = periods.default_range()
+
+        report = analytics.analyze(self.request.user, start, end)
+        context.update({
+            'report': report,
+            'products': report['products'][:100],
+            'start_date': start.date(),
+            'end_date': (end - timedelta(days=1)).date(),
+        })
         return context
 
+@login_required
+@replica_reads
+def analytics_api(request):
+    from . import analytics
+
+    try:
+        start, end = periods.parse_range(request.GET)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse(analytics.analyze(request.user, start, end))
+
+@login_required
+@replica_reads
+def sales_report_api(request):
+    """
+    Period series for any range: ?start=&end=&granularity=day|week|month|quarter
+    Optional comparison with &compare=previous|yoy or an explicit &prev_start=&prev_end=.
+    """
+    granularity = request.GET.get('granularity', 'day')
+    try:
+        current = periods.parse_range(request.GET)
+        if request.GET.get('prev_start') or request.GET.get('prev_end'):
+            previous = periods.parse_range(request.GET, start_key='prev_start', end_key='prev_end')
+        elif request.GET.get('compare'):
+            previous = reports.previous_range(*current, request.GET['compare'])
+        else:
+            series = reports.sales_series(request.user, *current, granularity)
+            return JsonResponse({
+                'granularity': granularity,
+                'start': current[0].isoformat(),
+                'end': current[1].isoformat(),
+                'series': series,
+                'totals': reports.totals(series),
+            })
+        return JsonResponse(reports.compare(request.user, current, previous, granularity))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+
 class AddProductView(LoginRequiredMixin, CreateView):
     model = Item
     form_class = ItemForm
     template_name = 'inventory/add_item.html'
     success_url = reverse_lazy('product_list')
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs['user'] = self.request.user
+        return kwargs
     
     def form_valid(self, form):
         try:
@@ -281,19 +387,52 @@ class AddPurchaseView(LoginRequiredMixin, CreateView):
         form.instance.user = self.request.user
         return super().form_valid(form)
 
+class RepriceView(LoginRequiredMixin, View):
+    """Bulk price / cost changes; the page previews through reprice_api before submitting here."""
+    template_name = 'inventory/reprice.html'
+
+    def _render(self, request, form):
+        batches = PriceChangeBatch.objects.filter(user=request.user).order_by('-created_at')[:10]
+        return render(request, self.template_name, {'form': form, 'batches': batches})
+
+    def get(self, request):
+        return self._render(request, RepriceForm(request.user))
+
+    def post(self, request):
+        form = RepriceForm(request.user, request.POST)
+        if not form.is_valid():
+            return self._render(request, form)
+        data = form.cleaned_data
+        try:
+            batch = repricing.apply(request.user, data['field'], data['mode'], data['amount'], form.filters())
+        except ValueError as e:
+            messages.error(request, str(e))
+            return self._render(request, form)
+        messages.success(request, f"Updated {batch.get_field_display().lower()} on {batch.item_count} product(s).")
+        return redirect('reprice')
+
 class SaleView(LoginRequiredMixin, View):
     template_name = 'inventory/sale.html'
 
     def get(self, request):
-        recent_sales = SaleRecord.objects.filter(user=request.user, date_sold__date=timezone.now().date()).order_by('-date_sold')
         items = Item.objects.filter(user=request.user).values('id', 'name', 'selling_price', 'quantity', 'average_cost')
-        products_json = json.dumps(list(items), cls=DjangoJSONEncoder)
+        products = reservations.with_available(request.user, list(items))
+
+        # Active promotions, so the till can preview the prices checkout will charge
+        offers = defaultdict(list)
+        for item_id, *offer in Promotion.active().filter(user=request.user).values_list('item_id', 'percent_off', 'bundle_qty', 'bundle_price'):
+            offers[item_id].append(offer)
+        for product in products:
+            product['offers'] = offers.get(product['id'], [])
+
+        # Stock counts then follow the change feed (live.js) instead of page reloads
         return render(request, self.template_name, {
-            'recent_sales': recent_sales,
-            'products_json': products_json
+            'products': products
         })
 
     def post(self, request):
+        from . import checkout
+
         try:
             data = json.loads(request.body)
             cart_items = data.get('items', [])
@@ -302,183 +441,208 @@ class SaleView(LoginRequiredMixin, View):
             if not cart_items:
                 return JsonResponse({'status': 'error', 'message': 'Cart is empty'}, status=400)
 
-            order_id = f"ORD-{uuid.uuid4().hex[:8].upper()}"
-
-            with transaction.atomic():
-                order_subtotal = 0
-                total_order_cost = 0
-                prepared_sales = []
-
-                for item_data in cart_items:
-                    product_id = item_data.get('id')
-                    qty = int(item_data.get('qty'))
-                    
-                    if qty <= 0:
-                        raise ValueError("Quantity must be positive.")
-                    
-                    product = Item.objects.select_for_update().get(pk=product_id, user=request.user)
-                    
-                    if product.quantity < qty:
-                        raise ValueError(f"Insufficient stock for {product.name}")
-                    
-                    line_subtotal = product.selling_price * qty
-                    line_cost = product.average_cost * qty
-                    
-                    order_subtotal += line_subtotal
-                    total_order_cost += line_cost
-                    
-                    prepared_sales.append({
-                        'product': product,
-                        'quantity': qty,
-                        'total_price': line_subtotal,
-                        'unit_cost_at_sale': product.average_cost,
-                        'user': request.user,
-                        'order_id': order_id
-                    })
-
-                # VALIDATION: (Subtotal - Discount) >= Total Cost
-                if (order_subtotal - flat_discount) < total_order_cost:
-                    raise ValueError(f"Discount is too high! Minimum revenue required: PKR {total_order_cost}")
-
-                # Allocate discount pro-rata across records for accurate reporting
-                num_items = len(prepared_sales)
-                for i, sale_data in enumerate(prepared_sales):
-                    if i == num_items - 1:
-                        # Put remainder in the last item to ensure total matches flat_discount exactly
-                        sale_data['discount'] = flat_discount
-                    else:
-                        # Allocate based on share of subtotal
-                        allocation = (sale_data['total_price'] * flat_discount) // order_subtotal
-                        sale_data['discount'] = allocation
-                        flat_discount -= allocation
-
-                    SaleRecord.objects.create(**sale_data)
-                    
-                    product = sale_data['product']
-                    product.quantity -= sale_data['quantity']
-                    product.save()
+            percent_off = int(data.get('percent_off', 0))
+
+            order_id = checkout.place_order(request.user, cart_items, flat_discount, data.get('cart_id'), percent_off)
             
             messages.success(request, f"Sale completed! Tracking #: {order_id}")
-            return JsonResponse({'status': 'success', 'redirect': reverse_lazy('sales')})
+            return JsonResponse({
+                'status': 'success', 'redirect': reverse_lazy('sales'),
+                'receipt_url': reverse_lazy('receipt', args=[order_id]),
+            })
 
         except Item.DoesNotExist:
             return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
-        except ValueError as e:
+        except (TypeError, ValueError) as e:
             return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
         except Exception as e:
             return JsonResponse({'status': 'error', 'message': 'An error occurred processing the sale.'}, status=500)
 
+@login_required
+@require_POST
+def stock_hold(request):
+    """Places or resizes a cart's hold on one item: {"cart_id", "item_id", "qty"} (qty 0 releases)."""
+    try:
+        data = json.loads(request.body)
+        result = reservations.hold(request.user, data.get('cart_id'), int(data.get('item_id')), int(data.get('qty', 0)))
+    except Item.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
+    except reservations.StockUnavailable as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=409)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', **result})
+
+@login_required
+@require_http_methods(['GET', 'POST'])
+def scan_code(request, code):
+    """
+    Looks up a scanned SKU / barcode. A POST with {"cart_id", "qty"} (qty defaults to 1) also adds
+    that many units to the cart's hold, so the till adds a scanned item in one round trip.
+    """
+    product = scanning.lookup(request.user.pk, code)
+    if product is None:
+        return JsonResponse({'status': 'error', 'message': f'No product with code {code}'}, status=404)
+    if request.method == 'GET':
+        return JsonResponse({'status': 'success', 'product': product})
+    try:
+        data = json.loads(request.body or '{}')
+        result = reservations.hold(request.user, data.get('cart_id'), product['id'], int(data.get('qty', 1)), add=True)
+    except Item.DoesNotExist:
+        return JsonResponse({'status': 'error', 'message': 'Product not found'}, status=404)
+    except reservations.StockUnavailable as e:
+        return JsonResponse({'status': 'error', 'message': str(e), 'product': product}, status=409)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'product': product, **result})
+
+@login_required
+def event_stream(request):
+    """Server-sent events for the tenant's sales, purchases and refunds; see inventory/events.py."""
+    last_id = request.headers.get('Last-Event-ID') or request.GET.get('last_id')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+    body = events.stream(request.user.pk, last_id, asynchronous=isinstance(request, ASGIRequest))
+    response = StreamingHttpResponse(body, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # nginx: pass events through as they are written
+    return response
+
+@login_required
+@require_POST
+def reprice_api(request):
+    """
+    Bulk price / cost change: {"field", "mode", "amount", "category", "company", "min_margin",
+    "max_margin"}; with "preview": true nothing is written and the computed result is returned.
+    """
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'status': 'error', 'message': 'Invalid JSON'}, status=400)
+    form = RepriceForm(request.user, data)
+    if not form.is_valid():
+        return JsonResponse({'status': 'error', 'errors': form.errors}, status=400)
+    args = (request.user, form.cleaned_data['field'], form.cleaned_data['mode'], form.cleaned_data['amount'], form.filters())
+    try:
+        if data.get('preview'):
+            return JsonResponse({'status': 'success', 'preview': repricing.preview(*args)})
+        batch = repricing.apply(*args)
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'batch_id': batch.pk, 'items': batch.item_count})
+
+@login_required
+@require_POST
+def undo_reprice(request, pk):
+    try:
+        result = repricing.undo(request.user, pk)
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        skipped = f"; {result['skipped']} edited since were left alone" if result['skipped'] else ""
+        messages.success(request, f"Restored {result['reverted']} product(s){skipped}.")
+    return redirect('reprice')
+
+@login_required
+@require_POST
+def release_holds(request):
+    """Drops every hold of a cart, e.g. when the till page is closed."""
+    try:
+        released = reservations.release(request.user, json.loads(request.body).get('cart_id'))
+    except ValueError as e:
+        return JsonResponse({'status': 'error', 'message': str(e)}, status=400)
+    return JsonResponse({'status': 'success', 'released': released})
+
+@login_required
+@require_POST
+def refund_sales(request):
+    """Refunds whole orders (order_id, may repeat; LEGACY-<pk> for old rows) and/or single lines (sale_id, may repeat)."""
+    try:
+        result = refunds.refund(request.user, request.POST.getlist('order_id'), request.POST.getlist('sale_id'))
+    except ValueError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, f"Refunded {result['lines']} line(s); {result['units']} unit(s) returned to stock.")
+    next_url = request.POST.get('next')
+    if next_url and url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect('sales_book')
+
+@login_required
+@require_POST
 def delete_sale(request, pk):
-    with transaction.atomic():
-        sale = get_object_or_404(SaleRecord, pk=pk, user=request.user)
-        try:
-            item = Item.objects.select_for_update().get(pk=sale.product.pk)
-            item.quantity += sale.quantity
-            item.save()
-        except Item.DoesNotExist:
-            pass
-        
-        sale.delete()
-        messages.success(request, "Sale reversed and stock restored.")
+    try:
+        refunds.refund(request.user, sale_ids=[pk])
+    except ValueError:
+        raise Http404("Sale not found.")
+    messages.success(request, "Sale reversed and stock restored.")
     return redirect('sales')
 
+@login_required
+@require_POST
 def delete_item(request, pk):
     item = get_object_or_404(Item, pk=pk, user=request.user)
-    item.delete()
+    # Hidden rather than deleted: cascading through its sales would be slow and lose history
+    item.soft_delete()
     messages.success(request, "Item deleted successfully.")
     return redirect('product_list')
 
-def sanitize_for_excel(value):
-    if value and isinstance(value, str) and value.startswith(('=', '+', '-', '@')):
-        return f"'{value}"
-    return value
-
+@replica_reads
 def export_daily_sales(request):
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="daily_sales.csv"'
-    writer = csv.writer(response)
-    writer.writerow(['Order ID', 'Date', 'Product Name', 'Qty Sold', 'Unit Price', 'Total Subtotal', 'Discount', 'Net Total']) #
-    sales = SaleRecord.objects.filter(user=request.user, date_sold__date=timezone.now().date())
-    for sale in sales:
-        writer.writerow([
-            sanitize_for_excel(sale.order_id), 
-            sale.date_sold, 
-            sanitize_for_excel(sale.product.name), 
-            sale.quantity, 
-            sale.product.selling_price, 
-            sale.total_price,
-            sale.discount,
-            (sale.total_price - sale.discount)
-        ])
-    return response
+    return exports.daily_sales_csv(request.user, request.tenant_tz)
 
+@replica_reads
 def export_monthly_sales(request):
-    response = HttpResponse(content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
-    response['Content-Disposition'] = 'attachment; filename="Monthly_Sales_Report.xlsx"'
-
-    wb = openpyxl.Workbook()
-    
-    def create_report_sheet(workbook, title, sales_data):
-        if workbook.active.title == "Sheet":
-            ws = workbook.active
-            ws.title = title
-        else:
-            ws = workbook.create_sheet(title=title)
-        
-        headers = ['Order ID', 'Product / Item', 'Category', 'Date of Sale', 'Month', 'Year', 'Qty Sold', 'Gross Subtotal', 'Discount', 'Net Sales', 'Total Cost', 'Net Profit'] #
-        ws.append(headers)
-        
-        for cell in ws[1]:
-            cell.font = Font(bold=True)
-
-        for sale in sales_data:
-            subtotal = sale.total_price
-            discount = sale.discount
-            revenue = subtotal - discount
-            cost_price = getattr(sale, 'unit_cost_at_sale', 0)
-            if cost_price == 0:
-                cost_price = sale.product.average_cost
-                
-            total_cost = cost_price * sale.quantity
-            profit = revenue - total_cost
-            
-            ws.append([
-                sanitize_for_excel(sale.order_id if sale.order_id else "N/A"),
-                sanitize_for_excel(sale.product.name),
-                sanitize_for_excel(sale.product.category.name),
-                sale.date_sold.strftime('%Y-%m-%d'),
-                sale.date_sold.strftime('%B'),
-                sale.date_sold.year,
-                sale.quantity,
-                subtotal,
-                discount,
-                revenue,
-                total_cost,
-                profit
-            ])
-
-    today = timezone.now().date()
-    first_day_this_month = today.replace(day=1)
-    last_day_prev_month = first_day_this_month - timedelta(days=1)
-
-    current_sales = SaleRecord.objects.filter(
-        user=request.user, 
-        date_sold__month=today.month, 
-        date_sold__year=today.year
-    ).select_related('product', 'product__category').order_by('-date_sold')
-    
-    create_report_sheet(wb, f"Current ({today.strftime('%B')})", current_sales)
-
-    prev_sales = SaleRecord.objects.filter(
-        user=request.user, 
-        date_sold__month=last_day_prev_month.month, 
-        date_sold__year=last_day_prev_month.year
-    ).select_related('product', 'product__category').order_by('-date_sold')
-    
-    create_report_sheet(wb, f"Previous ({last_day_prev_month.strftime('%B')})", prev_sales)
-
-    wb.save(response)
-    return response
+    return exports.monthly_sales_xlsx(request.user, request.tenant_tz)
+
+def _receipt_format(request):
+    fmt = request.GET.get('format', receipts.HTML)
+    if fmt not in receipts.FORMATS:
+        raise Http404("Unknown receipt format.")
+    if fmt == receipts.PDF and not receipts.pdf_available():
+        raise Http404("PDF receipts need reportlab installed.")
+    return fmt
+
+@login_required
+def print_receipt(request, key):
+    """One order's receipt: ?format=html (a printable page, the default), text (thermal printers) or pdf."""
+    fmt = _receipt_format(request)
+    rendered = receipts.receipt(request.user, key, receipts.TEXT if fmt == receipts.PDF else fmt)
+    if rendered is None:
+        raise Http404("Receipt not found.")
+    if fmt == receipts.PDF:
+        response = HttpResponse(receipts.pdf([rendered]), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="receipt-{key}.pdf"'
+        return response
+    if fmt == receipts.TEXT:
+        return HttpResponse(rendered, content_type='text/plain; charset=utf-8')
+    return HttpResponse(receipts.page_start(request.user) + rendered + receipts.PAGE_END)
+
+@login_required
+def print_day_receipts(request):
+    """Every receipt of a day (?date=YYYY-MM-DD, default today) as one document; ?format= as for one receipt."""
+    fmt = _receipt_format(request)
+    try:
+        day = datetime.strptime(request.GET['date'], '%Y-%m-%d').date() if request.GET.get('date') else periods.local_today(request.tenant_tz)
+    except ValueError:
+        return HttpResponseBadRequest("Dates must be in YYYY-MM-DD format.")
+    keys = receipts.day_keys(request.user, day, request.tenant_tz)
+    if fmt == receipts.PDF:
+        response = HttpResponse(receipts.pdf(receipts.in_batches(request.user, keys, receipts.TEXT)), content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="receipts-{day:%Y%m%d}.pdf"'
+        return response
+    content_type = 'text/plain; charset=utf-8' if fmt == receipts.TEXT else 'text/html; charset=utf-8'
+    return StreamingHttpResponse(receipts.stream_day(request.user, keys, fmt), content_type=content_type)
+
+@login_required
+def throttle_metrics(request):
+    """Staff only: requests refused by TenantThrottleMiddleware, by cost class and reason (?user=<id> adds tenants)."""
+    if not request.user.is_staff:
+        raise Http404
+    user_ids = [pk for pk in request.GET.getlist('user') if pk.isdigit()]
+    return JsonResponse(throttling.metrics(user_ids))
 
 class AddCategoryView(LoginRequiredMixin, CreateView):
     model = Category
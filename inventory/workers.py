@@ -0,0 +1,92 @@
+import csv
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from itertools import islice
+
+from django.db import connections
+
+# Nightly jobs (forecast_demand, audit_costs) run one function per tenant over a pool of
+# forked worker processes. Each call is independent, so tenants are handed out one at a time
+# and a failing tenant does not stop the others.
+
+
+def run_per_tenant(func, tenants, workers, **kwargs):
+    """
+    Calls func(*args, **kwargs) for each argument tuple in `tenants`, whose first item is the
+    tenant's user id, over `workers` forked processes (1 runs them in this process). Yields
+    (user_id, result, None) or (user_id, None, exception) as each tenant finishes.
+    """
+    if workers <= 1:
+        for args in tenants:
+            try:
+                yield args[0], func(*args, **kwargs), None
+            except Exception as e:
+                yield args[0], None, e
+        return
+
+    # Children are forked from this process: none of them may reuse its connections
+    connections.close_all()
+    pool = ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+        initializer=connections.close_all,
+    )
+    with pool:
+        jobs = {pool.submit(func, *args, **kwargs): args[0] for args in tenants}
+        for job in as_completed(jobs):
+            try:
+                yield jobs[job], job.result(), None
+            except Exception as e:
+                yield jobs[job], None, e
+
+
+# --- Bulk inserts ---
+# generate_tenant and move_tenant write rows whose timestamps are already known.
+# generate_tenant writes millions of rows that nothing reads back, so it skips model instances
+# altogether: building and compiling them costs far more than the INSERT itself.
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """bulk_create honours auto_now / auto_now_add, which would restamp every row with 'now'."""
+    fields = [
+        (field, field.auto_now, field.auto_now_add)
+        for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in fields:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def insert_rows(model, fields, rows, using='default', batch_size=10000):
+    """
+    Inserts `rows`, tuples of values for the model's `fields` (attnames), straight into its table:
+    no model instances, signals, defaults or auto_now. Values must be ready for the database
+    (datetimes through connection.ops.adapt_datetimefield_value()); None is NULL, and so is an
+    empty string under COPY. COPY on PostgreSQL, batched executemany() elsewhere. Returns the
+    number of rows.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    rows = iter(rows)
+    count = 0
+    with connection.cursor() as cursor:
+        while batch := list(islice(rows, batch_size)):
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN WITH (FORMAT csv)", buffer)
+            else:
+                placeholders = ', '.join(['%s'] * len(fields))
+                cursor.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", batch)
+            count += len(batch)
+    return count
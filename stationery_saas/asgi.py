@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+Served under ASGI (e.g. GUNICORN_WORKER_CLASS=uvicorn.workers.UvicornWorker with
+stationery_saas.asgi), /events/ holds one open stream per browser instead of reconnecting.
 """
 
 import os
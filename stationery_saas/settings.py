@@ -1,5 +1,7 @@
 from pathlib import Path
 import os
+import sys
+import tempfile
 from django.core.exceptions import ImproperlyConfigured
 import dj_database_url  
 
@@ -35,32 +37,45 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'inventory',
-    'import_export',
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',  # Serve static files before sessions/auth do any work
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.middleware.TenantShardMiddleware',
+    'inventory.middleware.TenantTimezoneMiddleware',
+    'inventory.middleware.ReplicaRoutingMiddleware',
+    'inventory.middleware.TenantThrottleMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',  
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 ROOT_URLCONF = 'stationery_saas.urls'
 
+TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
+            # Production compiles each template once per process; DEBUG re-reads them so edits show up
+            'loaders': TEMPLATE_LOADERS if DEBUG else [
+                ('django.template.loaders.cached.Loader', TEMPLATE_LOADERS),
+            ],
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'inventory.context_processors.cache_versions',
+                'inventory.context_processors.business_profile',
             ],
         },
     },
@@ -76,6 +91,94 @@ DATABASES = {
     )
 }
 
+# Optional read replica for dashboards, reports and exports (see inventory/routers.py).
+# Locally, point REPLICA_DATABASE_URL at a copy of the SQLite file (or the same file) to try it out.
+if os.environ.get('REPLICA_DATABASE_URL'):
+    DATABASES['replica'] = dj_database_url.parse(os.environ['REPLICA_DATABASE_URL'], conn_max_age=600)
+    # Tests run against one database; the replica alias mirrors it over a connection of its own
+    DATABASES['replica']['TEST'] = {'MIRROR': 'default'}
+
+# Optional tenant shards (see inventory/routers.py): SHARD_DATABASE_URLS="shard1=postgres://...,shard2=...".
+# Tenants are placed with `manage.py move_tenant`. Locally, extra SQLite files work, e.g.
+# SHARD_DATABASE_URLS="shard1=sqlite:////tmp/shard1.sqlite3", then `manage.py migrate --database shard1`.
+TENANT_SHARDS = []
+for entry in filter(None, os.environ.get('SHARD_DATABASE_URLS', '').split(',')):
+    alias, url = entry.strip().split('=', 1)
+    DATABASES[alias] = dj_database_url.parse(url, conn_max_age=600)
+    TENANT_SHARDS.append(alias)
+DATABASE_ROUTERS = ['inventory.routers.ShardRouter', 'inventory.routers.ReplicaRouter']
+
+# Seconds a tenant's reads stay on the primary after it writes ("read your writes")
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+
+# The stock concurrency tests need several connections, which an in-memory SQLite test database cannot give.
+# The files go to the temp directory, out of the working tree.
+for alias in ['default', *TENANT_SHARDS]:
+    if DATABASES[alias].get('ENGINE') == 'django.db.backends.sqlite3':
+        name = f'stationery_saas_test_{alias}.sqlite3'
+        DATABASES[alias].setdefault('TEST', {}).setdefault('NAME', str(Path(tempfile.gettempdir()) / name))
+
+# Cache
+# LocMemCache is per process. When running more than one gunicorn worker, point
+# CACHE_BACKEND/CACHE_LOCATION at a shared cache (e.g. django.core.cache.backends.redis.RedisCache)
+# so version bumps made by one worker are seen by the others.
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', 'ims-default'),
+    }
+}
+if CACHES['default']['BACKEND'].endswith('LocMemCache'):
+    # Default of 300 entries is too small once every tenant has a few page fragments
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': 5000}
+
+# Sessions
+# SESSION_MODE=cached_db (default) reads sessions from the cache and only falls back to the
+# database on a miss; signed_cookies keeps the session in the cookie itself (no storage at all,
+# but it is readable by the client and cannot be revoked server-side); db is Django's default.
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+SESSION_MODE = os.environ.get('SESSION_MODE', 'cached_db')
+if SESSION_MODE not in SESSION_ENGINES:
+    raise ImproperlyConfigured(f"SESSION_MODE must be one of: {', '.join(SESSION_ENGINES)}.")
+SESSION_ENGINE = SESSION_ENGINES[SESSION_MODE]
+
+# The request user is loaded from the cache instead of the database (see inventory/backends.py)
+AUTHENTICATION_BACKENDS = ['inventory.backends.CachedModelBackend']
+
+# Seconds a rendered {% cache %} fragment lives; fragments are also invalidated by version bumps
+FRAGMENT_CACHE_TIMEOUT = 3600
+
+# Lowest margin over cost (percent) that discounts and promotions may leave on an order
+MIN_MARGIN_PCT = int(os.environ.get('MIN_MARGIN_PCT', 0))
+
+# Seconds a POS cart keeps its stock holds without activity (expired holds are ignored and
+# deleted by `manage.py expire_reservations`)
+STOCK_HOLD_TTL_SECONDS = int(os.environ.get('STOCK_HOLD_TTL_SECONDS', 900))
+
+# Live updates (/events/). Under ASGI one connection stays open for SSE_MAX_SECONDS, checking
+# for new events every SSE_POLL_SECONDS; under WSGI browsers reconnect every SSE_RETRY_MS.
+SSE_POLL_SECONDS = float(os.environ.get('SSE_POLL_SECONDS', 1))
+SSE_MAX_SECONDS = int(os.environ.get('SSE_MAX_SECONDS', 300))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', 3000))
+
+# Per-tenant throttling (inventory/throttling.py). Each tenant's bucket holds THROTTLE_BURST tokens
+# and refills at THROTTLE_RATE per second; a page costs 1, dashboards and reports 5, exports 10, the
+# till nothing. THROTTLE_EXPORT_CONCURRENCY caps how many exports one tenant can run at once.
+THROTTLE_ENABLED = os.environ.get('THROTTLE_ENABLED', '1') == '1'
+THROTTLE_RATE = float(os.environ.get('THROTTLE_RATE', 1))
+THROTTLE_BURST = int(os.environ.get('THROTTLE_BURST', 30))
+THROTTLE_EXPORT_CONCURRENCY = int(os.environ.get('THROTTLE_EXPORT_CONCURRENCY', 1))
+
+# Printable receipts (inventory/receipts.py): characters per line on the thermal printer
+# (32 for 58 mm paper, 42 or 48 for 80 mm) and how long rendered receipts stay cached.
+RECEIPT_WIDTH = int(os.environ.get('RECEIPT_WIDTH', 42))
+RECEIPT_CACHE_TIMEOUT = int(os.environ.get('RECEIPT_CACHE_TIMEOUT', 7 * 24 * 3600))
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -94,7 +197,7 @@ AUTH_PASSWORD_VALIDATORS = [
 
 # Internationalization
 LANGUAGE_CODE = 'en-us'
-TIME_ZONE = 'UTC'
+TIME_ZONE = 'UTC' # Storage zone; each shop's local zone comes from Profile.timezone
 USE_I18N = True
 USE_TZ = True
 
@@ -102,6 +205,22 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# collectstatic writes content-hashed copies plus .gz/.br variants (brotli needs the Brotli package).
+# WhiteNoise serves hashed files with a one-year immutable Cache-Control header.
+# The manifest only exists after collectstatic, so DEBUG and the test runner use plain storage.
+RUNNING_TESTS = len(sys.argv) > 1 and sys.argv[1] == 'test'
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': (
+            'django.contrib.staticfiles.storage.StaticFilesStorage' if DEBUG or RUNNING_TESTS
+            else 'whitenoise.storage.CompressedManifestStaticFilesStorage'
+        ),
+    },
+}
+
 # Default primary key field type
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -110,9 +229,6 @@ LOGIN_REDIRECT_URL = 'dashboard'
 LOGOUT_REDIRECT_URL = 'login'
 LOGIN_URL = 'login'
 
-# Import Export Settings
-IMPORT_EXPORT_USE_TRANSACTIONS = True
-
 
 # Force trust for Railway domain to fix 403 CSRF errors
 CSRF_TRUSTED_ORIGINS = [